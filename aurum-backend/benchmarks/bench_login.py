@@ -0,0 +1,97 @@
+"""Vazão de login com o bcrypt no pool de processos (src/passwords.py).
+
+Dispara THREADS threads fazendo LOGINS logins cada enquanto outra thread mede
+/api/tickets/stats a cada 50 ms, para ver quanto o hashing atrasa o resto da
+API. Com --inline o bcrypt roda na própria thread da requisição, sem fila
+(comportamento anterior ao pool), para comparar:
+
+    python benchmarks/bench_login.py --inline
+    python benchmarks/bench_login.py
+
+Usa um banco temporário (ou DATABASE_URL, se definido); o limite de
+tentativas (por IP e por usuário) é desligado para não interferir na medição.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--inline', action='store_true', help='bcrypt na thread da requisição, sem pool')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--logins', type=int, default=4, help='logins por thread')
+    return parser.parse_args()
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def main():
+    args = parse_args()
+    database_dir = None
+    if 'DATABASE_URL' not in os.environ:
+        database_dir = tempfile.mkdtemp(prefix='aurum-bench-')
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(database_dir, 'app.db')}"
+    sys.path.insert(0, ROOT)
+
+    from src.main import app
+    from src.passwords import password_hasher
+
+    app.config['LOGIN_THROTTLE_IP'] = (10 ** 6, 1)
+    app.config['LOGIN_THROTTLE_USERNAME'] = (10 ** 6, 1)
+    if args.inline:
+        password_hasher.run = lambda function, *params: function(*params)
+
+    logins, probes, codes = [], [], {}
+    stop = threading.Event()
+
+    def login_worker():
+        client = app.test_client()
+        for _ in range(args.logins):
+            started = time.perf_counter()
+            response = client.post('/api/auth/login', json={'username': 'joao.silva', 'password': 'tecnico123'})
+            logins.append(time.perf_counter() - started)
+            codes[response.status_code] = codes.get(response.status_code, 0) + 1
+
+    def prober():
+        client = app.test_client()
+        client.post('/api/auth/login', json={'username': 'admin.sistema', 'password': 'admin123'})
+        while not stop.is_set():
+            started = time.perf_counter()
+            client.get('/api/tickets/stats')
+            probes.append(time.perf_counter() - started)
+            time.sleep(0.05)
+
+    probe_thread = threading.Thread(target=prober)
+    probe_thread.start()
+    time.sleep(1)  # aquece o pool e o cache antes de medir
+    probes.clear()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=login_worker) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    probe_thread.join()
+
+    ok = codes.get(200, 0)
+    print(f"{'inline' if args.inline else 'pool'}: {ok}/{len(logins)} ok, códigos {codes}, "
+          f"{elapsed:.1f} s, {ok / elapsed:.2f} logins/s; "
+          f"stats p50 {statistics.median(probes) * 1000:.0f} ms p95 {percentile(probes, 0.95) * 1000:.0f} ms")
+
+    password_hasher.shutdown()
+    if database_dir:
+        shutil.rmtree(database_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
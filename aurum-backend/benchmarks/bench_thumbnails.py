@@ -0,0 +1,104 @@
+"""Latência do upload de anexos com a miniatura gerada na requisição ou na fila.
+
+Envia UPLOADS imagens JPEG (conteúdo distinto, para não cair na deduplicação)
+para /api/tickets/<id>/files e mede o tempo de cada resposta. Por padrão a
+miniatura é enfileirada (schedule_thumbnail) e depois gerada pelo worker;
+com --inline ela é gerada dentro da requisição, antes da resposta:
+
+    python benchmarks/bench_thumbnails.py --inline
+    python benchmarks/bench_thumbnails.py
+
+Precisa do Pillow. Usa banco e pasta de uploads temporários (ou DATABASE_URL,
+se definido).
+"""
+import argparse
+import io
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--inline', action='store_true', help='gera a miniatura dentro da requisição')
+    parser.add_argument('--uploads', type=int, default=40)
+    parser.add_argument('--size', type=int, default=2000, help='largura das imagens, em pixels')
+    return parser.parse_args()
+
+def sample_image(index, width):
+    """JPEG com ruído (caro de decodificar, como uma foto) e bytes únicos"""
+    from PIL import Image
+    image = Image.effect_noise((width, width * 3 // 4), 64).convert('RGB')
+    image.putpixel((0, 0), (index % 256, index // 256 % 256, 0))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def main():
+    args = parse_args()
+    work_dir = tempfile.mkdtemp(prefix='aurum-bench-')
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(work_dir, 'app.db')}")
+    sys.path.insert(0, ROOT)
+
+    from src.main import app
+    from src.models.ticket import Ticket
+    from src.models.user import db, User
+    from src.jobs import Worker
+    from src.storage import get_storage, init_storage
+    import src.routes.tickets as ticket_routes
+    from src.thumbnails import generate_thumbnail, preview_kind, thumbnail_cache_key
+
+    app.config['UPLOAD_ROOT'] = os.path.join(work_dir, 'uploads')
+    init_storage(app)
+
+    if args.inline:
+        def generate_now(ticket_file):
+            if preview_kind(ticket_file.original_filename) is None:
+                return
+            source = get_storage().path(ticket_file.file_path)
+            generate_thumbnail(source, ticket_file.original_filename, thumbnail_cache_key(ticket_file))
+        ticket_routes.schedule_thumbnail = generate_now
+
+    with app.app_context():
+        admin = User.query.filter_by(username='admin.sistema').one()
+        ticket = Ticket(title='Benchmark de anexos', description='d', service_type='Consultoria em T.I.',
+                        user_id=admin.id, company_id=1)
+        db.session.add(ticket)
+        db.session.commit()
+        ticket_id = ticket.id
+
+    images = [sample_image(index, args.size) for index in range(args.uploads)]
+    client = app.test_client()
+    client.post('/api/auth/login', json={'username': 'admin.sistema', 'password': 'admin123'})
+
+    latencies = []
+    for index, content in enumerate(images):
+        started = time.perf_counter()
+        response = client.post(f'/api/tickets/{ticket_id}/files',
+                               data={'file': (io.BytesIO(content), f'foto-{index}.jpg')})
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 201, response.get_json()
+
+    mode = 'inline' if args.inline else 'fila'
+    print(f'{mode}: {len(latencies)} uploads de {len(images[0]) // 1024} KB, '
+          f'p50 {statistics.median(latencies) * 1000:.0f} ms, p95 {percentile(latencies, 0.95) * 1000:.0f} ms, '
+          f'total {sum(latencies):.1f} s')
+
+    if not args.inline:
+        worker = Worker(app, threads=1)
+        started = time.perf_counter()
+        worker.run(burst=True)
+        print(f'worker: {worker.processed} miniaturas em {time.perf_counter() - started:.1f} s (fora da requisição)')
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
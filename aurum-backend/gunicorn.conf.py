@@ -0,0 +1,10 @@
+# Configuração de produção: gunicorn -c gunicorn.conf.py src.main:app
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8289')
+workers = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1))
+# Workers gevent: cada stream SSE (/api/events) fica em um greenlet, não em
+# uma thread. Até COOPERATIVE_STREAM_LIMIT (src/events.py) streams por worker;
+# o resto das conexões fica para as demais requisições.
+worker_class = 'gevent'
+worker_connections = 2000
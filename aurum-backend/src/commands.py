@@ -0,0 +1,163 @@
+import signal
+
+import click
+from flask import current_app
+
+from src.migrations import upgrade_schema, explain_hot_queries
+from src.models.ticket_counter import TicketCounter
+from src.models.ticket_search import rebuild_search_index
+from src.compression import precompress_directory
+from src.importer import IMPORTERS
+from src.routes.uploads import expire_upload_sessions
+from src.jobs import Worker, queue_stats, requeue_dead_jobs
+from src.notifications import NotificationDispatcher
+from src.storage_migration import migrate_storage_layout
+from src.storage_gc import reconcile_storage
+
+@click.command('upgrade-db')
+@click.option('--explain', is_flag=True, help='Mostra o plano de execução das consultas frequentes.')
+def upgrade_db_command(explain):
+    """Cria no banco existente as colunas e índices que ainda não existem."""
+    created = upgrade_schema()
+    if created:
+        for name in created:
+            click.echo(f'Criado: {name}')
+    else:
+        click.echo('Banco já está atualizado.')
+    
+    if explain:
+        ok = True
+        for description, plan, uses_index in explain_hot_queries():
+            click.echo(f"[{'OK' if uses_index else 'SCAN'}] {description}")
+            for detail in plan:
+                click.echo(f'    {detail}')
+            ok = ok and uses_index
+        if not ok:
+            raise SystemExit(1)
+
+@click.command('rebuild-counters')
+def rebuild_counters_command():
+    """Recalcula a tabela ticket_counters a partir dos tickets."""
+    total = TicketCounter.rebuild()
+    click.echo(f'{total} contadores recalculados.')
+
+@click.command('verify-counters')
+@click.option('--fix', is_flag=True, help='Recalcula os contadores se houver divergência.')
+def verify_counters_command(fix):
+    """Confere se ticket_counters corresponde aos tickets."""
+    drift = TicketCounter.verify()
+    if not drift:
+        click.echo('Contadores consistentes.')
+        return
+    
+    for scope, scope_id, status, stored, expected in drift:
+        click.echo(f'{scope}:{scope_id} {status}: armazenado {stored}, esperado {expected}')
+    if fix:
+        TicketCounter.rebuild()
+        click.echo('Contadores recalculados.')
+    else:
+        raise SystemExit(1)
+
+@click.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Reconstrói o índice de busca textual dos tickets."""
+    rebuild_search_index()
+    click.echo('Índice de busca reconstruído.')
+
+@click.command('precompress-static')
+def precompress_static_command():
+    """Gera variantes .gz/.br dos arquivos estáticos para servir sem comprimir."""
+    written = precompress_directory(current_app.static_folder)
+    click.echo(f'{len(written)} arquivos gerados.')
+
+@click.command('import-csv')
+@click.argument('kind', type=click.Choice(sorted(IMPORTERS)))
+@click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+def import_csv_command(kind, csv_file):
+    """Importa clientes, usuários ou tickets de um arquivo CSV."""
+    report = IMPORTERS[kind](csv_file)
+    for error in report.errors:
+        click.echo(f"Linha {error['line']}: {error['error']}")
+    click.echo(f'{report.inserted} registros importados, {report.error_count} linhas com erro.')
+    if report.error_count:
+        raise SystemExit(1)
+
+@click.command('expire-uploads')
+def expire_uploads_command():
+    """Remove uploads em partes abandonados e seus arquivos de staging."""
+    total = expire_upload_sessions()
+    click.echo(f'{total} uploads expirados removidos.')
+
+@click.command('migrate-storage')
+@click.option('--batch-size', default=500, show_default=True, help='Registros por transação.')
+def migrate_storage_command(batch_size):
+    """Move os anexos existentes para o layout atual (pode rodar com a aplicação no ar)."""
+    report = migrate_storage_layout(batch_size)
+    for path in report.missing:
+        click.echo(f'Arquivo não encontrado: {path}')
+    click.echo(
+        f'{report.blobs_moved} blobs movidos, {report.files_converted} anexos convertidos, '
+        f'{report.up_to_date} já no layout atual, {len(report.missing)} ausentes.'
+    )
+
+@click.command('reconcile-storage')
+@click.option('--limit', type=int, default=None, help='Verifica no máximo N arquivos e continua na próxima execução.')
+def reconcile_storage_command(limit):
+    """Põe em quarentena os arquivos órfãos, apaga os vencidos e lista registros sem arquivo."""
+    report = reconcile_storage(limit)
+    for table, identifier, key in report.missing:
+        click.echo(f'Arquivo ausente: {table} {identifier} ({key})')
+    click.echo(
+        f'{report.scanned} arquivos verificados, {report.quarantined} em quarentena '
+        f'({report.quarantined_bytes} bytes), {report.restored} restaurados, '
+        f'{report.deleted} apagados, {report.reclaimed_bytes} bytes liberados.'
+    )
+    if not report.finished:
+        click.echo('Varredura incompleta; execute novamente para continuar.')
+
+@click.command('worker')
+@click.option('--threads', default=4, show_default=True, help='Jobs executados em paralelo.')
+@click.option('--burst', is_flag=True, help='Sai quando a fila estiver vazia.')
+def worker_command(threads, burst):
+    """Executa os jobs da fila em segundo plano."""
+    worker = Worker(current_app._get_current_object(), threads=threads)
+    # SIGTERM/Ctrl+C: termina os jobs em andamento e sai
+    signal.signal(signal.SIGTERM, lambda *args: worker.stop())
+    signal.signal(signal.SIGINT, lambda *args: worker.stop())
+    click.echo(f'Worker {worker.worker_id} iniciado com {threads} threads.')
+    worker.run(burst=burst)
+    click.echo(f'{worker.processed} jobs processados.')
+
+@click.command('jobs')
+@click.option('--requeue-dead', is_flag=True, help='Devolve os jobs do dead-letter à fila.')
+def jobs_command(requeue_dead):
+    """Mostra a fila de jobs por status."""
+    if requeue_dead:
+        click.echo(f'{requeue_dead_jobs()} jobs reenfileirados.')
+    for status, count in sorted(queue_stats().items()):
+        click.echo(f'{status}: {count}')
+
+@click.command('notify')
+@click.option('--once', is_flag=True, help='Faz uma única passada e sai.')
+def notify_command(once):
+    """Envia por e-mail as notificações dos eventos de tickets."""
+    dispatcher = NotificationDispatcher(current_app._get_current_object())
+    signal.signal(signal.SIGTERM, lambda *args: dispatcher.stop())
+    signal.signal(signal.SIGINT, lambda *args: dispatcher.stop())
+    dispatcher.run(once=once)
+    click.echo(f'{dispatcher.sent} mensagens enviadas.')
+
+def register_commands(app):
+    """Registra os comandos de linha de comando da aplicação"""
+    app.cli.add_command(upgrade_db_command)
+    app.cli.add_command(rebuild_counters_command)
+    app.cli.add_command(verify_counters_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(precompress_static_command)
+    app.cli.add_command(import_csv_command)
+    app.cli.add_command(expire_uploads_command)
+    app.cli.add_command(migrate_storage_command)
+    app.cli.add_command(reconcile_storage_command)
+    app.cli.add_command(worker_command)
+    app.cli.add_command(jobs_command)
+    app.cli.add_command(notify_command)
@@ -0,0 +1,154 @@
+import gzip
+import mimetypes
+import os
+import zlib
+
+from flask import request, send_file, send_from_directory
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+# Brotli é opcional: sem o pacote, apenas gzip é oferecido
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_SIZE = 500  # bytes
+COMPRESS_LEVEL = 6
+COMPRESS_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'text/javascript',
+    'text/css',
+    'text/html',
+    'text/plain',
+    'text/csv',
+    'application/x-ndjson',
+    'image/svg+xml'
+}
+
+# Variantes pré-comprimidas dos arquivos estáticos, por ordem de preferência
+STATIC_VARIANTS = (('br', '.br'), ('gzip', '.gz'))
+
+def negotiate_encoding():
+    """Escolhe a codificação aceita pelo cliente (br quando disponível, senão gzip)"""
+    accepted = request.accept_encodings
+    br_quality = accepted['br'] if brotli else 0
+    gzip_quality = accepted['gzip']
+    if br_quality and br_quality >= gzip_quality:
+        return 'br'
+    if gzip_quality:
+        return 'gzip'
+    return None
+
+def _compressor(encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=5)
+        return compressor.process, compressor.finish
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31)  # 31 = formato gzip
+    return compressor.compress, compressor.flush
+
+def compress_stream(chunks, encoding):
+    """Comprime um iterável de bytes sob demanda, sem juntar a resposta inteira"""
+    compress, finish = _compressor(encoding)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compress(chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close:
+            close()
+
+def _should_compress(response):
+    if request.method == 'HEAD' or response.status_code in (204, 206, 304):
+        return False
+    if not 200 <= response.status_code < 300:
+        return False
+    if 'Content-Encoding' in response.headers:
+        return False
+    if response.mimetype not in COMPRESS_MIMETYPES:
+        return False
+    # Anexos enviados direto do disco mantêm Range e não ocupam CPU comprimindo
+    if response.direct_passthrough and response.headers.get('Content-Disposition', '').startswith('attachment'):
+        return False
+    # Fluxos de eventos precisam chegar ao cliente sem buffer do compressor
+    return response.mimetype != 'text/event-stream'
+
+def compress_response(response):
+    """after_request: comprime respostas de texto conforme Accept-Encoding"""
+    if not _should_compress(response):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    encoding = negotiate_encoding()
+    if not encoding:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.direct_passthrough = False
+        response.headers.pop('Content-Length', None)
+        response.headers.pop('Accept-Ranges', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        compress, finish = _compressor(encoding)
+        response.set_data(compress(data) + finish())
+
+    response.headers['Content-Encoding'] = encoding
+    # A representação comprimida não é idêntica byte a byte: o ETag vira fraco
+    etag, _ = response.get_etag()
+    if etag:
+        response.set_etag(etag, weak=True)
+    return response
+
+def send_precompressed(directory, filename):
+    """Serve um arquivo estático, usando a variante .br/.gz quando existir.
+    
+    Sem variante, cai no send_from_directory e a compressão sob demanda.
+    """
+    path = safe_join(directory, filename)
+    if path is None:
+        raise NotFound()
+    
+    accepted = request.accept_encodings
+    for encoding, suffix in STATIC_VARIANTS:
+        if accepted[encoding] and os.path.isfile(path + suffix):
+            mimetype, _ = mimetypes.guess_type(filename)
+            response = send_file(path + suffix, mimetype=mimetype or 'application/octet-stream')
+            response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+            return response
+    return send_from_directory(directory, filename)
+
+def precompress_directory(directory):
+    """Gera as variantes .gz (e .br, se disponível) dos arquivos estáticos comprimíveis"""
+    written = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.endswith(('.gz', '.br')):
+                continue
+            path = os.path.join(root, name)
+            mimetype, _ = mimetypes.guess_type(path)
+            if mimetype not in COMPRESS_MIMETYPES or os.path.getsize(path) < COMPRESS_MIN_SIZE:
+                continue
+            with open(path, 'rb') as source:
+                data = source.read()
+            with open(path + '.gz', 'wb') as target:
+                target.write(gzip.compress(data, compresslevel=9, mtime=0))
+            written.append(path + '.gz')
+            if brotli:
+                with open(path + '.br', 'wb') as target:
+                    target.write(brotli.compress(data, quality=11))
+                written.append(path + '.br')
+    return written
+
+def init_compression(app):
+    """Registra a compressão de respostas na aplicação"""
+    app.after_request(compress_response)
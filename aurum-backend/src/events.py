@@ -0,0 +1,226 @@
+import json
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete, func
+
+from src.models.user import db, User
+from src.models.ticket_event import TicketEvent
+from src.models.notification import NotificationCursor
+from src.identity import build_permissions
+
+# Intervalo de leitura do outbox, heartbeat e retenção dos eventos
+POLL_INTERVAL = 1.0  # segundos
+HEARTBEAT_INTERVAL = 15  # segundos
+SUBSCRIBER_QUEUE_SIZE = 500
+EVENT_RETENTION = timedelta(days=1)
+PRUNE_INTERVAL = 3600  # segundos
+# Intervalo para conferir se as permissões dos assinantes mudaram
+PERMISSIONS_CHECK_INTERVAL = 5  # segundos
+# Streams simultâneos por processo quando EVENTS_MAX_STREAMS não é definido
+SYNC_STREAM_LIMIT = 8
+COOPERATIVE_STREAM_LIMIT = 1000
+
+def cooperative_server():
+    """True se o threading foi trocado por greenlets (gunicorn -k gevent ou eventlet)"""
+    gevent_monkey = sys.modules.get('gevent.monkey')
+    if gevent_monkey is not None and gevent_monkey.is_module_patched('threading'):
+        return True
+    eventlet_patcher = sys.modules.get('eventlet.patcher')
+    return eventlet_patcher is not None and eventlet_patcher.is_monkey_patched('thread')
+
+def stream_limit(app):
+    """Máximo de streams SSE abertos neste processo.
+
+    Cada stream fica preso em Subscription.wait enquanto o cliente está
+    conectado. Com greenlets (o worker gevent de gunicorn.conf.py) isso custa
+    pouco; com threads (servidor de desenvolvimento, workers sync/gthread),
+    cada stream ocupa uma thread, então o padrão é baixo para sobrar thread
+    para as outras requisições.
+    """
+    limit = app.config.get('EVENTS_MAX_STREAMS')
+    if limit is not None:
+        return limit
+    return COOPERATIVE_STREAM_LIMIT if cooperative_server() else SYNC_STREAM_LIMIT
+
+def event_visible(permissions, event):
+    """Mesmas regras de get_ticket_by_id, aplicadas ao escopo gravado no evento"""
+    if event['is_internal'] and not permissions['is_tech']:
+        return False
+    if permissions['can_view_all']:
+        return True
+    if permissions['can_view_company'] and event['company_id'] == permissions['company_id']:
+        return True
+    return event['user_id'] == permissions['user_id']
+
+def format_sse(event):
+    """Serializa um evento no formato text/event-stream"""
+    data = json.dumps(event['payload'], ensure_ascii=False)
+    return f"id: {event['id']}\nevent: {event['event_type']}\ndata: {data}\n\n"
+
+class Subscription:
+    """Fila de um assinante; quem consome espera no Event sem ocupar o banco"""
+
+    def __init__(self, permissions):
+        self.permissions = permissions
+        self.queue = deque()
+        self.ready = threading.Event()
+        self.overflowed = False
+        self.revoked = False
+
+    def push(self, event):
+        if len(self.queue) >= SUBSCRIBER_QUEUE_SIZE:
+            # Cliente lento: encerra o stream e ele retoma pelo Last-Event-ID
+            self.overflowed = True
+        else:
+            self.queue.append(event)
+        self.ready.set()
+
+    def revoke(self):
+        """Usuário removido: encerra o stream (a reconexão é recusada)"""
+        self.revoked = True
+        self.ready.set()
+
+    @property
+    def closed(self):
+        return self.overflowed or self.revoked
+
+    def wait(self, timeout):
+        """Espera eventos até o timeout e devolve os pendentes"""
+        self.ready.wait(timeout)
+        self.ready.clear()
+        events = []
+        while self.queue:
+            events.append(self.queue.popleft())
+        return events
+
+class EventHub:
+    """Distribui os eventos do outbox para os assinantes deste processo.
+
+    Uma única thread por processo lê ticket_events a cada POLL_INTERVAL e
+    entrega cada evento apenas aos assinantes que podem vê-lo. Assinantes
+    ociosos não acordam e não seguram conexões com o banco. A cada
+    PERMISSIONS_CHECK_INTERVAL a mesma thread confere a permissions_version
+    de todos os assinantes em uma consulta e atualiza quem mudou.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._thread = None
+        self._last_id = None
+
+    def subscribe(self, permissions, limit=None):
+        """Registra um assinante; None se já houver limit assinantes"""
+        subscription = Subscription(permissions)
+        with self._lock:
+            if limit is not None and len(self._subscribers) >= limit:
+                return None
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if event_visible(subscription.permissions, event):
+                subscription.push(event)
+
+    def start(self, app):
+        """Inicia a thread de leitura do outbox (uma vez por processo).
+        
+        Deve ser chamado dentro do contexto da aplicação.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._last_id = db.session.query(func.max(TicketEvent.id)).scalar() or 0
+            self._thread = threading.Thread(target=self._run, args=(app,), name='event-hub', daemon=True)
+            self._thread.start()
+
+    def _run(self, app):
+        last_prune = 0
+        last_check = time.monotonic()
+        while True:
+            try:
+                with app.app_context():
+                    self._poll()
+                    if time.monotonic() - last_check > PERMISSIONS_CHECK_INTERVAL:
+                        self._refresh_permissions()
+                        last_check = time.monotonic()
+                    if time.monotonic() - last_prune > PRUNE_INTERVAL:
+                        prune_events()
+                        last_prune = time.monotonic()
+                    db.session.remove()
+            except Exception as e:
+                app.logger.warning(f'Erro ao ler eventos: {e}')
+            time.sleep(POLL_INTERVAL)
+
+    def _poll(self):
+        for event in load_events_after(self._last_id):
+            self._last_id = event['id']
+            self.publish(event)
+
+    def _refresh_permissions(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers:
+            return
+        user_ids = {subscription.permissions['user_id'] for subscription in subscribers}
+        versions = dict(db.session.execute(
+            select(User.id, User.permissions_version).where(User.id.in_(user_ids))
+        ).all())
+        stale = [
+            subscription for subscription in subscribers
+            if versions.get(subscription.permissions['user_id']) != subscription.permissions['permissions_version']
+        ]
+        if not stale:
+            return
+        users = {
+            user.id: user
+            for user in User.query.filter(User.id.in_({s.permissions['user_id'] for s in stale}))
+        }
+        for subscription in stale:
+            user = users.get(subscription.permissions['user_id'])
+            if user is None:
+                subscription.revoke()
+            else:
+                subscription.permissions = build_permissions(user)
+
+def load_events_after(last_id, limit=500):
+    """Eventos do outbox com id maior que last_id, em ordem"""
+    rows = db.session.execute(
+        select(TicketEvent).where(TicketEvent.id > last_id).order_by(TicketEvent.id).limit(limit)
+    ).scalars()
+    return [row.to_dict() for row in rows]
+
+def oldest_event_id():
+    return db.session.query(func.min(TicketEvent.id)).scalar()
+
+def prune_events():
+    """Remove eventos mais antigos que a retenção.
+
+    Chamada pela thread do EventHub, pelo flask notify e pelo worker da fila
+    (o outbox não pode depender de alguém abrir o stream). Eventos que o
+    flask notify ainda não agrupou são mantidos.
+    """
+    cutoff = datetime.utcnow() - EVENT_RETENTION
+    condition = TicketEvent.created_at < cutoff
+    collected = db.session.query(NotificationCursor.last_event_id).filter(NotificationCursor.id == 1).scalar()
+    if collected is not None:
+        condition = condition & (TicketEvent.id <= collected)
+    db.session.execute(delete(TicketEvent).where(condition))
+    db.session.commit()
+
+event_hub = EventHub()
@@ -0,0 +1,41 @@
+import hashlib
+from datetime import timezone
+
+from flask import current_app, request
+
+def compute_etag(*parts):
+    """Gera um ETag forte a partir de marcas d'água baratas (contagens, datas, versões)"""
+    raw = '|'.join(str(part) for part in parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def _http_datetime(value):
+    # Colunas guardam UTC sem fuso; cabeçalhos HTTP têm precisão de segundos
+    return value.replace(tzinfo=timezone.utc, microsecond=0) if value else None
+
+def not_modified(etag, last_modified=None):
+    """Retorna uma resposta 304 se o cliente já tem esta versão, senão None.
+
+    If-None-Match tem precedência sobre If-Modified-Since (RFC 9110).
+    """
+    if request.if_none_match:
+        # Comparação fraca: respostas comprimidas levam o mesmo ETag como W/
+        matched = request.if_none_match.contains_weak(etag)
+    else:
+        last_modified = _http_datetime(last_modified)
+        matched = bool(
+            last_modified and request.if_modified_since
+            and last_modified <= request.if_modified_since
+        )
+
+    if not matched:
+        return None
+    return with_validators(current_app.response_class(status=304), etag, last_modified)
+
+def with_validators(response, etag, last_modified=None):
+    """Adiciona ETag, Last-Modified e Cache-Control à resposta"""
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = _http_datetime(last_modified)
+    # Dados autenticados: o navegador guarda, mas sempre revalida
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
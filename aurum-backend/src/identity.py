@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, has_app_context, session
+
+from src.models.user import db, User
+
+# Cache em processo das permissões por usuário. O TTL é a janela em que uma
+# alteração feita por outro processo ainda não é vista (ver get_current_permissions)
+IDENTITY_CACHE_SIZE = 1024
+IDENTITY_CACHE_TTL = 5  # segundos
+
+class IdentityCache:
+    """LRU com expiração por tempo, seguro para uso entre threads"""
+
+    def __init__(self, maxsize=IDENTITY_CACHE_SIZE, ttl=IDENTITY_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+identity_cache = IdentityCache()
+
+def init_identity(app):
+    """Aplica IDENTITY_CACHE_TTL da configuração ao cache de permissões"""
+    identity_cache.ttl = app.config.get('IDENTITY_CACHE_TTL', IDENTITY_CACHE_TTL)
+
+def build_permissions(user):
+    """Monta o conjunto de permissões a partir do perfil do usuário"""
+    return {
+        'user_id': user.id,
+        'username': user.username,
+        'profile': user.profile,
+        'permissions_version': user.permissions_version,
+        'is_admin': user.profile == 'administrador',
+        'is_tech': user.profile in ['administrador', 'tecnico'],
+        'can_view_all': user.profile in ['administrador', 'tecnico'],
+        'can_view_company': user.is_responsible,
+        'company_id': user.company_id
+    }
+
+def get_current_permissions():
+    """Retorna as permissões do usuário da sessão, ou None se não houver.
+
+    O resultado é resolvido uma vez por requisição (flask.g) e reaproveitado
+    entre requisições pelo cache em processo sem consultar o banco. Só quando
+    a entrada expira (IDENTITY_CACHE_TTL) o usuário é lido de novo.
+
+    Janela de desatualização: alterações feitas neste processo valem na hora
+    (invalidate_permissions); as feitas por outro processo, inclusive a
+    exclusão do usuário, levam até IDENTITY_CACHE_TTL segundos para valer.
+    """
+    if 'permissions' in g:
+        return g.permissions
+
+    user_id = session.get('user_id')
+    permissions = None
+    if user_id is not None:
+        permissions = identity_cache.get(user_id)
+        if permissions is None:
+            user = db.session.get(User, user_id)
+            permissions = build_permissions(user) if user else None
+            if permissions:
+                identity_cache.set(user_id, permissions)
+
+    g.permissions = permissions
+    return permissions
+
+def invalidate_permissions(user_id):
+    """Descarta as permissões em cache de um usuário alterado ou removido.
+
+    Vale só para este processo (e a cópia da requisição atual); os outros
+    percebem a mudança quando a entrada deles expira.
+    """
+    identity_cache.discard(user_id)
+    if has_app_context() and g.get('permissions') and g.permissions['user_id'] == user_id:
+        g.pop('permissions')
@@ -0,0 +1,276 @@
+import csv
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import repeat
+
+from sqlalchemy import insert, select
+
+from src.models.user import db, User
+from src.models.client import Client
+from src.models.service_type import ServiceType
+from src.models.ticket import Ticket
+from src.models.ticket_counter import insert_deltas, apply_counter_deltas
+from src.passwords import hash_in_worker, log_rounds
+
+# Linhas por INSERT em lote (executemany) e erros devolvidos no relatório
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+HASH_WORKERS = os.cpu_count() or 1
+
+PROFILES = ('administrador', 'tecnico', 'usuario')
+TICKET_STATUSES = ('aberto', 'em_andamento', 'fechado')
+TICKET_PRIORITIES = ('baixa', 'media', 'alta', 'urgente')
+BCRYPT_HASH = re.compile(r'\$2[aby]\$\d{2}\$[./A-Za-z0-9]{53}')
+
+_pool_lock = threading.Lock()
+_pool = None
+_pool_pid = None
+
+def _hash_pool():
+    """Pool de processos das importações, criado uma vez por processo.
+
+    Separado do pool dos logins (src.passwords) para uma importação grande
+    não ocupar a fila deles; reaproveitado entre importações em vez de
+    criar processos a cada chamada.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+            _pool_pid = os.getpid()
+        return _pool
+
+class ImportReport:
+    """Resultado de uma importação: linhas inseridas e erros por linha"""
+
+    def __init__(self):
+        self.inserted = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def to_dict(self):
+        return {
+            'inserted': self.inserted,
+            'error_count': self.error_count,
+            'errors': self.errors
+        }
+
+def _clean(row):
+    return {key.strip(): (value or '').strip() for key, value in row.items() if key}
+
+def _parse_bool(value):
+    return value.lower() in ('1', 'true', 'sim', 's', 'yes')
+
+def _parse_datetime(value, field):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Data inválida em {field}: use o formato ISO 8601')
+
+def _insert_batches(rows, model, report, prepare=None):
+    """Valida as linhas (gerador de (linha, dados)) e insere em lotes"""
+    batch = []
+
+    def flush():
+        if prepare:
+            prepare(batch)
+        db.session.execute(insert(model.__table__), batch)
+        report.inserted += len(batch)
+        batch.clear()
+
+    for line, values in rows:
+        batch.append(values)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+
+def _validated(reader, report, validate):
+    for row in reader:
+        try:
+            yield reader.line_num, validate(_clean(row))
+        except ValueError as e:
+            report.error(reader.line_num, str(e))
+
+def import_clients(stream):
+    """Importa clientes de um CSV (name, email, phone, company, address)"""
+    report = ImportReport()
+    emails = set(db.session.scalars(select(Client.email)))
+    now = datetime.utcnow()
+
+    def validate(row):
+        if not row.get('name'):
+            raise ValueError('Nome é obrigatório')
+        email = row.get('email')
+        if not email:
+            raise ValueError('Email é obrigatório')
+        if email in emails:
+            raise ValueError('Email já cadastrado')
+        emails.add(email)
+        return {
+            'name': row['name'],
+            'email': email,
+            'phone': row.get('phone') or None,
+            'company': row.get('company') or None,
+            'address': row.get('address') or None,
+            'active': True,
+            'created_at': now,
+            'updated_at': now
+        }
+
+    _insert_batches(_validated(csv.DictReader(stream), report, validate), Client, report)
+    db.session.commit()
+    return report
+
+def import_users(stream):
+    """Importa usuários de um CSV.
+
+    Colunas: username, email, password (ou password_hash bcrypt já pronto),
+    profile, company_id, is_responsible. As senhas são processadas em
+    paralelo no pool de processos das importações, todas antes do primeiro
+    INSERT: o bcrypt de milhares de senhas leva minutos e, com a transação
+    de escrita aberta, o SQLite recusaria as escritas do resto da aplicação.
+    """
+    report = ImportReport()
+    usernames, emails = set(), set()
+    for username, email in db.session.execute(select(User.username, User.email)):
+        usernames.add(username)
+        if email:
+            emails.add(email)
+    company_ids = set(db.session.scalars(select(Client.id)))
+    rounds = log_rounds()
+
+    def validate(row):
+        username = row.get('username')
+        if not username:
+            raise ValueError('Nome de usuário é obrigatório')
+        if username in usernames:
+            raise ValueError('Nome de usuário já existe')
+        if not row.get('password') and not row.get('password_hash'):
+            raise ValueError('Senha é obrigatória')
+        if row.get('password_hash') and not BCRYPT_HASH.fullmatch(row['password_hash']):
+            raise ValueError('password_hash deve ser um hash bcrypt ($2b$12$...)')
+        profile = row.get('profile')
+        if profile not in PROFILES:
+            raise ValueError('Perfil deve ser: administrador, tecnico ou usuario')
+        company_id = int(row['company_id']) if row.get('company_id', '').isdigit() else None
+        if row.get('company_id') and company_id not in company_ids:
+            raise ValueError('Empresa não encontrada')
+        if profile == 'usuario' and not company_id:
+            raise ValueError('Empresa é obrigatória para usuários')
+        email = row.get('email') or None
+        if email and email in emails:
+            raise ValueError('Email já está em uso')
+
+        usernames.add(username)
+        if email:
+            emails.add(email)
+        return {
+            'username': username,
+            'email': email,
+            'password_hash': row.get('password_hash') or None,
+            'password': row.get('password'),
+            'profile': profile,
+            'company_id': company_id,
+            'is_responsible': _parse_bool(row.get('is_responsible', '')),
+            'permissions_version': 0
+        }
+
+    rows = list(_validated(csv.DictReader(stream), report, validate))
+    pending = [values for _, values in rows if not values['password_hash']]
+    if pending:
+        hashes = _hash_pool().map(
+            hash_in_worker,
+            [values['password'] for values in pending],
+            repeat(rounds),
+            chunksize=max(1, len(pending) // (HASH_WORKERS * 4))
+        )
+        for values, password_hash in zip(pending, hashes):
+            values['password_hash'] = password_hash
+    for _, values in rows:
+        del values['password']
+
+    _insert_batches(rows, User, report)
+    db.session.commit()
+    return report
+
+def import_tickets(stream):
+    """Importa tickets históricos de um CSV.
+
+    Colunas: title, description, service_type (nome), priority, status,
+    username (solicitante), assigned_username, company_id, created_at,
+    closed_at. Os contadores são atualizados em lote; não são gerados
+    eventos de ticket.created para o histórico.
+    """
+    report = ImportReport()
+    users = {
+        username: (user_id, company_id)
+        for user_id, username, company_id in db.session.execute(select(User.id, User.username, User.company_id))
+    }
+    service_types = set(db.session.scalars(select(ServiceType.name)))
+    company_ids = set(db.session.scalars(select(Client.id)))
+    now = datetime.utcnow()
+
+    def validate(row):
+        if not row.get('title') or not row.get('description') or not row.get('service_type'):
+            raise ValueError('Título, descrição e tipo de serviço são obrigatórios')
+        if row['service_type'] not in service_types:
+            raise ValueError('Tipo de serviço inválido')
+        priority = row.get('priority') or 'media'
+        if priority not in TICKET_PRIORITIES:
+            raise ValueError('Prioridade inválida')
+        status = row.get('status') or 'aberto'
+        if status not in TICKET_STATUSES:
+            raise ValueError('Status inválido')
+        if row.get('username') not in users:
+            raise ValueError('Solicitante não encontrado')
+        user_id, user_company_id = users[row['username']]
+        assigned_to = None
+        if row.get('assigned_username'):
+            if row['assigned_username'] not in users:
+                raise ValueError('Técnico não encontrado')
+            assigned_to = users[row['assigned_username']][0]
+        if row.get('company_id') and not row['company_id'].isdigit():
+            raise ValueError('company_id deve ser numérico')
+        company_id = int(row['company_id']) if row.get('company_id') else user_company_id
+        if company_id not in company_ids:
+            raise ValueError('Empresa é obrigatória')
+        created_at = _parse_datetime(row.get('created_at'), 'created_at') or now
+        closed_at = _parse_datetime(row.get('closed_at'), 'closed_at')
+        return {
+            'title': row['title'],
+            'description': row['description'],
+            'service_type': row['service_type'],
+            'priority': priority,
+            'status': status,
+            'user_id': user_id,
+            'assigned_to': assigned_to,
+            'company_id': company_id,
+            'created_at': created_at,
+            'updated_at': closed_at or created_at,
+            'closed_at': closed_at
+        }
+
+    def count_batch(batch):
+        # O INSERT em lote não passa pelo flush que mantém os contadores
+        apply_counter_deltas(db.session.connection(), insert_deltas(batch))
+
+    _insert_batches(_validated(csv.DictReader(stream), report, validate), Ticket, report, count_batch)
+    db.session.commit()
+    return report
+
+IMPORTERS = {
+    'clients': import_clients,
+    'users': import_users,
+    'tickets': import_tickets
+}
@@ -0,0 +1,226 @@
+import json
+import os
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select, update
+
+from src.models.user import db
+from src.models.job import Job
+from src.events import PRUNE_INTERVAL, prune_events
+
+# Espera entre tentativas: RETRY_BASE_DELAY * 2^(tentativa-1), até RETRY_MAX_DELAY
+RETRY_BASE_DELAY = 5  # segundos
+RETRY_MAX_DELAY = 3600  # segundos
+# Job em running há mais que isso é considerado abandonado (worker caiu)
+JOB_TIMEOUT = timedelta(minutes=10)
+JOB_RETENTION = timedelta(days=1)
+POLL_INTERVAL = 1.0  # segundos
+# Jobs reservados por thread a cada claim: menos transações por job
+PREFETCH = 8
+MAINTENANCE_INTERVAL = 60  # segundos
+
+HANDLERS = {}
+
+def job_handler(kind):
+    """Registra a função que executa os jobs de um tipo (recebe o payload)"""
+    def register(function):
+        HANDLERS[kind] = function
+        return function
+    return register
+
+def enqueue(kind, payload=None, priority=0, delay=0, max_attempts=5):
+    """Adiciona um job à sessão atual.
+
+    O job só é gravado no commit da requisição, na mesma transação das
+    alterações que o originaram: se a requisição falhar, o job não existe.
+    """
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload or {}),
+        priority=priority,
+        max_attempts=max_attempts,
+        run_at=datetime.utcnow() + timedelta(seconds=delay)
+    )
+    db.session.add(job)
+    return job
+
+def claim_jobs(worker_id, limit):
+    """Reserva até limit jobs prontos para este worker.
+
+    Um único UPDATE ... RETURNING: no SQLite a escrita é serializada, então
+    dois workers nunca recebem o mesmo job.
+    """
+    now = datetime.utcnow()
+    jobs = Job.__table__
+    candidates = select(jobs.c.id).where(
+        jobs.c.status == 'queued',
+        jobs.c.run_at <= now
+    ).order_by(jobs.c.priority.desc(), jobs.c.run_at, jobs.c.id).limit(limit)
+
+    stmt = update(jobs).where(jobs.c.id.in_(candidates)).values(
+        status='running',
+        locked_by=worker_id,
+        locked_at=now,
+        attempts=jobs.c.attempts + 1
+    ).returning(jobs.c.id, jobs.c.kind, jobs.c.payload, jobs.c.priority, jobs.c.attempts, jobs.c.max_attempts)
+
+    with db.engine.begin() as connection:
+        claimed = connection.execute(stmt).all()
+    return sorted(claimed, key=lambda job: -job.priority)
+
+def retry_delay(attempts):
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempts - 1))
+    # Jitter evita que jobs que falharam juntos voltem todos ao mesmo tempo
+    return delay * random.uniform(0.5, 1.0)
+
+def record_results(results, worker_id):
+    """Grava o resultado de vários jobs em uma transação.
+
+    results é uma lista de (job, erro ou None). Jobs com erro voltam à fila
+    com backoff ou, sem tentativas restantes, vão para o dead-letter.
+    """
+    jobs = Job.__table__
+    now = datetime.utcnow()
+    # Só altera jobs ainda reservados por este worker
+    mine = jobs.c.locked_by == worker_id
+    done = [job.id for job, error in results if error is None]
+    
+    with db.engine.begin() as connection:
+        if done:
+            connection.execute(
+                update(jobs).where(jobs.c.id.in_(done), mine)
+                .values(status='done', finished_at=now, locked_by=None, locked_at=None, last_error=None)
+            )
+        for job, error in results:
+            if error is None:
+                continue
+            if job.attempts >= job.max_attempts:
+                # Dead-letter: fica guardado para análise e pode ser reenfileirado
+                values = {'status': 'dead', 'finished_at': now}
+            else:
+                values = {'status': 'queued', 'run_at': now + timedelta(seconds=retry_delay(job.attempts))}
+            connection.execute(
+                update(jobs).where(jobs.c.id == job.id, mine)
+                .values(locked_by=None, locked_at=None, last_error=error, **values)
+            )
+
+def recover_stale_jobs():
+    """Devolve à fila (ou ao dead-letter) os jobs de workers que caíram"""
+    jobs = Job.__table__
+    cutoff = datetime.utcnow() - JOB_TIMEOUT
+    stale = (jobs.c.status == 'running') & (jobs.c.locked_at < cutoff)
+    with db.engine.begin() as connection:
+        dead = connection.execute(
+            update(jobs).where(stale, jobs.c.attempts >= jobs.c.max_attempts)
+            .values(status='dead', locked_by=None, locked_at=None, last_error='Tempo esgotado')
+        ).rowcount
+        requeued = connection.execute(
+            update(jobs).where(stale).values(status='queued', locked_by=None, locked_at=None)
+        ).rowcount
+    return requeued, dead
+
+def prune_jobs():
+    """Remove jobs concluídos mais antigos que a retenção"""
+    cutoff = datetime.utcnow() - JOB_RETENTION
+    with db.engine.begin() as connection:
+        return connection.execute(
+            delete(Job.__table__).where(Job.status == 'done', Job.finished_at < cutoff)
+        ).rowcount
+
+def requeue_dead_jobs(kind=None):
+    """Devolve os jobs do dead-letter à fila, com as tentativas zeradas"""
+    jobs = Job.__table__
+    stmt = update(jobs).where(jobs.c.status == 'dead')
+    if kind:
+        stmt = stmt.where(jobs.c.kind == kind)
+    with db.engine.begin() as connection:
+        return connection.execute(
+            stmt.values(status='queued', attempts=0, run_at=datetime.utcnow(), finished_at=None)
+        ).rowcount
+
+def queue_stats():
+    """Quantidade de jobs por status"""
+    rows = db.session.query(Job.status, func.count(Job.id)).group_by(Job.status)
+    return dict(rows.all())
+
+class Worker:
+    """Executa jobs da fila em um pool de threads.
+
+    A cada volta do loop o worker grava os resultados dos jobs concluídos e
+    reserva novos jobs (até PREFETCH por thread), cada um em uma única
+    transação. stop() termina os jobs reservados antes de sair.
+    """
+
+    def __init__(self, app, threads=4):
+        self.app = app
+        self.threads = threads
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.processed = 0
+        self._stopping = threading.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    def run(self, burst=False):
+        """Processa jobs até stop(); com burst, sai quando a fila esvazia"""
+        last_maintenance = 0
+        last_prune = 0
+        capacity = self.threads * PREFETCH
+        running = set()
+        with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='job') as pool:
+            while True:
+                finished = [future for future in running if future.done()]
+                running.difference_update(finished)
+                
+                with self.app.app_context():
+                    if finished:
+                        record_results([future.result() for future in finished], self.worker_id)
+                        self.processed += len(finished)
+                    
+                    if self._stopping.is_set():
+                        if not running:
+                            break
+                    else:
+                        if time.monotonic() - last_maintenance > MAINTENANCE_INTERVAL:
+                            recover_stale_jobs()
+                            prune_jobs()
+                            last_maintenance = time.monotonic()
+                        # O outbox é limpo mesmo sem ninguém no stream de eventos
+                        if time.monotonic() - last_prune > PRUNE_INTERVAL:
+                            prune_events()
+                            last_prune = time.monotonic()
+                        
+                        free = capacity - len(running)
+                        if free:
+                            claimed = claim_jobs(self.worker_id, free)
+                            running.update(pool.submit(self.execute, job) for job in claimed)
+                
+                if not running:
+                    if burst or self._stopping.is_set():
+                        break
+                    self._stopping.wait(POLL_INTERVAL)
+                    continue
+                
+                wait(running, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+
+    def execute(self, job):
+        """Executa um job; retorna (job, erro ou None) para record_results"""
+        with self.app.app_context():
+            try:
+                handler = HANDLERS.get(job.kind)
+                if handler is None:
+                    raise LookupError(f'Tipo de job desconhecido: {job.kind}')
+                handler(json.loads(job.payload))
+                db.session.commit()
+                return job, None
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.warning(f'Job {job.id} ({job.kind}) falhou: {e}')
+                return job, f'{type(e).__name__}: {e}'
+            finally:
+                db.session.remove()
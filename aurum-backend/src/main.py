@@ -5,27 +5,98 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from flask import Flask, send_from_directory
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from src.models.user import db, User, bcrypt
 from src.models.client import Client
 from src.models.service_type import ServiceType
 from src.models.ticket import Ticket
 from src.models.ticket_response import TicketResponse
 from src.models.ticket_file import TicketFile
+from src.models.file_blob import FileBlob
+from src.models.upload_session import UploadSession
+from src.models.job import Job
+from src.models.email_config import EmailConfig
+from src.models.notification import NotificationBatch, NotificationCursor
+from src.models.quarantined_file import QuarantinedFile, StorageScanCursor
+from src.models.ticket_counter import TicketCounter
+from src.models.ticket_tombstone import TicketTombstone
+from src.models.ticket_change import TicketChangeCounter
+from src.models.ticket_event import TicketEvent
 from src.routes.user import user_bp
 from src.routes.auth import auth_bp
 from src.routes.tickets import tickets_bp
 from src.routes.users import users_bp
 from src.routes.clients import clients_bp
 from src.routes.service_types import service_types_bp
+from src.routes.events import events_bp
+from src.routes.imports import imports_bp
+from src.routes.uploads import uploads_bp
+from src.migrations import upgrade_schema
+from src.commands import register_commands
+from src.compression import init_compression, send_precompressed
+from src.identity import init_identity
+from src.passwords import init_passwords
+from src.storage import UploadRequest, init_storage
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+# Anexos de tickets são gravados com hash e limite de tamanho durante o recebimento
+app.request_class = UploadRequest
 
 # Habilita CORS para todas as rotas
 CORS(app, supports_credentials=True)
 
 # Inicializa o bcrypt
 bcrypt.init_app(app)
+# Custo do bcrypt (hashes antigos são regravados no próximo login) e pool de hashing
+app.config['BCRYPT_LOG_ROUNDS'] = 12
+app.config['PASSWORD_HASH_WORKERS'] = os.cpu_count() or 1
+app.config['PASSWORD_HASH_QUEUE_SIZE'] = app.config['PASSWORD_HASH_WORKERS'] * 4
+init_passwords(app)
+# Tentativas de login: (quantidade, janela em segundos) por IP e por usuário.
+# LOGIN_THROTTLE_DB aponta para um arquivo SQLite para compartilhar os limites
+# entre processos e reinícios; None mantém os contadores em memória.
+app.config['LOGIN_THROTTLE_IP'] = (20, 60)
+app.config['LOGIN_THROTTLE_USERNAME'] = (5, 60)
+app.config['LOGIN_THROTTLE_DB'] = None
+# Segundos em que as permissões de um usuário ficam em cache sem reler o banco.
+# Alterações feitas em outro processo (perfil, empresa, exclusão) podem levar
+# esse tempo para valer; 0 relê o usuário a cada requisição
+app.config['IDENTITY_CACHE_TTL'] = 5
+init_identity(app)
+# Quantidade de proxies reversos confiáveis na frente da aplicação (nginx = 1).
+# Com 0, request.remote_addr é o endereço da conexão; com N, vem do
+# X-Forwarded-For escrito pelos proxies (senão todos os clientes atrás do
+# proxy dividiriam o mesmo limite por IP). Nunca use N > 0 sem proxy: o
+# cabeçalho seria do próprio cliente.
+app.config['TRUSTED_PROXIES'] = 0
+if app.config['TRUSTED_PROXIES']:
+    proxies = app.config['TRUSTED_PROXIES']
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies, x_host=proxies)
+# Armazenamento dos anexos: backend e raiz absoluta (blobs em subpastas pelo hash)
+app.config['STORAGE_BACKEND'] = 'local'
+app.config['UPLOAD_ROOT'] = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads', 'tickets')
+init_storage(app)
+# Download de anexos pelo proxy: None (o Flask envia), 'x-accel' (nginx, com
+# "location /protected-uploads/ { internal; alias <pasta de uploads>/; }")
+# ou 'x-sendfile' (Apache mod_xsendfile / lighttpd)
+app.config['FILE_DOWNLOAD_OFFLOAD'] = None
+app.config['X_ACCEL_PREFIX'] = '/protected-uploads/'
+# Notificações por e-mail (flask notify): alterações de um chamado são agrupadas
+# até ele ficar NOTIFICATION_WINDOW segundos sem mudanças (no máximo
+# NOTIFICATION_MAX_DELAY); responsáveis recebem um resumo a cada
+# NOTIFICATION_DIGEST_INTERVAL segundos (None desativa o resumo)
+app.config['NOTIFICATION_WINDOW'] = 60
+app.config['NOTIFICATION_MAX_DELAY'] = 300
+app.config['NOTIFICATION_DIGEST_INTERVAL'] = 3600
+# Streams SSE (/api/events) abertos por processo. Cada stream prende um worker
+# enquanto o cliente está conectado: em produção use workers com greenlets
+# (gunicorn -k gevent), que aceitam muitos streams. None usa o padrão de
+# src/events.py (alto com gevent/eventlet, baixo com threads)
+app.config['EVENTS_MAX_STREAMS'] = None
+
+# Comprime respostas JSON e arquivos de texto (gzip/brotli)
+init_compression(app)
 
 app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
@@ -33,13 +104,26 @@ app.register_blueprint(tickets_bp, url_prefix='/api')
 app.register_blueprint(users_bp, url_prefix='/api')
 app.register_blueprint(clients_bp, url_prefix='/api')
 app.register_blueprint(service_types_bp, url_prefix='/api')
+app.register_blueprint(events_bp, url_prefix='/api')
+app.register_blueprint(imports_bp, url_prefix='/api')
+app.register_blueprint(uploads_bp, url_prefix='/api')
 
 # uncomment if you need to use database
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+# DATABASE_URL permite usar outro banco (os testes usam um arquivo temporário)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+    'DATABASE_URL',
+    f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Estatísticas lidas da tabela ticket_counters (False usa GROUP BY direto nos tickets)
+app.config['TICKET_COUNTERS_ENABLED'] = True
 db.init_app(app)
+register_commands(app)
 with app.app_context():
     db.create_all()
+    # Aplica colunas e índices novos em bancos já existentes (create_all não altera tabelas)
+    upgrade_schema()
+    TicketCounter.ensure_built()
     
     # Cria usuários padrão se não existirem
     if User.query.count() == 0:
@@ -82,7 +166,7 @@ with app.app_context():
 @app.route('/forms/<path:filename>')
 def serve_forms(filename):
     """Serve form files"""
-    return send_from_directory('static/forms', filename)
+    return send_precompressed(os.path.join(app.static_folder, 'forms'), filename)
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -92,11 +176,11 @@ def serve(path):
             return "Static folder not configured", 404
 
     if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
+        return send_precompressed(static_folder_path, path)
     else:
         index_path = os.path.join(static_folder_path, 'index.html')
         if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
+            return send_precompressed(static_folder_path, 'index.html')
         else:
             return "index.html not found", 404
 
@@ -0,0 +1,126 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+
+from src.models.user import db
+from src.models.ticket_search import create_search_index
+from src.models.ticket_tombstone import create_tombstone_triggers
+from src.models.ticket_change import create_change_triggers
+from src.models.file_blob import create_blob_triggers
+
+# Consultas mais frequentes da API, usadas para conferir o plano de execução.
+# Cada item traz a descrição, o SQL e os parâmetros de exemplo.
+HOT_QUERIES = [
+    (
+        'Listagem (administrador/técnico)',
+        'SELECT id FROM tickets ORDER BY created_at DESC, id DESC LIMIT 51',
+        {}
+    ),
+    (
+        'Listagem por empresa',
+        'SELECT id FROM tickets WHERE company_id = :company_id '
+        'ORDER BY created_at DESC, id DESC LIMIT 51',
+        {'company_id': 1}
+    ),
+    (
+        'Listagem por solicitante',
+        'SELECT id FROM tickets WHERE user_id = :user_id '
+        'ORDER BY created_at DESC, id DESC LIMIT 51',
+        {'user_id': 1}
+    ),
+    (
+        'Estatísticas por empresa',
+        'SELECT count(*) FROM tickets WHERE company_id = :company_id AND status = :status',
+        {'company_id': 1, 'status': 'aberto'}
+    ),
+    (
+        'Estatísticas por solicitante',
+        'SELECT count(*) FROM tickets WHERE user_id = :user_id AND status = :status',
+        {'user_id': 1, 'status': 'aberto'}
+    ),
+    (
+        'Chamados atribuídos ao técnico',
+        'SELECT id FROM tickets WHERE assigned_to = :user_id AND status = :status',
+        {'user_id': 1, 'status': 'aberto'}
+    ),
+    (
+        'Respostas do chamado (página)',
+        'SELECT id FROM ticket_responses WHERE ticket_id = :ticket_id '
+        'ORDER BY created_at DESC, id DESC LIMIT 51',
+        {'ticket_id': 1}
+    ),
+    (
+        'Anexos dos chamados da página',
+        'SELECT id FROM ticket_files WHERE ticket_id IN (1, 2, 3)',
+        {}
+    ),
+    (
+        'Sincronização incremental por empresa',
+        'SELECT id FROM tickets WHERE company_id = :company_id '
+        'AND (change_seq > :change_seq OR (change_seq = :change_seq AND id > :id)) '
+        'ORDER BY change_seq, id LIMIT 101',
+        {'company_id': 1, 'change_seq': 0, 'id': 0}
+    ),
+    (
+        'Login por usuário ou e-mail',
+        'SELECT id FROM "user" WHERE username = :username OR email = :username',
+        {'username': 'admin.sistema'}
+    ),
+]
+
+def upgrade_schema():
+    """Aplica ao banco existente as colunas e índices declarados nos modelos.
+    
+    db.create_all() só cria tabelas inexistentes, então bancos criados antes
+    dessas mudanças precisam desta etapa. Retorna a descrição do que foi criado.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+    
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        
+        # Colunas novas precisam de server_default quando NOT NULL
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                ddl = CreateColumn(column).compile(dialect=db.engine.dialect)
+                with db.engine.begin() as connection:
+                    connection.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN {ddl}'))
+                created.append(f'coluna {table.name}.{column.name}')
+        
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(bind=db.engine)
+                created.append(f'índice {index.name}')
+    
+    # Índice de busca textual (FTS5), mantido por triggers
+    if create_search_index():
+        created.append('índice de busca ticket_search')
+    
+    # Triggers idempotentes (CREATE TRIGGER IF NOT EXISTS)
+    create_tombstone_triggers()
+    create_blob_triggers()
+    create_change_triggers()
+    
+    return created
+
+def explain_hot_queries():
+    """Retorna o plano de execução (EXPLAIN QUERY PLAN) das consultas frequentes.
+    
+    Cada item é (descrição, linhas do plano, usa_indice). Uma consulta é
+    considerada ruim quando varre a tabela inteira sem índice.
+    """
+    results = []
+    with db.engine.connect() as connection:
+        for description, sql, params in HOT_QUERIES:
+            rows = connection.execute(text(f'EXPLAIN QUERY PLAN {sql}'), params).fetchall()
+            plan = [row[-1] for row in rows]
+            full_scan = any(
+                detail.startswith('SCAN') and 'INDEX' not in detail
+                for detail in plan
+            )
+            results.append((description, plan, not full_scan))
+    return results
@@ -0,0 +1,37 @@
+from datetime import datetime
+from sqlalchemy import text
+
+# Importa a instância do db do módulo user
+from .user import db
+
+class FileBlob(db.Model):
+    """Conteúdo de um anexo, armazenado uma única vez pelo hash SHA-256.
+
+    Vários TicketFile podem apontar para o mesmo blob. ref_count é mantido
+    pelos triggers abaixo, então também acompanha exclusões feitas fora do ORM;
+    blobs com ref_count 0 podem ser removidos do disco.
+    """
+    __tablename__ = 'file_blobs'
+
+    content_hash = db.Column(db.String(64), primary_key=True)  # SHA-256 em hexadecimal
+    size = db.Column(db.Integer, nullable=False)
+    path = db.Column(db.String(500), nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+BLOB_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS ticket_files_blob_ref AFTER INSERT ON ticket_files
+    WHEN new.content_hash IS NOT NULL BEGIN
+        UPDATE file_blobs SET ref_count = ref_count + 1 WHERE content_hash = new.content_hash;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS ticket_files_blob_unref AFTER DELETE ON ticket_files
+    WHEN old.content_hash IS NOT NULL BEGIN
+        UPDATE file_blobs SET ref_count = ref_count - 1 WHERE content_hash = old.content_hash;
+    END""",
+]
+
+def create_blob_triggers():
+    """Cria (se necessário) os triggers que mantêm file_blobs.ref_count"""
+    with db.engine.begin() as connection:
+        for statement in BLOB_TRIGGERS:
+            connection.execute(text(statement))
@@ -0,0 +1,50 @@
+import json
+from datetime import datetime
+
+# Importa a instância do db do módulo user
+from .user import db
+
+class Job(db.Model):
+    """Tarefa em segundo plano, gravada no mesmo banco da aplicação.
+
+    Status: queued (aguardando run_at), running (com um worker), done,
+    dead (esgotou as tentativas). Maior prioridade é executada primeiro.
+    """
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # Índice da consulta de claim: status, prioridade e horário
+        db.Index('ix_jobs_claim', 'status', 'priority', 'run_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    priority = db.Column(db.Integer, nullable=False, default=0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def data(self):
+        return json.loads(self.payload)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'payload': self.data,
+            'status': self.status,
+            'priority': self.priority,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_at': self.run_at.isoformat() if self.run_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
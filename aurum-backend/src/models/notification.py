@@ -0,0 +1,36 @@
+from datetime import datetime
+
+# Importa a instância do db do módulo user
+from .user import db
+
+class NotificationBatch(db.Model):
+    """Eventos do outbox aguardando envio por e-mail, agrupados por escopo.
+
+    scope 'ticket' junta as alterações de um chamado em uma única mensagem;
+    scope 'company' junta as de uma empresa no resumo (digest) enviado aos
+    responsáveis. Os eventos são os de ticket_events entre first_event_id e
+    last_event_id.
+    """
+    __tablename__ = 'notification_batches'
+
+    scope = db.Column(db.String(20), primary_key=True)
+    scope_id = db.Column(db.Integer, primary_key=True)
+    first_event_id = db.Column(db.Integer, nullable=False)
+    last_event_id = db.Column(db.Integer, nullable=False)
+    event_count = db.Column(db.Integer, nullable=False, default=0)
+    first_at = db.Column(db.DateTime, nullable=False)
+    last_at = db.Column(db.DateTime, nullable=False)
+    # Destinatários que já receberam esta versão do grupo (lista JSON)
+    delivered = db.Column(db.Text, nullable=False, default='[]', server_default='[]')
+    # Falhas temporárias de envio: nova tentativa em retry_at
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    retry_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.String(500), nullable=True)
+
+class NotificationCursor(db.Model):
+    """Último evento do outbox já agrupado em notification_batches (uma linha)"""
+    __tablename__ = 'notification_cursor'
+
+    id = db.Column(db.Integer, primary_key=True)
+    last_event_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
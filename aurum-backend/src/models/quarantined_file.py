@@ -0,0 +1,31 @@
+from datetime import datetime
+
+# Importa a instância do db do módulo user
+from .user import db
+
+class QuarantinedFile(db.Model):
+    """Arquivo órfão movido para a quarentena do armazenamento.
+
+    key é a chave original (para onde o arquivo volta se voltar a ser
+    usado); o arquivo fica em quarantine/<key> até ser apagado após o
+    período de quarentena.
+    """
+    __tablename__ = 'quarantined_files'
+
+    key = db.Column(db.String(500), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(50), nullable=False)
+    quarantined_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+class StorageScanCursor(db.Model):
+    """Última chave verificada pelo reconciliador (uma linha).
+
+    Permite continuar a varredura do armazenamento de onde parou; volta a
+    vazio quando a varredura completa termina.
+    """
+    __tablename__ = 'storage_scan_cursor'
+
+    id = db.Column(db.Integer, primary_key=True)
+    last_key = db.Column(db.String(500), nullable=False, default='')
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -14,6 +14,12 @@ class ServiceType(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    @classmethod
+    def list_watermark(cls):
+        """Contagem e última alteração dos registros ativos (base do ETag da listagem)"""
+        return db.session.query(db.func.count(cls.id), db.func.max(cls.updated_at)) \
+            .filter(cls.active == True).one()
+    
     def to_dict(self):
         return {
             'id': self.id,
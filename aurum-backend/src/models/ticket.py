@@ -1,11 +1,76 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload, selectinload, load_only, query_expression, with_expression
 from datetime import datetime
 
 # Importa a instância do db do módulo user
 from .user import db
 
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+# Campos serializáveis do ticket e como obter cada um
+TICKET_FIELDS = {
+    'id': lambda t: t.id,
+    'title': lambda t: t.title,
+    'description': lambda t: t.description,
+    'status': lambda t: t.status,
+    'priority': lambda t: t.priority,
+    'service_type': lambda t: t.service_type,
+    'user_id': lambda t: t.user_id,
+    'user_name': lambda t: t.user.username if t.user else None,
+    'assigned_to': lambda t: t.assigned_to,
+    'assigned_user_name': lambda t: t.assigned_user.username if t.assigned_user else None,
+    'company_id': lambda t: t.company_id,
+    'company_name': lambda t: t.company.name if t.company else None,
+    'created_at': lambda t: _isoformat(t.created_at),
+    'updated_at': lambda t: _isoformat(t.updated_at),
+    'closed_at': lambda t: _isoformat(t.closed_at),
+    'files': lambda t: [file.to_dict() for file in t.files] if hasattr(t, 'files') else [],
+    'file_count': lambda t: t.file_count if t.file_count is not None else len(t.files)
+}
+
+# Projeções nomeadas aceitas em ?fields=
+TICKET_PROJECTIONS = {
+    'summary': (
+        'id', 'title', 'status', 'priority', 'service_type',
+        'user_id', 'user_name', 'assigned_to', 'assigned_user_name',
+        'company_id', 'company_name', 'created_at', 'updated_at', 'file_count'
+    ),
+    'full': (
+        'id', 'title', 'description', 'status', 'priority', 'service_type',
+        'user_id', 'user_name', 'assigned_to', 'assigned_user_name',
+        'company_id', 'company_name', 'created_at', 'updated_at', 'closed_at', 'files'
+    )
+}
+
+# Relacionamento necessário para cada campo derivado
+FIELD_RELATIONS = {
+    'user_name': 'user',
+    'assigned_user_name': 'assigned_user',
+    'company_name': 'company',
+    'files': 'files'
+}
+
 class Ticket(db.Model):
     __tablename__ = 'tickets'
+    __table_args__ = (
+        # Índices alinhados aos escopos de permissão (empresa, solicitante, técnico)
+        db.Index('ix_tickets_company_status_created', 'company_id', 'status', 'created_at'),
+        db.Index('ix_tickets_company_created', 'company_id', 'created_at'),
+        db.Index('ix_tickets_user_status', 'user_id', 'status'),
+        db.Index('ix_tickets_user_created', 'user_id', 'created_at'),
+        db.Index('ix_tickets_assigned_status', 'assigned_to', 'status'),
+        db.Index('ix_tickets_created_at', 'created_at'),
+        # Marcas d'água por escopo (max(updated_at)) para ETag
+        db.Index('ix_tickets_updated_at', 'updated_at'),
+        db.Index('ix_tickets_company_updated', 'company_id', 'updated_at'),
+        db.Index('ix_tickets_user_updated', 'user_id', 'updated_at'),
+        # Cursor da sincronização incremental, por escopo
+        db.Index('ix_tickets_change_seq', 'change_seq'),
+        db.Index('ix_tickets_company_change', 'company_id', 'change_seq'),
+        db.Index('ix_tickets_user_change', 'user_id', 'change_seq'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -23,28 +88,62 @@ class Ticket(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     closed_at = db.Column(db.DateTime, nullable=True)
+    # Ordem de commit das alterações, gravada por trigger (ver ticket_change.py)
+    change_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relacionamentos com backref
     user = db.relationship('User', foreign_keys=[user_id], backref='tickets')
     assigned_user = db.relationship('User', foreign_keys=[assigned_to], backref='assigned_tickets')
     company = db.relationship('Client', backref='tickets', lazy=True)
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'status': self.status,
-            'priority': self.priority,
-            'service_type': self.service_type,
-            'user_id': self.user_id,
-            'user_name': self.user.username if self.user else None,
-            'assigned_to': self.assigned_to,
-            'assigned_user_name': self.assigned_user.username if self.assigned_user else None,
-            'company_id': self.company_id,
-            'company_name': self.company.name if self.company else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'closed_at': self.closed_at.isoformat() if self.closed_at else None,
-            'files': [file.to_dict() for file in self.files] if hasattr(self, 'files') else []
-        }
+    # Quantidade de anexos, preenchida pela consulta quando solicitada
+    file_count = query_expression()
+    
+    @staticmethod
+    def resolve_fields(value):
+        """Converte o parâmetro fields (projeção ou lista separada por vírgulas)"""
+        if not value:
+            return TICKET_PROJECTIONS['full']
+        if value in TICKET_PROJECTIONS:
+            return TICKET_PROJECTIONS[value]
+        
+        fields = tuple(field.strip() for field in value.split(',') if field.strip())
+        unknown = [field for field in fields if field not in TICKET_FIELDS]
+        if unknown or not fields:
+            raise ValueError(f"Campos inválidos: {', '.join(unknown) or value}")
+        return fields
+    
+    @classmethod
+    def serialization_options(cls, fields=None):
+        """Opções de carregamento para serializar listas sem consultas N+1.
+        
+        Carrega apenas as colunas e relacionamentos usados pelos campos pedidos.
+        """
+        from .ticket_file import TicketFile
+        fields = fields or TICKET_PROJECTIONS['full']
+        relations = {FIELD_RELATIONS[field] for field in fields if field in FIELD_RELATIONS}
+        
+        columns = [cls.id, cls.created_at]
+        columns += [getattr(cls, field) for field in fields if field in cls.__table__.columns]
+        # Chaves estrangeiras dos relacionamentos carregados
+        columns += [cls.user_id, cls.assigned_to, cls.company_id]
+        options = [load_only(*columns)]
+        
+        if 'user' in relations:
+            options.append(joinedload(cls.user))
+        if 'assigned_user' in relations:
+            options.append(joinedload(cls.assigned_user))
+        if 'company' in relations:
+            options.append(joinedload(cls.company))
+        if 'files' in relations:
+            options.append(selectinload(cls.files).options(*TicketFile.serialization_options()))
+        if 'file_count' in fields:
+            count = select(func.count(TicketFile.id)) \
+                .where(TicketFile.ticket_id == cls.id) \
+                .scalar_subquery()
+            options.append(with_expression(cls.file_count, count))
+        return options
+    
+    def to_dict(self, fields=None):
+        fields = fields or TICKET_PROJECTIONS['full']
+        return {field: TICKET_FIELDS[field](self) for field in fields}
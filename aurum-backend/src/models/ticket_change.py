@@ -0,0 +1,43 @@
+from sqlalchemy import text
+
+# Importa a instância do db do módulo user
+from .user import db
+
+class TicketChangeCounter(db.Model):
+    """Sequência de alterações de tickets (linha única, id 1).
+
+    Cada INSERT/UPDATE em tickets grava o próximo valor em tickets.change_seq
+    pelos triggers abaixo. O valor é tomado dentro da transação que escreve, e
+    o SQLite só admite um escritor por vez: a ordem da sequência é a ordem dos
+    commits. Por isso o cursor da sincronização incremental usa change_seq em
+    vez de updated_at (calculado antes do commit, pode chegar fora de ordem).
+    """
+    __tablename__ = 'ticket_change_counter'
+
+    id = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+CHANGE_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS tickets_change_insert AFTER INSERT ON tickets BEGIN
+        UPDATE ticket_change_counter SET value = value + 1 WHERE id = 1;
+        UPDATE tickets SET change_seq = (SELECT value FROM ticket_change_counter WHERE id = 1)
+        WHERE id = new.id;
+    END""",
+    # O WHEN evita disparar de novo pelo próprio UPDATE de change_seq
+    """CREATE TRIGGER IF NOT EXISTS tickets_change_update AFTER UPDATE ON tickets
+    WHEN new.change_seq IS old.change_seq BEGIN
+        UPDATE ticket_change_counter SET value = value + 1 WHERE id = 1;
+        UPDATE tickets SET change_seq = (SELECT value FROM ticket_change_counter WHERE id = 1)
+        WHERE id = new.id;
+    END""",
+]
+
+def create_change_triggers():
+    """Cria (se necessário) o contador e os triggers que mantêm change_seq"""
+    with db.engine.begin() as connection:
+        connection.execute(text(
+            'INSERT OR IGNORE INTO ticket_change_counter (id, value) '
+            'SELECT 1, coalesce(max(change_seq), 0) FROM tickets'
+        ))
+        for statement in CHANGE_TRIGGERS:
+            connection.execute(text(statement))
@@ -0,0 +1,175 @@
+from collections import Counter
+from sqlalchemy import event, func, inspect
+from sqlalchemy.dialects.sqlite import insert
+
+# Importa a instância do db do módulo user
+from .user import db
+from .ticket import Ticket
+
+class TicketCounter(db.Model):
+    """Contadores de tickets por escopo e status, mantidos a cada flush.
+    
+    Escopos: global (scope_id 0), company, user (solicitante) e assignee (técnico).
+    """
+    __tablename__ = 'ticket_counters'
+
+    scope = db.Column(db.String(20), primary_key=True)
+    scope_id = db.Column(db.Integer, primary_key=True)  # 0 para o escopo global
+    status = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def counts_for(cls, scope, scope_id=0):
+        """Retorna {status: quantidade} de um escopo (consulta pela chave primária)"""
+        rows = db.session.query(cls.status, cls.count).filter(
+            cls.scope == scope,
+            cls.scope_id == scope_id
+        ).all()
+        return {status: count for status, count in rows if count}
+
+    @staticmethod
+    def expected_counts():
+        """Calcula os contadores a partir da tabela de tickets (GROUP BY por escopo)"""
+        expected = {}
+        columns = {
+            'company': Ticket.company_id,
+            'user': Ticket.user_id,
+            'assignee': Ticket.assigned_to
+        }
+
+        for status, count in db.session.query(Ticket.status, func.count(Ticket.id)).group_by(Ticket.status):
+            expected[('global', 0, status)] = count
+
+        for scope, column in columns.items():
+            rows = db.session.query(column, Ticket.status, func.count(Ticket.id)) \
+                .filter(column.isnot(None)) \
+                .group_by(column, Ticket.status)
+            for scope_id, status, count in rows:
+                expected[(scope, scope_id, status)] = count
+
+        return expected
+
+    @classmethod
+    def current_counts(cls):
+        """Retorna os contadores armazenados, ignorando os zerados"""
+        return {
+            (row.scope, row.scope_id, row.status): row.count
+            for row in cls.query.all() if row.count
+        }
+
+    @classmethod
+    def verify(cls):
+        """Compara os contadores com os tickets e retorna as divergências.
+
+        Cada divergência é (escopo, id do escopo, status, armazenado, esperado).
+        """
+        expected = cls.expected_counts()
+        current = cls.current_counts()
+        return [
+            (*key, current.get(key, 0), expected.get(key, 0))
+            for key in sorted(set(expected) | set(current), key=str)
+            if current.get(key, 0) != expected.get(key, 0)
+        ]
+
+    @classmethod
+    def rebuild(cls):
+        """Recalcula todos os contadores a partir da tabela de tickets"""
+        expected = cls.expected_counts()
+        cls.query.delete()
+        db.session.add_all(
+            cls(scope=scope, scope_id=scope_id, status=status, count=count)
+            for (scope, scope_id, status), count in expected.items()
+        )
+        db.session.commit()
+        return len(expected)
+
+    @classmethod
+    def ensure_built(cls):
+        """Popula os contadores em bancos que já tinham tickets antes da tabela existir"""
+        if cls.query.first() is None and Ticket.query.first() is not None:
+            cls.rebuild()
+
+def _counter_keys(status, company_id, user_id, assigned_to):
+    keys = [
+        ('global', 0, status),
+        ('company', company_id, status),
+        ('user', user_id, status)
+    ]
+    if assigned_to:
+        keys.append(('assignee', assigned_to, status))
+    return keys
+
+def _previous_value(state, attr):
+    history = state.attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return state.attrs[attr].value
+
+def _ticket_keys(ticket, previous=False):
+    attrs = ('status', 'company_id', 'user_id', 'assigned_to')
+    if previous:
+        state = inspect(ticket)
+        return _counter_keys(*(_previous_value(state, attr) for attr in attrs))
+    return _counter_keys(*(getattr(ticket, attr) for attr in attrs))
+
+@event.listens_for(db.session, 'after_flush')
+def update_ticket_counters(session, flush_context):
+    """Aplica aos contadores as mudanças de tickets do flush, na mesma transação"""
+    deltas = Counter()
+
+    for obj in session.new:
+        if isinstance(obj, Ticket):
+            deltas.update(_ticket_keys(obj))
+
+    for obj in session.dirty:
+        if isinstance(obj, Ticket) and session.is_modified(obj, include_collections=False):
+            deltas.subtract(_ticket_keys(obj, previous=True))
+            deltas.update(_ticket_keys(obj))
+
+    for obj in session.deleted:
+        if isinstance(obj, Ticket):
+            deltas.subtract(_ticket_keys(obj, previous=True))
+
+    apply_counter_deltas(session.connection(), deltas)
+
+def update_deltas(rows, values):
+    """Deltas dos contadores para um UPDATE em lote, a partir do estado anterior.
+    
+    UPDATEs em lote não passam pelo flush do ORM, então quem os executa
+    calcula os deltas aqui e aplica com apply_counter_deltas.
+    """
+    attrs = ('status', 'company_id', 'user_id', 'assigned_to')
+    deltas = Counter()
+    for row in rows:
+        before = [getattr(row, attr) for attr in attrs]
+        after = [values.get(attr, getattr(row, attr)) for attr in attrs]
+        deltas.subtract(_counter_keys(*before))
+        deltas.update(_counter_keys(*after))
+    return deltas
+
+def insert_deltas(rows):
+    """Deltas dos contadores para tickets inseridos em lote (dicts de colunas)"""
+    deltas = Counter()
+    for row in rows:
+        deltas.update(_counter_keys(
+            row['status'], row['company_id'], row['user_id'], row.get('assigned_to')
+        ))
+    return deltas
+
+def apply_counter_deltas(connection, deltas):
+    """Soma os deltas {(escopo, id, status): delta} aos contadores (upsert)"""
+    changes = [
+        {'scope': scope, 'scope_id': scope_id, 'status': status, 'count': delta}
+        for (scope, scope_id, status), delta in deltas.items() if delta
+    ]
+    if not changes:
+        return
+
+    stmt = insert(TicketCounter.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['scope', 'scope_id', 'status'],
+        set_={'count': TicketCounter.__table__.c.count + stmt.excluded.count}
+    )
+    connection.execute(stmt, changes)
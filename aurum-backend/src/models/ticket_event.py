@@ -0,0 +1,123 @@
+import json
+from datetime import datetime
+from sqlalchemy import event, insert, inspect, select
+
+# Importa a instância do db do módulo user
+from .user import db
+from .ticket import Ticket
+from .ticket_response import TicketResponse
+
+class TicketEvent(db.Model):
+    """Eventos de tickets gravados na mesma transação da alteração (outbox).
+
+    O id é o Last-Event-ID do stream /api/events. company_id e user_id são o
+    escopo do ticket no momento do evento, usados para filtrar assinantes.
+    """
+    __tablename__ = 'ticket_events'
+    # AUTOINCREMENT garante ids nunca reutilizados, mesmo após a limpeza
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(50), nullable=False)
+    ticket_id = db.Column(db.Integer, nullable=False)
+    company_id = db.Column(db.Integer, nullable=True)
+    user_id = db.Column(db.Integer, nullable=True)
+    is_internal = db.Column(db.Boolean, nullable=False, default=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'event_type': self.event_type,
+            'ticket_id': self.ticket_id,
+            'company_id': self.company_id,
+            'user_id': self.user_id,
+            'is_internal': self.is_internal,
+            'payload': json.loads(self.payload)
+        }
+
+def _ticket_event(event_type, ticket, **payload):
+    return {
+        'event_type': event_type,
+        'ticket_id': ticket.id,
+        'company_id': ticket.company_id,
+        'user_id': ticket.user_id,
+        'is_internal': False,
+        'payload': json.dumps({'ticket_id': ticket.id, **payload}),
+        'created_at': datetime.utcnow()
+    }
+
+def _changed(state, attr):
+    return state.attrs[attr].history.has_changes()
+
+def _update_event(ticket, values):
+    status = values.get('status', ticket.status)
+    if 'status' in values and values['status'] != ticket.status and status == 'fechado':
+        return _ticket_event('ticket.closed', ticket, status=status)
+    if 'assigned_to' in values and values['assigned_to'] != ticket.assigned_to:
+        return _ticket_event('ticket.assigned', ticket, assigned_to=values['assigned_to'], status=status)
+    return _ticket_event('ticket.updated', ticket, status=status)
+
+def record_bulk_events(connection, rows, values):
+    """Registra os eventos de um UPDATE em lote (que não passa pelo flush).
+    
+    rows traz o estado anterior de cada ticket; values, as colunas alteradas.
+    """
+    events = [_update_event(row, values) for row in rows]
+    if events:
+        connection.execute(insert(TicketEvent.__table__), events)
+
+@event.listens_for(db.session, 'after_flush')
+def record_ticket_events(session, flush_context):
+    """Registra no outbox os eventos de tickets e respostas do flush"""
+    rows = []
+
+    for obj in session.new:
+        if isinstance(obj, Ticket):
+            rows.append(_ticket_event(
+                'ticket.created', obj,
+                title=obj.title, status=obj.status, priority=obj.priority
+            ))
+
+    for obj in session.dirty:
+        if not isinstance(obj, Ticket) or not session.is_modified(obj, include_collections=False):
+            continue
+        state = inspect(obj)
+        if _changed(state, 'status') and obj.status == 'fechado':
+            rows.append(_ticket_event('ticket.closed', obj, status=obj.status))
+        elif _changed(state, 'assigned_to'):
+            rows.append(_ticket_event(
+                'ticket.assigned', obj,
+                assigned_to=obj.assigned_to, status=obj.status
+            ))
+        else:
+            rows.append(_ticket_event('ticket.updated', obj, status=obj.status))
+
+    responses = [obj for obj in session.new if isinstance(obj, TicketResponse)]
+    if responses:
+        connection = session.connection()
+        ticket_ids = {response.ticket_id for response in responses}
+        scopes = {
+            row.id: row for row in connection.execute(
+                select(Ticket.id, Ticket.company_id, Ticket.user_id).where(Ticket.id.in_(ticket_ids))
+            )
+        }
+        for response in responses:
+            scope = scopes.get(response.ticket_id)
+            rows.append({
+                'event_type': 'response.created',
+                'ticket_id': response.ticket_id,
+                'company_id': scope.company_id if scope else None,
+                'user_id': scope.user_id if scope else None,
+                'is_internal': bool(response.is_internal),
+                'payload': json.dumps({
+                    'ticket_id': response.ticket_id,
+                    'response_id': response.id,
+                    'user_id': response.user_id
+                }),
+                'created_at': datetime.utcnow()
+            })
+
+    if rows:
+        session.connection().execute(insert(TicketEvent.__table__), rows)
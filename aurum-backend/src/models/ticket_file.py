@@ -1,6 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import joinedload
 from datetime import datetime
-import os
+
+from src.storage import get_storage
 
 # Importa a instância do db do módulo user
 from .user import db
@@ -9,10 +11,12 @@ class TicketFile(db.Model):
     __tablename__ = 'ticket_files'
     
     id = db.Column(db.Integer, primary_key=True)
-    ticket_id = db.Column(db.Integer, db.ForeignKey('tickets.id'), nullable=False)
+    ticket_id = db.Column(db.Integer, db.ForeignKey('tickets.id'), nullable=False, index=True)
     filename = db.Column(db.String(255), nullable=False)
     original_filename = db.Column(db.String(255), nullable=False)
     file_path = db.Column(db.String(500), nullable=False)
+    # SHA-256 do conteúdo (file_blobs); nulo em anexos anteriores à deduplicação
+    content_hash = db.Column(db.String(64), nullable=True, index=True)
     file_size = db.Column(db.Integer, nullable=False)
     file_type = db.Column(db.String(100), nullable=False)
     uploaded_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -22,6 +26,11 @@ class TicketFile(db.Model):
     ticket = db.relationship('Ticket', backref='files', lazy=True)
     uploader = db.relationship('User', backref='uploaded_files', lazy=True)
     
+    @classmethod
+    def serialization_options(cls):
+        """Opções de carregamento para serializar listas sem consultas N+1"""
+        return [joinedload(cls.uploader)]
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -46,10 +55,15 @@ class TicketFile(db.Model):
         return f"{size:.1f} TB"
     
     def delete_file(self):
-        """Remove o arquivo físico do disco"""
+        """Remove o arquivo físico do disco.
+        
+        Anexos deduplicados não são apagados aqui: o blob pode ser usado por
+        outros tickets. Ao excluir o registro, o trigger decrementa o ref_count.
+        """
+        if self.content_hash:
+            return True
         try:
-            if os.path.exists(self.file_path):
-                os.remove(self.file_path)
+            get_storage().delete(self.file_path)
             return True
         except Exception as e:
             print(f"Erro ao deletar arquivo: {e}")
@@ -1,9 +1,14 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import joinedload
 from datetime import datetime
 from src.models.user import db # Importando o db do user.py
 
 class TicketResponse(db.Model):
     __tablename__ = 'ticket_responses'
+    __table_args__ = (
+        # Conversa de um ticket paginada por (created_at, id)
+        db.Index('ix_ticket_responses_ticket_created', 'ticket_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     ticket_id = db.Column(db.Integer, db.ForeignKey('tickets.id'), nullable=False)
@@ -16,6 +21,11 @@ class TicketResponse(db.Model):
     ticket = db.relationship('Ticket', backref='responses')
     user = db.relationship('User')
     
+    @classmethod
+    def serialization_options(cls):
+        """Opções de carregamento para serializar listas sem consultas N+1"""
+        return [joinedload(cls.user)]
+    
     def to_dict(self):
         return {
             'id': self.id,
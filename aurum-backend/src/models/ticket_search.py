@@ -0,0 +1,174 @@
+from html import escape
+
+from sqlalchemy import text
+
+# Importa a instância do db do módulo user
+from .user import db
+
+# Índice FTS5 sobre títulos, descrições e respostas dos tickets.
+# Cada ticket ocupa o rowid id * 2 e cada resposta o rowid id * 2 + 1, o que
+# permite manter o índice pelos triggers com acesso direto por rowid.
+# O tokenizer remove acentos, então "configuracao" encontra "Configuração".
+SEARCH_TABLE = 'ticket_search'
+
+SEARCH_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        title, body,
+        ticket_id UNINDEXED, response_id UNINDEXED, is_internal UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS tickets_search_insert AFTER INSERT ON tickets BEGIN
+        INSERT INTO {SEARCH_TABLE} (rowid, title, body, ticket_id, response_id, is_internal)
+        VALUES (new.id * 2, new.title, new.description, new.id, NULL, 0);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS tickets_search_update AFTER UPDATE OF title, description ON tickets BEGIN
+        UPDATE {SEARCH_TABLE} SET title = new.title, body = new.description
+        WHERE rowid = new.id * 2;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS tickets_search_delete AFTER DELETE ON tickets BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id * 2;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS ticket_responses_search_insert AFTER INSERT ON ticket_responses BEGIN
+        INSERT INTO {SEARCH_TABLE} (rowid, title, body, ticket_id, response_id, is_internal)
+        VALUES (new.id * 2 + 1, '', new.message, new.ticket_id, new.id, coalesce(new.is_internal, 0));
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS ticket_responses_search_update AFTER UPDATE OF message, is_internal ON ticket_responses BEGIN
+        UPDATE {SEARCH_TABLE} SET body = new.message, is_internal = coalesce(new.is_internal, 0)
+        WHERE rowid = new.id * 2 + 1;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS ticket_responses_search_delete AFTER DELETE ON ticket_responses BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id * 2 + 1;
+    END""",
+]
+
+# Delimitadores do trecho encontrado. O texto vem do usuário: highlight() e
+# snippet() usam caracteres de controle, o resultado é escapado e só então
+# eles viram <mark> (ver _mark).
+MARK_OPEN = '\x02'
+MARK_CLOSE = '\x03'
+
+# Uma linha por ticket: o melhor trecho encontrado (no ticket ou em uma resposta).
+# O escopo de permissão é aplicado dentro da própria consulta. A página é
+# escolhida só com bm25 (hits é materializada porque bm25 não pode ir dentro
+# do min(); o rowid do melhor trecho vem junto com o min() do GROUP BY).
+# highlight() e snippet() rodam depois, só para as linhas da página, com o
+# CROSS JOIN buscando cada trecho pelo rowid.
+SEARCH_SQL = f"""
+WITH hits AS MATERIALIZED (
+    SELECT s.rowid AS hit_rowid, s.ticket_id AS ticket_id, bm25({SEARCH_TABLE}, 10.0, 1.0) AS score
+    FROM {SEARCH_TABLE} s
+    JOIN tickets t ON t.id = s.ticket_id
+    WHERE {SEARCH_TABLE} MATCH :query {{scope}}
+), page AS (
+    SELECT hit_rowid, ticket_id, min(score) AS score
+    FROM hits
+    GROUP BY ticket_id
+    ORDER BY score
+    LIMIT :limit OFFSET :offset
+)
+SELECT page.ticket_id, s.response_id, page.score,
+       highlight({SEARCH_TABLE}, 0, '{MARK_OPEN}', '{MARK_CLOSE}') AS title_highlight,
+       snippet({SEARCH_TABLE}, 1, '{MARK_OPEN}', '{MARK_CLOSE}', '…', 16) AS snippet,
+       t.title, t.status, t.priority, t.company_id, t.created_at
+FROM page
+CROSS JOIN {SEARCH_TABLE} s ON s.rowid = page.hit_rowid
+JOIN tickets t ON t.id = page.ticket_id
+WHERE {SEARCH_TABLE} MATCH :query
+ORDER BY page.score
+"""
+
+def _mark(value):
+    """Escapa o texto e troca os delimitadores por <mark>"""
+    if value is None:
+        return None
+    return escape(value).replace(MARK_OPEN, '<mark>').replace(MARK_CLOSE, '</mark>')
+
+def search_index_exists(connection):
+    return connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {'name': SEARCH_TABLE}
+    ).first() is not None
+
+def create_search_index():
+    """Cria o índice de busca e seus triggers; popula o índice se for novo.
+
+    Retorna True quando o índice foi criado nesta chamada.
+    """
+    with db.engine.begin() as connection:
+        created = not search_index_exists(connection)
+        for statement in SEARCH_DDL:
+            connection.execute(text(statement))
+        if created:
+            _populate(connection)
+    return created
+
+def rebuild_search_index():
+    """Reconstrói o conteúdo do índice de busca a partir das tabelas"""
+    with db.engine.begin() as connection:
+        for statement in SEARCH_DDL:
+            connection.execute(text(statement))
+        connection.execute(text(f'DELETE FROM {SEARCH_TABLE}'))
+        _populate(connection)
+        connection.execute(text(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')"))
+
+def _populate(connection):
+    connection.execute(text(f"""
+        INSERT INTO {SEARCH_TABLE} (rowid, title, body, ticket_id, response_id, is_internal)
+        SELECT id * 2, title, description, id, NULL, 0 FROM tickets
+    """))
+    connection.execute(text(f"""
+        INSERT INTO {SEARCH_TABLE} (rowid, title, body, ticket_id, response_id, is_internal)
+        SELECT id * 2 + 1, '', message, ticket_id, id, coalesce(is_internal, 0) FROM ticket_responses
+    """))
+
+def build_match_query(terms):
+    """Converte o texto digitado em uma expressão MATCH segura.
+
+    Cada palavra vira uma frase entre aspas (todas obrigatórias) e a última
+    aceita prefixo, para a busca funcionar enquanto o usuário digita.
+    """
+    words = [word.replace('"', '""') for word in terms.split()]
+    if not words:
+        return None
+    phrases = [f'"{word}"' for word in words]
+    phrases[-1] += '*'
+    return ' '.join(phrases)
+
+def search_tickets(terms, permissions, user_id, limit, offset=0):
+    """Busca tickets visíveis ao usuário, ordenados por relevância (bm25)"""
+    query = build_match_query(terms)
+    if not query:
+        return []
+
+    params = {'query': query, 'limit': limit, 'offset': offset}
+    conditions = []
+    if not permissions['can_view_all']:
+        if permissions['can_view_company'] and permissions['company_id']:
+            conditions.append('t.company_id = :company_id')
+            params['company_id'] = permissions['company_id']
+        else:
+            conditions.append('t.user_id = :user_id')
+            params['user_id'] = user_id
+    # Notas internas só aparecem para administradores e técnicos
+    if not permissions['is_tech']:
+        conditions.append('s.is_internal = 0')
+
+    scope = ''.join(f' AND {condition}' for condition in conditions)
+    rows = db.session.execute(text(SEARCH_SQL.format(scope=scope)), params).mappings().all()
+
+    return [
+        {
+            'ticket_id': row['ticket_id'],
+            'title': row['title'],
+            'title_highlight': _mark(row['title_highlight'] if row['response_id'] is None else row['title']),
+            'snippet': _mark(row['snippet']),
+            'matched_in': 'ticket' if row['response_id'] is None else 'response',
+            'response_id': row['response_id'],
+            'status': row['status'],
+            'priority': row['priority'],
+            'company_id': row['company_id'],
+            'created_at': row['created_at'].replace(' ', 'T') if row['created_at'] else None,
+            'score': row['score']
+        }
+        for row in rows
+    ]
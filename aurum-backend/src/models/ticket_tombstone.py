@@ -0,0 +1,46 @@
+from datetime import datetime
+from sqlalchemy import text
+
+# Importa a instância do db do módulo user
+from .user import db
+
+class TicketTombstone(db.Model):
+    """Registro de tickets removidos ou que saíram de um escopo de permissão.
+
+    Usado pela sincronização incremental (/api/tickets/changes) para avisar os
+    clientes que devem descartar a cópia local. As linhas são gravadas pelos
+    triggers abaixo, então também cobrem UPDATE/DELETE feitos fora do ORM.
+    """
+    __tablename__ = 'ticket_tombstones'
+
+    id = db.Column(db.Integer, primary_key=True)  # sequência usada no cursor
+    ticket_id = db.Column(db.Integer, nullable=False)
+    # Escopo anterior do ticket, para filtrar quem deve receber o aviso
+    company_id = db.Column(db.Integer, nullable=True)
+    user_id = db.Column(db.Integer, nullable=True)
+    reason = db.Column(db.String(20), nullable=False)  # deleted, moved
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'ticket_id': self.ticket_id,
+            'reason': self.reason
+        }
+
+TOMBSTONE_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS tickets_tombstone_delete AFTER DELETE ON tickets BEGIN
+        INSERT INTO ticket_tombstones (ticket_id, company_id, user_id, reason, created_at)
+        VALUES (old.id, old.company_id, old.user_id, 'deleted', datetime('now'));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tickets_tombstone_move AFTER UPDATE OF company_id, user_id ON tickets
+    WHEN old.company_id IS NOT new.company_id OR old.user_id IS NOT new.user_id BEGIN
+        INSERT INTO ticket_tombstones (ticket_id, company_id, user_id, reason, created_at)
+        VALUES (old.id, old.company_id, old.user_id, 'moved', datetime('now'));
+    END""",
+]
+
+def create_tombstone_triggers():
+    """Cria (se necessário) os triggers que gravam os tombstones"""
+    with db.engine.begin() as connection:
+        for statement in TOMBSTONE_TRIGGERS:
+            connection.execute(text(statement))
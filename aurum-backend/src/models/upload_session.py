@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+
+# Importa a instância do db do módulo user
+from .user import db
+
+# Sessões sem atividade por mais tempo que isso são descartadas
+UPLOAD_SESSION_TTL = timedelta(hours=24)
+
+class UploadSession(db.Model):
+    """Upload em partes (retomável) de um anexo de ticket.
+
+    Os bytes recebidos ficam em um arquivo de staging; received_bytes é o
+    offset a partir do qual o cliente deve continuar.
+    """
+    __tablename__ = 'upload_sessions'
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 em hexadecimal
+    ticket_id = db.Column(db.Integer, db.ForeignKey('tickets.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    file_type = db.Column(db.String(100), nullable=False)
+    total_size = db.Column(db.Integer, nullable=False)
+    received_bytes = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    # Parte (ou conclusão) em andamento: reserva feita com UPDATE condicional
+    writing_since = db.Column(db.DateTime, nullable=True)
+
+    def touch(self):
+        """Renova a validade a cada parte recebida"""
+        self.expires_at = datetime.utcnow() + UPLOAD_SESSION_TTL
+
+    def to_dict(self):
+        return {
+            'upload_id': self.id,
+            'ticket_id': self.ticket_id,
+            'filename': self.filename,
+            'size': self.total_size,
+            'offset': self.received_bytes,
+            'expires_at': self.expires_at.isoformat()
+        }
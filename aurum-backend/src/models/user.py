@@ -1,5 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
+from sqlalchemy.orm import joinedload
+
+from src.passwords import password_hasher, needs_rehash
 
 db = SQLAlchemy()
 bcrypt = Bcrypt()
@@ -12,18 +15,43 @@ class User(db.Model):
     profile = db.Column(db.String(50), nullable=False, default='usuario')
     company_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=True)
     is_responsible = db.Column(db.Boolean, default=False, nullable=False)
+    # Incrementado sempre que perfil, empresa ou responsabilidade mudam
+    permissions_version = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     
     # Relacionamento com empresa
     company = db.relationship('Client', backref='users', lazy=True)
 
+    @classmethod
+    def serialization_options(cls):
+        """Opções de carregamento para serializar listas sem consultas N+1"""
+        return [joinedload(cls.company)]
+
+    @classmethod
+    def list_watermark(cls):
+        """Contagem, maior id e soma das versões (base do ETag da listagem)"""
+        return db.session.query(
+            db.func.count(cls.id),
+            db.func.max(cls.id),
+            db.func.coalesce(db.func.sum(cls.permissions_version), 0)
+        ).one()
+
     def __repr__(self):
         return f'<User {self.username}>'
 
+    def bump_permissions_version(self):
+        """Marca que as permissões mudaram, invalidando caches de identidade"""
+        self.permissions_version = (self.permissions_version or 0) + 1
+
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        # Hash no pool de processos; pode levantar PasswordHasherBusy
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return password_hasher.check(password, self.password_hash)
+
+    def password_needs_rehash(self):
+        """True se o hash foi gerado com um custo diferente de BCRYPT_LOG_ROUNDS"""
+        return needs_rehash(self.password_hash)
 
     def to_dict(self):
         return {
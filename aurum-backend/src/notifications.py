@@ -0,0 +1,442 @@
+import json
+import smtplib
+import ssl
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+from flask import current_app
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import joinedload
+
+from src.models.user import db, User
+from src.models.ticket import Ticket
+from src.models.ticket_event import TicketEvent
+from src.models.email_config import EmailConfig
+from src.models.notification import NotificationBatch, NotificationCursor
+from src.jobs import retry_delay
+from src.events import PRUNE_INTERVAL, prune_events
+
+# Padrões: um chamado sem alterações por NOTIFICATION_WINDOW segundos é
+# notificado; chamados muito movimentados esperam no máximo NOTIFICATION_MAX_DELAY
+DEFAULT_WINDOW = 60  # segundos
+DEFAULT_MAX_DELAY = 300  # segundos
+DEFAULT_DIGEST_INTERVAL = 3600  # segundos
+POLL_INTERVAL = 5.0  # segundos
+EVENT_BATCH_SIZE = 1000
+# Conexões SMTP ociosas costumam ser derrubadas pelo servidor
+SMTP_IDLE_TIMEOUT = 60  # segundos
+SMTP_TIMEOUT = 30  # segundos
+# Falhas temporárias seguidas até o grupo ser descartado
+MAX_SEND_ATTEMPTS = 5
+
+# Erros que afetam a conexão inteira (não só uma mensagem): a passada para
+CONNECTION_ERRORS = (
+    smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, smtplib.SMTPHeloError,
+    smtplib.SMTPAuthenticationError, smtplib.SMTPNotSupportedError
+)
+
+EVENT_DESCRIPTIONS = {
+    'ticket.created': lambda payload: f"Chamado aberto (prioridade {payload.get('priority')})",
+    'ticket.updated': lambda payload: f"Chamado atualizado (status: {payload.get('status')})",
+    'ticket.assigned': lambda payload: f"Chamado atribuído a um técnico (status: {payload.get('status')})",
+    'ticket.closed': lambda payload: 'Chamado fechado',
+    'response.created': lambda payload: 'Nova resposta',
+}
+
+def describe_event(event):
+    describe = EVENT_DESCRIPTIONS.get(event['event_type'])
+    text = describe(event['payload']) if describe else event['event_type']
+    if event['is_internal']:
+        text += ' (interna)'
+    return text
+
+def active_email_config():
+    """Configuração de e-mail ativa mais recente, ou None"""
+    return EmailConfig.query.filter_by(is_active=True).order_by(EmailConfig.id.desc()).first()
+
+class MailTransport:
+    """Conexão SMTP reutilizada entre mensagens.
+
+    Abrir a conexão (TCP, STARTTLS e login) custa bem mais que enviar uma
+    mensagem; aqui ela é aberta uma vez e reaproveitada enquanto a
+    configuração ativa não mudar. Conexões ociosas por mais de
+    SMTP_IDLE_TIMEOUT são refeitas, e uma queda do servidor gera uma nova
+    tentativa com conexão nova.
+    """
+
+    def __init__(self, idle_timeout=SMTP_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self.connections_opened = 0
+        self._lock = threading.Lock()
+        self._smtp = None
+        self._config_key = None
+        self._last_used = 0
+
+    def _connect(self, config):
+        if config.mail_port == 465:
+            smtp = smtplib.SMTP_SSL(config.mail_server, config.mail_port, timeout=SMTP_TIMEOUT,
+                                    context=ssl.create_default_context())
+        else:
+            smtp = smtplib.SMTP(config.mail_server, config.mail_port, timeout=SMTP_TIMEOUT)
+            if config.mail_use_tls:
+                smtp.starttls(context=ssl.create_default_context())
+        if config.mail_username:
+            smtp.login(config.mail_username, config.mail_password)
+        self.connections_opened += 1
+        return smtp
+
+    def _connection(self, config):
+        key = (config.id, config.updated_at)
+        idle = time.monotonic() - self._last_used > self.idle_timeout
+        if self._smtp is None or key != self._config_key or idle:
+            self._close()
+            self._smtp = self._connect(config)
+            self._config_key = key
+        return self._smtp
+
+    def send(self, config, message):
+        """Envia a mensagem; retorna os destinatários recusados pelo servidor"""
+        with self._lock:
+            try:
+                try:
+                    refused = self._connection(config).send_message(message)
+                except smtplib.SMTPServerDisconnected:
+                    # O servidor fechou a conexão reutilizada: tenta uma vez com outra
+                    self._smtp = None
+                    refused = self._connection(config).send_message(message)
+            except smtplib.SMTPRecipientsRefused:
+                # O smtplib já fez RSET: a conexão continua utilizável
+                raise
+            except Exception:
+                # Conexão em estado desconhecido: a próxima mensagem abre outra
+                self._close()
+                raise
+            self._last_used = time.monotonic()
+            return refused
+
+    def _close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+def _settings():
+    config = current_app.config
+    return (
+        timedelta(seconds=config.get('NOTIFICATION_WINDOW', DEFAULT_WINDOW)),
+        timedelta(seconds=config.get('NOTIFICATION_MAX_DELAY', DEFAULT_MAX_DELAY)),
+        config.get('NOTIFICATION_DIGEST_INTERVAL', DEFAULT_DIGEST_INTERVAL)
+    )
+
+def _cursor():
+    cursor = db.session.get(NotificationCursor, 1)
+    if cursor is None:
+        # Primeira execução: só notifica eventos daqui em diante
+        last_id = db.session.query(db.func.max(TicketEvent.id)).scalar() or 0
+        cursor = NotificationCursor(id=1, last_event_id=last_id)
+        db.session.add(cursor)
+    return cursor
+
+def _digest_companies():
+    """Empresas com responsáveis que têm e-mail (recebem o resumo)"""
+    rows = db.session.execute(
+        select(User.company_id).where(
+            User.is_responsible.is_(True),
+            User.company_id.isnot(None),
+            User.email.isnot(None)
+        ).distinct()
+    )
+    return {row.company_id for row in rows}
+
+def collect_events(digest_enabled):
+    """Agrupa os eventos novos do outbox em notification_batches.
+
+    Cada chamada lê até EVENT_BATCH_SIZE eventos, agrega em memória por
+    escopo e grava tudo com um UPSERT em lote, na mesma transação que avança
+    o cursor. Retorna a quantidade de eventos lidos.
+    """
+    cursor = _cursor()
+    events = db.session.execute(
+        select(TicketEvent.id, TicketEvent.ticket_id, TicketEvent.company_id,
+               TicketEvent.is_internal, TicketEvent.created_at)
+        .where(TicketEvent.id > cursor.last_event_id)
+        .order_by(TicketEvent.id)
+        .limit(EVENT_BATCH_SIZE)
+    ).all()
+    if not events:
+        db.session.commit()
+        return 0
+
+    digest_companies = _digest_companies() if digest_enabled else set()
+    batches = {}
+    for event in events:
+        scopes = [('ticket', event.ticket_id)]
+        # Eventos internos não entram no resumo dos responsáveis (clientes)
+        if event.company_id in digest_companies and not event.is_internal:
+            scopes.append(('company', event.company_id))
+        for scope in scopes:
+            batch = batches.get(scope)
+            if batch is None:
+                batches[scope] = {
+                    'scope': scope[0], 'scope_id': scope[1],
+                    'first_event_id': event.id, 'last_event_id': event.id, 'event_count': 1,
+                    'first_at': event.created_at, 'last_at': event.created_at
+                }
+            else:
+                batch.update(last_event_id=event.id, last_at=event.created_at)
+                batch['event_count'] += 1
+
+    stmt = insert(NotificationBatch.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['scope', 'scope_id'],
+        set_={
+            'last_event_id': stmt.excluded.last_event_id,
+            'last_at': stmt.excluded.last_at,
+            'event_count': NotificationBatch.__table__.c.event_count + stmt.excluded.event_count,
+            # Eventos novos mudam a mensagem: todos os destinatários a recebem de novo
+            'delivered': '[]'
+        }
+    )
+    db.session.execute(stmt, list(batches.values()))
+    cursor.last_event_id = events[-1].id
+    db.session.commit()
+    return len(events)
+
+def ready_batches(now, window, max_delay, digest_interval):
+    """Grupos prontos: chamado sem alterações na janela (ou esperando demais)
+    e resumos com o intervalo vencido"""
+    ready = and_(
+        NotificationBatch.scope == 'ticket',
+        or_(NotificationBatch.last_at <= now - window, NotificationBatch.first_at <= now - max_delay)
+    )
+    if digest_interval:
+        ready = or_(ready, and_(
+            NotificationBatch.scope == 'company',
+            NotificationBatch.first_at <= now - timedelta(seconds=digest_interval)
+        ))
+    waiting = or_(NotificationBatch.retry_at.is_(None), NotificationBatch.retry_at <= now)
+    return NotificationBatch.query.filter(ready, waiting).order_by(NotificationBatch.first_at).all()
+
+def _batch_events(batch):
+    stmt = select(TicketEvent).where(TicketEvent.id.between(batch.first_event_id, batch.last_event_id))
+    if batch.scope == 'ticket':
+        stmt = stmt.where(TicketEvent.ticket_id == batch.scope_id)
+    else:
+        stmt = stmt.where(TicketEvent.company_id == batch.scope_id, TicketEvent.is_internal.is_(False))
+    rows = db.session.execute(stmt.order_by(TicketEvent.id)).scalars()
+    return [dict(row.to_dict(), created_at=row.created_at) for row in rows]
+
+def _message(config, recipients, subject, lines):
+    message = EmailMessage()
+    message['From'] = config.mail_default_sender
+    message['To'] = ', '.join(recipients)
+    message['Subject'] = subject
+    message.set_content('\n'.join(lines) + '\n')
+    return message
+
+def ticket_messages(config, batch, events, ticket, digest_enabled):
+    """Mensagem do chamado para a equipe e, sem as internas, para o solicitante"""
+    title = ticket.title if ticket else ''
+    subject = f'[Chamado #{batch.scope_id}] {title}'.strip()
+    lines = [f'{event["created_at"]:%d/%m/%Y %H:%M} - {describe_event(event)}' for event in events]
+    messages = [_message(config, [config.recipient_email], subject, lines)]
+
+    requester = ticket.user if ticket else None
+    public = [line for line, event in zip(lines, events) if not event['is_internal']]
+    # Responsáveis recebem o resumo no lugar das mensagens por chamado
+    in_digest = digest_enabled and requester is not None and requester.is_responsible
+    if requester is not None and requester.email and public and not in_digest:
+        messages.append(_message(config, [requester.email], subject, public))
+    return messages
+
+def digest_messages(config, batch, events, tickets, responsibles):
+    """Resumo das alterações dos chamados da empresa, um por responsável"""
+    by_ticket = defaultdict(list)
+    for event in events:
+        by_ticket[event['ticket_id']].append(event)
+
+    lines = []
+    for ticket_id, ticket_events in by_ticket.items():
+        ticket = tickets.get(ticket_id)
+        lines.append(f'Chamado #{ticket_id} {ticket.title if ticket else ""}'.strip())
+        lines.extend(
+            f'  {event["created_at"]:%d/%m/%Y %H:%M} - {describe_event(event)}'
+            for event in ticket_events
+        )
+    subject = f'Resumo dos chamados: {len(by_ticket)} com alterações'
+    return [_message(config, [user.email], subject, lines) for user in responsibles]
+
+class NotificationDispatcher:
+    """Envia por e-mail os eventos do outbox, agrupados e com conexão reutilizada.
+
+    Nada é enviado durante as requisições: os eventos já gravados em
+    ticket_events são lidos por este processo (flask notify), agrupados por
+    chamado e enviados quando o chamado fica NOTIFICATION_WINDOW segundos sem
+    alterações. Com NOTIFICATION_DIGEST_INTERVAL, os responsáveis de cada
+    empresa recebem um resumo periódico em vez de uma mensagem por chamado.
+    Um grupo só é removido depois de enviado (entrega ao menos uma vez).
+    Recusas definitivas (5xx) de um destinatário são registradas e não
+    travam o grupo; falhas temporárias reenviam mais tarde só as mensagens
+    que ainda não foram entregues, com backoff, até MAX_SEND_ATTEMPTS.
+    """
+
+    def __init__(self, app, transport=None):
+        self.app = app
+        self.transport = transport or MailTransport()
+        self.sent = 0
+        self._stopping = threading.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    def run(self, once=False):
+        """Processa o outbox até stop(); com once, faz uma única passada"""
+        last_prune = 0
+        try:
+            while not self._stopping.is_set():
+                with self.app.app_context():
+                    try:
+                        self.dispatch()
+                        if time.monotonic() - last_prune > PRUNE_INTERVAL:
+                            prune_events()
+                            last_prune = time.monotonic()
+                    except Exception as e:
+                        db.session.rollback()
+                        self.app.logger.warning(f'Erro ao enviar notificações: {e}')
+                    finally:
+                        db.session.remove()
+                if once:
+                    break
+                self._stopping.wait(POLL_INTERVAL)
+        finally:
+            self.transport.close()
+
+    def dispatch(self, now=None):
+        """Agrupa os eventos novos e envia os grupos prontos; retorna as mensagens enviadas"""
+        now = now or datetime.utcnow()
+        window, max_delay, digest_interval = _settings()
+        while collect_events(bool(digest_interval)) == EVENT_BATCH_SIZE:
+            pass
+
+        batches = ready_batches(now, window, max_delay, digest_interval)
+        if not batches:
+            return 0
+        config = active_email_config()
+        if config is None:
+            # Sem configuração os grupos aguardam; nada é descartado
+            return 0
+
+        ticket_ids = {batch.scope_id for batch in batches if batch.scope == 'ticket'}
+        company_ids = {batch.scope_id for batch in batches if batch.scope == 'company'}
+        events = {(batch.scope, batch.scope_id): _batch_events(batch) for batch in batches}
+        for key, batch_events in events.items():
+            if key[0] == 'company':
+                ticket_ids.update(event['ticket_id'] for event in batch_events)
+        tickets = {
+            ticket.id: ticket for ticket in
+            Ticket.query.options(joinedload(Ticket.user)).filter(Ticket.id.in_(ticket_ids))
+        } if ticket_ids else {}
+        responsibles = defaultdict(list)
+        if company_ids:
+            for user in User.query.filter(
+                User.company_id.in_(company_ids), User.is_responsible.is_(True), User.email.isnot(None)
+            ):
+                responsibles[user.company_id].append(user)
+
+        sent = 0
+        for batch in batches:
+            batch_events = events[(batch.scope, batch.scope_id)]
+            if batch.scope == 'ticket':
+                messages = ticket_messages(config, batch, batch_events, tickets.get(batch.scope_id), bool(digest_interval))
+            else:
+                messages = digest_messages(config, batch, batch_events, tickets, responsibles[batch.scope_id])
+            if not batch_events:
+                # Eventos já removidos pela retenção do outbox
+                messages = []
+
+            delivered, batch_sent, error, connection_lost = self._send_batch(config, batch, messages)
+            sent += batch_sent
+            if error is None:
+                self._remove(batch)
+            else:
+                self._retry_later(batch, delivered, error, now)
+            db.session.commit()
+            if connection_lost:
+                # Servidor fora do ar: os demais grupos esperam a próxima passada
+                break
+        self.sent += sent
+        return sent
+
+    def _send_batch(self, config, batch, messages):
+        """Envia as mensagens ainda não entregues do grupo.
+
+        Retorna (destinatários concluídos, mensagens enviadas, erro temporário
+        ou None, conexão perdida). Recusas definitivas contam como concluídas.
+        """
+        delivered = json.loads(batch.delivered)
+        done = set(delivered)
+        sent = 0
+        for message in messages:
+            recipient = message['To']
+            if recipient in done:
+                continue
+            try:
+                refused = self.transport.send(config, message)
+                if refused:
+                    self.app.logger.warning(f'Destinatários recusados: {", ".join(refused)}')
+                sent += 1
+            except smtplib.SMTPRecipientsRefused as e:
+                if any(code < 500 for code, _ in e.recipients.values()):
+                    return delivered, sent, e, False
+                # Recusa definitiva: registra e segue com as outras mensagens
+                self.app.logger.warning(f'Destinatários recusados: {", ".join(e.recipients)}')
+            except CONNECTION_ERRORS as e:
+                return delivered, sent, e, True
+            except smtplib.SMTPResponseException as e:
+                if e.smtp_code < 500:
+                    return delivered, sent, e, False
+                self.app.logger.warning(f'Mensagem para {recipient} recusada: {e.smtp_code} {e.smtp_error!r}')
+            except smtplib.SMTPException as e:
+                return delivered, sent, e, False
+            except OSError as e:
+                return delivered, sent, e, True
+            delivered.append(recipient)
+        return delivered, sent, None, False
+
+    def _remove(self, batch):
+        # Remove o grupo só após o envio, e apenas se não recebeu eventos novos
+        db.session.execute(delete(NotificationBatch.__table__).where(
+            NotificationBatch.scope == batch.scope,
+            NotificationBatch.scope_id == batch.scope_id,
+            NotificationBatch.last_event_id == batch.last_event_id
+        ))
+
+    def _retry_later(self, batch, delivered, error, now):
+        attempts = batch.attempts + 1
+        description = f'{type(error).__name__}: {error}'[:500]
+        if attempts >= MAX_SEND_ATTEMPTS:
+            self.app.logger.error(
+                f'Notificação {batch.scope} {batch.scope_id} descartada após {attempts} tentativas: {description}'
+            )
+            self._remove(batch)
+            return
+        self.app.logger.warning(f'Falha ao enviar notificação {batch.scope} {batch.scope_id}: {description}')
+        db.session.execute(update(NotificationBatch.__table__).where(
+            NotificationBatch.scope == batch.scope,
+            NotificationBatch.scope_id == batch.scope_id
+        ).values(
+            delivered=json.dumps(delivered),
+            attempts=attempts,
+            retry_at=now + timedelta(seconds=retry_delay(attempts)),
+            last_error=description
+        ))
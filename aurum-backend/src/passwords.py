@@ -0,0 +1,115 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt as bcrypt_lib
+from flask import current_app, has_app_context, jsonify
+
+# Valores padrão; a aplicação pode sobrescrever pelo app.config
+DEFAULT_LOG_ROUNDS = 12
+DEFAULT_WORKERS = os.cpu_count() or 1
+DEFAULT_QUEUE_SIZE = DEFAULT_WORKERS * 4
+RETRY_AFTER = 1  # segundos
+
+class PasswordHasherBusy(Exception):
+    """O pool de hashing está com a fila cheia; a requisição deve ser recusada"""
+
+def hash_in_worker(password, rounds):
+    """Gera o hash bcrypt (executado nos processos do pool)"""
+    return bcrypt_lib.hashpw(password.encode('utf-8'), bcrypt_lib.gensalt(rounds)).decode('utf-8')
+
+def check_in_worker(password, password_hash):
+    """Confere a senha contra o hash bcrypt (executado nos processos do pool)"""
+    return bcrypt_lib.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+def _config(name, default):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+def log_rounds():
+    """Custo bcrypt configurado (BCRYPT_LOG_ROUNDS)"""
+    return _config('BCRYPT_LOG_ROUNDS', DEFAULT_LOG_ROUNDS)
+
+def hash_rounds(password_hash):
+    """Custo gravado em um hash bcrypt ($2b$12$...), ou None se não for bcrypt"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+def needs_rehash(password_hash):
+    """True se o hash foi gerado com um custo diferente do configurado"""
+    return hash_rounds(password_hash) != log_rounds()
+
+class PasswordHasher:
+    """Executa o bcrypt em um pool de processos com fila limitada.
+
+    O trabalho de CPU sai das threads que atendem requisições. Quando há
+    PASSWORD_HASH_QUEUE_SIZE operações em andamento, novas chamadas falham
+    na hora com PasswordHasherBusy em vez de esperar na fila.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self._pid = None
+        self._dummy_hash = None
+
+    def _pool(self):
+        with self._lock:
+            # Processos filhos (ex.: workers do gunicorn) criam o próprio pool
+            if self._executor is None or self._pid != os.getpid():
+                workers = _config('PASSWORD_HASH_WORKERS', DEFAULT_WORKERS)
+                queue_size = _config('PASSWORD_HASH_QUEUE_SIZE', DEFAULT_QUEUE_SIZE)
+                self._executor = ProcessPoolExecutor(max_workers=workers)
+                self._slots = threading.BoundedSemaphore(queue_size)
+                self._pid = os.getpid()
+            return self._executor, self._slots
+
+    def run(self, function, *args):
+        executor, slots = self._pool()
+        if not slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            return executor.submit(function, *args).result()
+        finally:
+            slots.release()
+
+    def hash(self, password):
+        return self.run(hash_in_worker, password, log_rounds())
+
+    def check(self, password, password_hash):
+        return self.run(check_in_worker, password, password_hash)
+
+    def check_dummy(self, password):
+        """Verificação com o mesmo custo de uma real, para usuários inexistentes.
+        
+        Sem ela, a resposta para um usuário que não existe volta sem esperar o
+        bcrypt e revela quais nomes de usuário são válidos.
+        """
+        rounds = log_rounds()
+        if hash_rounds(self._dummy_hash) != rounds:
+            self._dummy_hash = self.run(hash_in_worker, 'dummy-password', rounds)
+        self.check(password, self._dummy_hash)
+        return False
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+password_hasher = PasswordHasher()
+
+def busy_response(error=None):
+    """Resposta 503 para quando o pool de hashing está saturado"""
+    response = jsonify({'error': 'Servidor ocupado, tente novamente em instantes'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(RETRY_AFTER)
+    return response
+
+def init_passwords(app):
+    """Responde 503 às requisições recusadas pelo pool de hashing"""
+    app.register_error_handler(PasswordHasherBusy, busy_response)
@@ -1,5 +1,7 @@
 from flask import Blueprint, request, jsonify, session
-from src.models.user import db, User, bcrypt
+from src.models.user import db, User
+from src.passwords import PasswordHasherBusy, busy_response, password_hasher
+from src.throttle import login_throttle, throttled_response
 from flask_cors import cross_origin
 
 auth_bp = Blueprint('auth', __name__)
@@ -8,19 +10,39 @@ auth_bp = Blueprint('auth', __name__)
 @cross_origin()
 def login():
     try:
-        data = request.get_json()
+        # Corpo ausente, inválido ou que não seja um objeto JSON vira 400 abaixo
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            data = {}
         username = data.get('username')
         password = data.get('password')
         
         if not username or not password:
             return jsonify({'error': 'Usuário e senha são obrigatórios'}), 400
+        if not isinstance(username, str) or not isinstance(password, str):
+            return jsonify({'error': 'Usuário e senha devem ser texto'}), 400
+        
+        # Limite de tentativas antes de qualquer consulta ou hash
+        retry_after = login_throttle.check(username, request.remote_addr)
+        if retry_after:
+            return throttled_response(retry_after)
         
         # Allow login with username or email
         user = User.query.filter(
             (User.username == username) | (User.email == username)
         ).first()
         
-        if user and user.check_password(password):
+        # Usuário inexistente também paga o bcrypt, para não vazar pelo tempo
+        valid = user.check_password(password) if user else password_hasher.check_dummy(password)
+        
+        if valid:
+            login_throttle.succeeded(username)
+            
+            # Custo alterado na configuração: regrava o hash com a senha em mãos
+            if user.password_needs_rehash():
+                user.set_password(password)
+                db.session.commit()
+            
             session['user_id'] = user.id
             session['username'] = user.username
             session['profile'] = user.profile
@@ -30,8 +52,12 @@ def login():
             }), 200
         else:
             return jsonify({'error': 'Credenciais inválidas'}), 401
-            
+    
+    except PasswordHasherBusy:
+        db.session.rollback()
+        return busy_response()
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/logout', methods=['POST'])
@@ -87,6 +113,9 @@ def register():
             'user': user.to_dict()
         }), 201
         
+    except PasswordHasherBusy:
+        db.session.rollback()
+        return busy_response()
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -1,23 +1,29 @@
 from flask import Blueprint, request, jsonify, session
 from src.models.user import db, User
+from src.identity import get_current_permissions
+from src.http_cache import compute_etag, not_modified, with_validators
 from src.models.client import Client
 
 clients_bp = Blueprint('clients', __name__)
 
 def check_admin_or_tech_permission():
     """Verifica se o usuário logado é administrador ou técnico"""
-    if 'user_id' not in session:
-        return False
-    
-    user = User.query.get(session['user_id'])
-    return user and user.profile in ['administrador', 'tecnico']
+    permissions = get_current_permissions()
+    return bool(permissions and permissions['is_tech'])
 
 @clients_bp.route('/clients', methods=['GET'])
 def get_clients():
     """Lista todos os clientes"""
     try:
+        total, last_modified = Client.list_watermark()
+        etag = compute_etag('clients', total, last_modified)
+        cached = not_modified(etag, last_modified)
+        if cached:
+            return cached
+        
         clients = Client.query.filter_by(active=True).all()
-        return jsonify([client.to_dict() for client in clients]), 200
+        response = jsonify([client.to_dict() for client in clients])
+        return with_validators(response, etag, last_modified), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
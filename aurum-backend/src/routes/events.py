@@ -0,0 +1,86 @@
+from flask import Blueprint, Response, request, jsonify, session, current_app
+from flask_cors import cross_origin
+from src.models.user import db
+from src.identity import get_current_permissions
+from src.events import (
+    event_hub, event_visible, format_sse, load_events_after, oldest_event_id, stream_limit,
+    HEARTBEAT_INTERVAL
+)
+
+events_bp = Blueprint('events', __name__)
+
+# Máximo de eventos reenviados na retomada; acima disso o cliente recarrega
+REPLAY_LIMIT = 1000
+
+@events_bp.route('/events', methods=['GET'])
+@cross_origin()
+def stream_events():
+    """Stream SSE de eventos de tickets visíveis ao usuário.
+    
+    Eventos: ticket.created, ticket.updated, ticket.assigned, ticket.closed e
+    response.created. Com Last-Event-ID o stream reenvia o que foi perdido; se
+    não for possível, envia um evento reset e o cliente deve recarregar.
+    Acima de stream_limit streams no processo responde 503 com Retry-After.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    permissions = get_current_permissions()
+    if not permissions:
+        return jsonify({'error': 'Usuário não encontrado'}), 404
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'error': 'Last-Event-ID inválido'}), 400
+    
+    event_hub.start(current_app._get_current_object())
+    # Assina antes de ler o histórico para não perder eventos entre as duas etapas
+    subscription = event_hub.subscribe(permissions, limit=stream_limit(current_app))
+    if subscription is None:
+        response = jsonify({'error': 'Muitas conexões de eventos abertas, tente novamente em instantes'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    
+    backlog = []
+    reset = False
+    if last_id is not None:
+        oldest = oldest_event_id()
+        backlog = load_events_after(last_id, limit=REPLAY_LIMIT + 1)
+        if (oldest is not None and last_id < oldest - 1) or len(backlog) > REPLAY_LIMIT:
+            reset, backlog = True, []
+        backlog = [event for event in backlog if event_visible(permissions, event)]
+    
+    # O stream não usa o banco: devolve a conexão antes de começar
+    db.session.remove()
+    
+    def generate():
+        last_sent = last_id
+        try:
+            yield 'retry: 3000\n\n'
+            if reset:
+                yield 'event: reset\ndata: {}\n\n'
+            for event in backlog:
+                yield format_sse(event)
+                last_sent = event['id']
+            
+            while True:
+                events = subscription.wait(HEARTBEAT_INTERVAL)
+                if subscription.closed:
+                    return
+                if not events:
+                    yield ': heartbeat\n\n'
+                    continue
+                for event in events:
+                    if last_sent is None or event['id'] > last_sent:
+                        yield format_sse(event)
+                        last_sent = event['id']
+        finally:
+            event_hub.unsubscribe(subscription)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
@@ -0,0 +1,41 @@
+import io
+
+from flask import Blueprint, request, jsonify, session
+from flask_cors import cross_origin
+from src.models.user import db
+from src.identity import get_current_permissions
+from src.importer import IMPORTERS
+
+imports_bp = Blueprint('imports', __name__)
+
+@imports_bp.route('/import/<kind>', methods=['POST'])
+@cross_origin()
+def import_csv(kind):
+    """Importa clientes, usuários ou tickets de um CSV (apenas administradores).
+    
+    O CSV pode vir no campo file (multipart) ou no corpo da requisição; ele é
+    lido em streaming e inserido em lotes. Retorna as linhas inseridas e os
+    erros por linha.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    permissions = get_current_permissions()
+    if not permissions or not permissions['is_admin']:
+        return jsonify({'error': 'Acesso negado'}), 403
+    
+    importer = IMPORTERS.get(kind)
+    if not importer:
+        return jsonify({'error': 'Tipo inválido: use clients, users ou tickets'}), 404
+    
+    try:
+        upload = request.files.get('file')
+        raw = upload.stream if upload else request.stream
+        # utf-8-sig descarta o BOM de planilhas exportadas pelo Excel
+        stream = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+        report = importer(stream)
+        return jsonify(report.to_dict()), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
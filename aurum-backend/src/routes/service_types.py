@@ -1,23 +1,29 @@
 from flask import Blueprint, request, jsonify, session
 from src.models.user import db, User
+from src.identity import get_current_permissions
+from src.http_cache import compute_etag, not_modified, with_validators
 from src.models.service_type import ServiceType
 
 service_types_bp = Blueprint('service_types', __name__)
 
 def check_admin_permission():
     """Verifica se o usuário logado é administrador"""
-    if 'user_id' not in session:
-        return False
-    
-    user = User.query.get(session['user_id'])
-    return user and user.profile == 'administrador'
+    permissions = get_current_permissions()
+    return bool(permissions and permissions['is_admin'])
 
 @service_types_bp.route('/service-types', methods=['GET'])
 def get_service_types():
     """Lista todos os tipos de serviço ativos"""
     try:
+        total, last_modified = ServiceType.list_watermark()
+        etag = compute_etag('service-types', total, last_modified)
+        cached = not_modified(etag, last_modified)
+        if cached:
+            return cached
+        
         service_types = ServiceType.query.filter_by(active=True).all()
-        return jsonify([service_type.to_dict() for service_type in service_types]), 200
+        response = jsonify([service_type.to_dict() for service_type in service_types])
+        return with_validators(response, etag, last_modified), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1,22 +1,56 @@
-from flask import Blueprint, request, jsonify, session, send_file
+from flask import Blueprint, Response, request, jsonify, session, send_file, current_app, stream_with_context
 from src.models.user import db, User
 from src.models.ticket import Ticket
 from src.models.client import Client
 from src.models.service_type import ServiceType
 from src.models.ticket_file import TicketFile
+from src.models.ticket_response import TicketResponse
+from src.models.ticket_counter import TicketCounter, update_deltas, apply_counter_deltas
+from src.models.ticket_event import record_bulk_events
+from src.models.ticket_search import search_tickets
+from src.models.ticket_tombstone import TicketTombstone
+from src.identity import get_current_permissions
+from src.http_cache import compute_etag, not_modified, with_validators
+from src.storage import save_upload, send_stored_file, get_storage, FileTooLarge, MAX_FILE_SIZE
+from src.thumbnails import preview_kind, generate_thumbnail, schedule_thumbnail, thumbnail_cache_key
 from flask_cors import cross_origin
 from datetime import datetime
+from sqlalchemy import and_, or_, func, select, update
 from werkzeug.utils import secure_filename
-import os
-import uuid
-from pathlib import Path
+import base64
+import csv
+import io
+import json
 
 tickets_bp = Blueprint("tickets", __name__)
 
 # Configurações de upload
-UPLOAD_FOLDER = 'uploads/tickets'
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx', 'zip', 'rar'}
-MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
+
+# Paginação da listagem de tickets
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Paginação da sincronização incremental
+DEFAULT_SYNC_SIZE = 200
+MAX_SYNC_SIZE = 1000
+
+# Exportação: campos padrão e tamanho dos lotes lidos do banco
+EXPORT_FIELDS = (
+    'id', 'title', 'description', 'status', 'priority', 'service_type',
+    'user_id', 'user_name', 'assigned_to', 'assigned_user_name',
+    'company_id', 'company_name', 'created_at', 'updated_at', 'closed_at', 'file_count'
+)
+EXPORT_BATCH_SIZE = 500
+
+# Operações em lote: limite de ids por requisição e valores aceitos
+BULK_MAX_IDS = 1000
+TICKET_STATUSES = ('aberto', 'em_andamento', 'fechado')
+TICKET_PRIORITIES = ('baixa', 'media', 'alta', 'urgente')
+
+# Paginação da busca textual
+DEFAULT_SEARCH_SIZE = 20
+MAX_SEARCH_SIZE = 100
 
 def require_auth():
     """Decorator para verificar autenticação"""
@@ -29,20 +63,129 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def get_user_permissions(user_id):
-    """Retorna as permissões do usuário baseado no perfil"""
-    user = User.query.get(user_id)
-    if not user:
+def create_ticket_file(ticket_id, user_id, filename, file_type, stored):
+    """Cria o TicketFile de um blob já gravado (stored = hash, tamanho, chave)"""
+    content_hash, file_size, file_path = stored
+    ticket_file = TicketFile(
+        ticket_id=ticket_id,
+        filename=content_hash,
+        original_filename=secure_filename(filename),
+        file_path=file_path,
+        file_size=file_size,
+        file_type=file_type or 'application/octet-stream',
+        uploaded_by=user_id,
+        content_hash=content_hash
+    )
+    db.session.add(ticket_file)
+    return ticket_file
+
+def attach_file(ticket_id, file, user_id):
+    """Grava o upload no armazenamento por conteúdo e cria o TicketFile"""
+    stored = save_upload(file.stream, MAX_FILE_SIZE)
+    return create_ticket_file(ticket_id, user_id, file.filename, file.content_type, stored)
+
+def can_access_ticket(permissions, user_id, ticket):
+    """Verifica se o usuário pode ver (e portanto alterar/anexar) o ticket"""
+    if permissions['can_view_all']:
+        return True
+    if permissions['can_view_company'] and ticket.company_id == permissions['company_id']:
+        return True
+    return ticket.user_id == user_id
+
+def scope_ticket_query(query, permissions, user_id):
+    """Restringe a consulta de tickets ao escopo de visualização do usuário"""
+    # Administradores e técnicos veem todos os tickets
+    if permissions['can_view_all']:
+        return query
+    # Usuário responsável vê tickets da sua empresa
+    if permissions['can_view_company'] and permissions['company_id']:
+        return query.filter(Ticket.company_id == permissions['company_id'])
+    # Usuário comum vê apenas seus próprios tickets
+    return query.filter(Ticket.user_id == user_id)
+
+def parse_datetime_arg(name):
+    """Lê um parâmetro de data ISO 8601 da query string"""
+    value = request.args.get(name)
+    if not value:
         return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Data inválida em {name}: use o formato ISO 8601')
+
+def filter_ticket_query(query):
+    """Aplica os filtros da query string (status, prioridade, serviço, empresa, técnico e período)"""
+    for arg, column in (('status', Ticket.status), ('priority', Ticket.priority)):
+        values = [v for v in request.args.get(arg, '').split(',') if v]
+        if values:
+            query = query.filter(column.in_(values))
+    
+    service_type = request.args.get('service_type')
+    if service_type:
+        query = query.filter(Ticket.service_type == service_type)
+    
+    for arg, column in (('company_id', Ticket.company_id), ('assigned_to', Ticket.assigned_to)):
+        value = request.args.get(arg)
+        if value:
+            try:
+                query = query.filter(column == int(value))
+            except ValueError:
+                raise ValueError(f'Valor inválido em {arg}')
     
-    return {
-        'user': user,
-        'is_admin': user.profile == 'administrador',
-        'is_tech': user.profile in ['administrador', 'tecnico'],
-        'can_view_all': user.profile in ['administrador', 'tecnico'],
-        'can_view_company': user.is_responsible,
-        'company_id': user.company_id
-    }
+    created_from = parse_datetime_arg('created_from')
+    if created_from:
+        query = query.filter(Ticket.created_at >= created_from)
+    created_to = parse_datetime_arg('created_to')
+    if created_to:
+        query = query.filter(Ticket.created_at <= created_to)
+    
+    return query
+
+def encode_cursor(created_at, row_id):
+    """Gera um cursor opaco a partir da chave (created_at, id)"""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Decodifica um cursor gerado por encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        created_at, row_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeError):
+        raise ValueError('Cursor inválido')
+
+def parse_page_size():
+    """Lê o parâmetro limit respeitando o máximo permitido"""
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('Valor inválido em limit')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def older_than(query, model, created_at, row_id):
+    """Filtra os itens depois de (created_at, id) na ordem do mais recente"""
+    return query.filter(or_(
+        model.created_at < created_at,
+        and_(model.created_at == created_at, model.id < row_id)
+    ))
+
+def paginate_by_created_at(query, model, limit):
+    """Paginação por chave (created_at, id), do mais recente para o mais antigo.
+    
+    Retorna os itens da página e o cursor da próxima página (ou None).
+    """
+    cursor = request.args.get('cursor')
+    if cursor:
+        query = older_than(query, model, *decode_cursor(cursor))
+    
+    items = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1].created_at, items[-1].id)
+    return items, next_cursor
 
 @tickets_bp.route('/tickets', methods=['GET'])
 @cross_origin()
@@ -53,23 +196,273 @@ def get_tickets():
     
     try:
         user_id = session['user_id']
-        permissions = get_user_permissions(user_id)
+        permissions = get_current_permissions()
+        
+        if not permissions:
+            return jsonify({'error': 'Usuário não encontrado'}), 404
+        
+        # Responde 304 sem serializar nada se o escopo não mudou
+        scope, scope_id, total, last_modified = ticket_scope_watermark(permissions, user_id)
+        etag = compute_etag('tickets', scope, scope_id, total, last_modified, request.query_string)
+        cached = not_modified(etag, last_modified)
+        if cached:
+            return cached
+        
+        try:
+            fields = Ticket.resolve_fields(request.args.get('fields'))
+            query = Ticket.query.options(*Ticket.serialization_options(fields))
+            query = scope_ticket_query(query, permissions, user_id)
+            query = filter_ticket_query(query)
+            tickets, next_cursor = paginate_by_created_at(query, Ticket, parse_page_size())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        response = jsonify({
+            'tickets': [ticket.to_dict(fields) for ticket in tickets],
+            'next_cursor': next_cursor
+        })
+        return with_validators(response, etag, last_modified), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def encode_sync_cursor(change_seq, ticket_id, tombstone_id, permissions_version):
+    """Gera o cursor opaco da sincronização incremental"""
+    raw = json.dumps({
+        's': change_seq,
+        'i': ticket_id,
+        't': tombstone_id,
+        'v': permissions_version
+    })
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_sync_cursor(cursor):
+    """Decodifica um cursor gerado por encode_sync_cursor.
+    
+    Cursores do formato antigo (por updated_at) voltam sem versão, o que
+    força o recomeço da sincronização.
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if 's' not in data and 'u' in data:
+            return 0, 0, int(data['t']), None
+        return int(data['s']), int(data['i']), int(data['t']), data['v']
+    except (ValueError, KeyError, TypeError, UnicodeError):
+        raise ValueError('Cursor inválido')
+
+def scope_tombstone_query(query, permissions, user_id):
+    """Restringe os tombstones ao escopo anterior visível ao usuário"""
+    if permissions['can_view_all']:
+        return query
+    if permissions['can_view_company'] and permissions['company_id']:
+        return query.filter(TicketTombstone.company_id == permissions['company_id'])
+    return query.filter(TicketTombstone.user_id == user_id)
+
+@tickets_bp.route('/tickets/changes', methods=['GET'])
+@cross_origin()
+def get_ticket_changes():
+    """Tickets criados/alterados e removidos desde o cursor informado.
+    
+    Sem since, começa do início (carga inicial paginada). O cliente deve
+    aplicar removed antes de changes e seguir next_cursor enquanto has_more.
+    Se as permissões do usuário mudaram, reset=true indica que a cópia local
+    deve ser descartada.
+    
+    O cursor segue tickets.change_seq, que cresce na ordem dos commits: uma
+    transação lenta que termina depois de outra não fica para trás do cursor
+    (o que acontecia com updated_at, calculado antes do commit).
+    """
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        user_id = session['user_id']
+        permissions = get_current_permissions()
+        
+        if not permissions:
+            return jsonify({'error': 'Usuário não encontrado'}), 404
+        
+        try:
+            fields = Ticket.resolve_fields(request.args.get('fields'))
+            limit = max(1, min(int(request.args.get('limit', DEFAULT_SYNC_SIZE)), MAX_SYNC_SIZE))
+            since = request.args.get('since')
+            change_seq, ticket_id, tombstone_id, version = decode_sync_cursor(since) if since else (0, 0, 0, None)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Escopo mudou desde o cursor: recomeça a sincronização do zero
+        reset = bool(since) and version != permissions['permissions_version']
+        if reset:
+            change_seq, ticket_id, tombstone_id = 0, 0, 0
+        
+        removed = []
+        if since and not reset:
+            tombstones = scope_tombstone_query(TicketTombstone.query, permissions, user_id) \
+                .filter(TicketTombstone.id > tombstone_id) \
+                .order_by(TicketTombstone.id) \
+                .limit(limit + 1).all()
+            removed = tombstones[:limit]
+            if removed:
+                tombstone_id = removed[-1].id
+        else:
+            # Carga inicial: os tombstones anteriores não interessam
+            tombstones = []
+            tombstone_id = db.session.query(func.max(TicketTombstone.id)).scalar() or 0
+        
+        query = Ticket.query.options(*Ticket.serialization_options(fields))
+        query = scope_ticket_query(query, permissions, user_id)
+        # Tickets anteriores à sequência têm change_seq 0: o id desempata
+        query = query.filter(or_(
+            Ticket.change_seq > change_seq,
+            and_(Ticket.change_seq == change_seq, Ticket.id > ticket_id)
+        ))
+        tickets = query.order_by(Ticket.change_seq, Ticket.id).limit(limit + 1).all()
+        
+        has_more = len(tickets) > limit or len(tombstones) > limit
+        tickets = tickets[:limit]
+        if tickets:
+            change_seq, ticket_id = tickets[-1].change_seq, tickets[-1].id
+        
+        return jsonify({
+            'changes': [ticket.to_dict(fields) for ticket in tickets],
+            'removed': [tombstone.to_dict() for tombstone in removed],
+            'next_cursor': encode_sync_cursor(change_seq, ticket_id, tombstone_id, permissions['permissions_version']),
+            'has_more': has_more,
+            'reset': reset
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def csv_safe(value):
+    """Evita que planilhas interpretem textos como fórmulas (CSV injection)"""
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@'):
+        return "'" + value
+    return value
+
+def iter_export_tickets(query):
+    """Percorre a consulta em páginas de EXPORT_BATCH_SIZE pela chave (created_at, id).
+    
+    Cada página é lida por inteiro em uma consulta curta; nenhum cursor fica
+    aberto enquanto o cliente baixa. Um cursor aberto manteria o lock de
+    leitura do SQLite e bloquearia todas as escritas até o fim do download.
+    """
+    last = None
+    while True:
+        page_query = older_than(query, Ticket, *last) if last else query
+        page = page_query.order_by(Ticket.created_at.desc(), Ticket.id.desc()).limit(EXPORT_BATCH_SIZE).all()
+        yield from page
+        if len(page) < EXPORT_BATCH_SIZE:
+            return
+        last = (page[-1].created_at, page[-1].id)
+        # Página já serializada: encerra a transação e solta os objetos
+        db.session.rollback()
+        db.session.expunge_all()
+
+def generate_csv(tickets, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM para o Excel reconhecer UTF-8 (acentos)
+    buffer.write('\ufeff')
+    writer.writerow(fields)
+    for count, ticket in enumerate(tickets, 1):
+        data = ticket.to_dict(fields)
+        writer.writerow([csv_safe(data[field]) for field in fields])
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def generate_ndjson(tickets, fields):
+    lines = []
+    for ticket in tickets:
+        lines.append(json.dumps(ticket.to_dict(fields), ensure_ascii=False))
+        if len(lines) == EXPORT_BATCH_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+@tickets_bp.route('/tickets/export', methods=['GET'])
+@cross_origin()
+def export_tickets():
+    """Exporta os tickets visíveis em CSV ou NDJSON, em streaming.
+    
+    Aceita os mesmos filtros da listagem. Os tickets são lidos em páginas
+    (iter_export_tickets), então a memória não cresce com o tamanho da
+    exportação e o banco não fica travado durante o download.
+    """
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        user_id = session['user_id']
+        permissions = get_current_permissions()
         
         if not permissions:
             return jsonify({'error': 'Usuário não encontrado'}), 404
         
-        # Administradores e técnicos veem todos os tickets
-        if permissions['can_view_all']:
-            tickets = Ticket.query.all()
-        # Usuário responsável vê tickets da sua empresa
-        elif permissions['can_view_company'] and permissions['company_id']:
-            tickets = Ticket.query.filter_by(company_id=permissions['company_id']).all()
-        # Usuário comum vê apenas seus próprios tickets
+        export_format = request.args.get('format', 'csv')
+        if export_format not in ('csv', 'ndjson'):
+            return jsonify({'error': 'Formato inválido: use csv ou ndjson'}), 400
+        
+        try:
+            fields = Ticket.resolve_fields(request.args.get('fields')) if request.args.get('fields') else EXPORT_FIELDS
+            if 'files' in fields:
+                raise ValueError('O campo files não é suportado na exportação; use file_count')
+            query = Ticket.query.options(*Ticket.serialization_options(fields))
+            query = scope_ticket_query(query, permissions, user_id)
+            query = filter_ticket_query(query)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        tickets = iter_export_tickets(query)
+        
+        if export_format == 'csv':
+            body, mimetype = generate_csv(tickets, fields), 'text/csv'
         else:
-            tickets = Ticket.query.filter_by(user_id=user_id).all()
+            body, mimetype = generate_ndjson(tickets, fields), 'application/x-ndjson'
+        
+        filename = f"chamados-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+        return Response(stream_with_context(body), mimetype=mimetype, headers={
+            'Content-Disposition': f'attachment; filename={filename}'
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@tickets_bp.route('/tickets/search', methods=['GET'])
+@cross_origin()
+def search_tickets_route():
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        user_id = session['user_id']
+        permissions = get_current_permissions()
+        
+        if not permissions:
+            return jsonify({'error': 'Usuário não encontrado'}), 404
+        
+        terms = request.args.get('q', '').strip()
+        if not terms:
+            return jsonify({'error': 'Parâmetro q é obrigatório'}), 400
+        
+        try:
+            limit = max(1, min(int(request.args.get('limit', DEFAULT_SEARCH_SIZE)), MAX_SEARCH_SIZE))
+            offset = max(0, int(request.args.get('offset', 0)))
+        except ValueError:
+            return jsonify({'error': 'Valores inválidos em limit/offset'}), 400
+        
+        results = search_tickets(terms, permissions, user_id, limit, offset)
         
         return jsonify({
-            'tickets': [ticket.to_dict() for ticket in tickets]
+            'results': results,
+            'next_offset': offset + limit if len(results) == limit else None
         }), 200
         
     except Exception as e:
@@ -84,9 +477,9 @@ def create_ticket():
     
     try:
         user_id = session['user_id']
-        user = User.query.get(user_id)
+        permissions = get_current_permissions()
         
-        if not user:
+        if not permissions:
             return jsonify({'error': 'Usuário não encontrado'}), 404
         
         # Pega dados do formulário (multipart/form-data para upload)
@@ -110,12 +503,12 @@ def create_ticket():
         
         # Para usuários comuns, usar a empresa do usuário
         # Para admins/técnicos, permitir especificar empresa
-        if user.profile == 'usuario':
-            if not user.company_id:
+        if permissions['profile'] == 'usuario':
+            if not permissions['company_id']:
                 return jsonify({'error': 'Usuário deve estar vinculado a uma empresa'}), 400
-            company_id = user.company_id
+            company_id = permissions['company_id']
         else:
-            company_id = request.form.get('company_id') or user.company_id
+            company_id = request.form.get('company_id') or permissions['company_id']
             if not company_id:
                 return jsonify({'error': 'Empresa é obrigatória'}), 400
         
@@ -138,42 +531,23 @@ def create_ticket():
             files = request.files.getlist('files')
             for file in files:
                 if file and file.filename and allowed_file(file.filename):
-                    # Cria diretório se não existe
-                    upload_path = Path(UPLOAD_FOLDER)
-                    upload_path.mkdir(parents=True, exist_ok=True)
-                    
-                    # Gera nome único para o arquivo
-                    file_extension = file.filename.rsplit('.', 1)[1].lower()
-                    unique_filename = f"{uuid.uuid4()}.{file_extension}"
-                    file_path = upload_path / unique_filename
-                    
-                    # Salva o arquivo
-                    file.save(str(file_path))
-                    
-                    # Cria registro no banco
-                    ticket_file = TicketFile(
-                        ticket_id=ticket.id,
-                        filename=unique_filename,
-                        original_filename=secure_filename(file.filename),
-                        file_path=str(file_path),
-                        file_size=os.path.getsize(str(file_path)),
-                        file_type=file.content_type or 'application/octet-stream',
-                        uploaded_by=user_id
-                    )
-                    
-                    db.session.add(ticket_file)
-                    uploaded_files.append(ticket_file.to_dict())
+                    ticket_file = attach_file(ticket.id, file, user_id)
+                    schedule_thumbnail(ticket_file)
+                    uploaded_files.append(ticket_file)
         
         db.session.commit()
         
         response_data = ticket.to_dict()
-        response_data['uploaded_files'] = uploaded_files
+        response_data['uploaded_files'] = [ticket_file.to_dict() for ticket_file in uploaded_files]
         
         return jsonify({
             'message': 'Chamado criado com sucesso',
             'ticket': response_data
         }), 201
         
+    except FileTooLarge as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 413
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -186,71 +560,189 @@ def get_ticket_by_id(ticket_id):
         return auth_error
     
     try:
-        ticket = Ticket.query.get_or_404(ticket_id)
+        try:
+            fields = Ticket.resolve_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         user_id = session["user_id"]
-        permissions = get_user_permissions(user_id)
+        permissions = get_current_permissions()
         
         if not permissions:
             return jsonify({"error": "Usuário não encontrado"}), 404
         
-        # Verifica permissões de visualização
-        can_view = False
-        
-        if permissions['can_view_all']:
-            can_view = True
-        elif permissions['can_view_company'] and ticket.company_id == permissions['company_id']:
-            can_view = True
-        elif ticket.user_id == user_id:
-            can_view = True
+        # Consulta leve (só as colunas de permissão e versão) antes de carregar o ticket
+        watermark = db.session.query(Ticket.user_id, Ticket.company_id, Ticket.updated_at) \
+            .filter(Ticket.id == ticket_id).first()
+        if not watermark:
+            return jsonify({"error": "Chamado não encontrado"}), 404
         
-        if not can_view:
+        # Verifica permissões de visualização
+        if not can_access_ticket(permissions, user_id, watermark):
             return jsonify({"error": "Sem permissão para ver este chamado"}), 403
         
-        return jsonify({"ticket": ticket.to_dict()}), 200
+        etag = compute_etag('ticket', ticket_id, watermark.updated_at, fields)
+        cached = not_modified(etag, watermark.updated_at)
+        if cached:
+            return cached
+        
+        ticket = Ticket.query.options(*Ticket.serialization_options(fields)).get_or_404(ticket_id)
+        response = jsonify({"ticket": ticket.to_dict(fields)})
+        return with_validators(response, etag, watermark.updated_at), 200
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@tickets_bp.route('/tickets/<int:ticket_id>/files/<int:file_id>/download', methods=['GET'])
+def get_stored_file(ticket_id, file_id):
+    """Anexo e escopo do ticket em uma única consulta; retorna (anexo, erro)"""
+    stored = db.session.query(
+        TicketFile.id, TicketFile.file_path, TicketFile.original_filename, TicketFile.content_hash,
+        Ticket.company_id, Ticket.user_id
+    ).join(Ticket, Ticket.id == TicketFile.ticket_id).filter(
+        TicketFile.id == file_id,
+        TicketFile.ticket_id == ticket_id
+    ).first()
+    
+    if not stored:
+        return None, (jsonify({'error': 'Arquivo não encontrado'}), 404)
+    
+    # Verifica permissões (mesmas regras de visualização de ticket)
+    if not can_access_ticket(get_current_permissions(), session["user_id"], stored):
+        return None, (jsonify({"error": "Sem permissão para acessar este arquivo"}), 403)
+    
+    return stored, None
+
+def get_ticket_scope(ticket_id):
+    """Só o escopo do ticket (id, empresa, solicitante), para checar permissão"""
+    return db.session.query(Ticket.id, Ticket.company_id, Ticket.user_id).filter(Ticket.id == ticket_id).first()
+
+@tickets_bp.route('/tickets/<int:ticket_id>/responses', methods=['GET'])
 @cross_origin()
-def download_file(ticket_id, file_id):
+def get_ticket_responses(ticket_id):
+    """Respostas do ticket, da mais recente para a mais antiga, paginadas por cursor.
+    
+    Usuários que não são técnicos não recebem as notas internas (filtro no SQL).
+    """
     auth_error = require_auth()
     if auth_error:
         return auth_error
     
     try:
-        ticket = Ticket.query.get_or_404(ticket_id)
-        ticket_file = TicketFile.query.get_or_404(file_id)
+        ticket = get_ticket_scope(ticket_id)
+        if not ticket:
+            return jsonify({'error': 'Chamado não encontrado'}), 404
         
-        if ticket_file.ticket_id != ticket_id:
-            return jsonify({'error': 'Arquivo não pertence a este ticket'}), 400
+        permissions = get_current_permissions()
+        if not can_access_ticket(permissions, session['user_id'], ticket):
+            return jsonify({'error': 'Sem permissão para ver as respostas deste chamado'}), 403
         
-        user_id = session["user_id"]
-        permissions = get_user_permissions(user_id)
+        query = TicketResponse.query.options(*TicketResponse.serialization_options()).filter(
+            TicketResponse.ticket_id == ticket_id
+        )
+        if not permissions['is_tech']:
+            query = query.filter(TicketResponse.is_internal.isnot(True))
         
-        # Verifica permissões (mesmas regras de visualização de ticket)
-        can_view = False
+        try:
+            responses, next_cursor = paginate_by_created_at(query, TicketResponse, parse_page_size())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'responses': [response.to_dict() for response in responses],
+            'next_cursor': next_cursor
+        }), 200
         
-        if permissions['can_view_all']:
-            can_view = True
-        elif permissions['can_view_company'] and ticket.company_id == permissions['company_id']:
-            can_view = True
-        elif ticket.user_id == user_id:
-            can_view = True
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@tickets_bp.route('/tickets/<int:ticket_id>/responses', methods=['POST'])
+@cross_origin()
+def add_ticket_response(ticket_id):
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        ticket = Ticket.query.get_or_404(ticket_id)
+        user_id = session['user_id']
+        permissions = get_current_permissions()
         
-        if not can_view:
-            return jsonify({"error": "Sem permissão para baixar este arquivo"}), 403
+        if not can_access_ticket(permissions, user_id, ticket):
+            return jsonify({'error': 'Sem permissão para responder este chamado'}), 403
         
-        # Verifica se arquivo existe
-        if not os.path.exists(ticket_file.file_path):
-            return jsonify({'error': 'Arquivo não encontrado no servidor'}), 404
+        data = request.get_json() or {}
+        message = data.get('message')
+        if not message:
+            return jsonify({'error': 'Mensagem é obrigatória'}), 400
         
-        return send_file(
-            ticket_file.file_path,
-            as_attachment=True,
-            download_name=ticket_file.original_filename
+        # Apenas técnicos e admins podem criar notas internas
+        response = TicketResponse(
+            ticket_id=ticket_id,
+            user_id=user_id,
+            message=message,
+            is_internal=bool(data.get('is_internal')) and permissions['is_tech']
         )
+        db.session.add(response)
+        
+        # A primeira resposta da equipe coloca o chamado em andamento
+        if permissions['is_tech'] and ticket.status == 'aberto':
+            ticket.status = 'em_andamento'
+            ticket.updated_at = datetime.utcnow()
+        
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Resposta adicionada com sucesso',
+            'response': response.to_dict()
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@tickets_bp.route('/tickets/<int:ticket_id>/files/<int:file_id>/download', methods=['GET'])
+@cross_origin()
+def download_file(ticket_id, file_id):
+    """Baixa um anexo (aceita Range, If-None-Match e, opcionalmente, X-Accel/X-Sendfile)"""
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        stored, error = get_stored_file(ticket_id, file_id)
+        if error:
+            return error
+        
+        path = get_storage().path(stored.file_path)
+        return send_stored_file(path, stored.original_filename, stored.content_hash)
+    
+    except FileNotFoundError:
+        return jsonify({'error': 'Arquivo não encontrado no servidor'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@tickets_bp.route('/tickets/<int:ticket_id>/files/<int:file_id>/thumbnail', methods=['GET'])
+@cross_origin()
+def get_file_thumbnail(ticket_id, file_id):
+    """Miniatura JPEG de imagens e PDFs; gerada no upload ou no primeiro acesso"""
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        stored, error = get_stored_file(ticket_id, file_id)
+        if error:
+            return error
+        
+        if preview_kind(stored.original_filename) is None:
+            return jsonify({'error': 'Miniatura indisponível para este arquivo'}), 404
         
+        cache_key = thumbnail_cache_key(stored)
+        path = generate_thumbnail(get_storage().path(stored.file_path), stored.original_filename, cache_key)
+        return send_stored_file(path, f'{stored.id}-miniatura.jpg', f'{cache_key}-thumbnail', inline=True)
+    
+    except FileNotFoundError:
+        return jsonify({'error': 'Arquivo não encontrado no servidor'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -264,19 +756,10 @@ def upload_file_to_ticket(ticket_id):
     try:
         ticket = Ticket.query.get_or_404(ticket_id)
         user_id = session["user_id"]
-        permissions = get_user_permissions(user_id)
+        permissions = get_current_permissions()
         
         # Verifica permissões de visualização (quem pode ver pode adicionar arquivos)
-        can_upload = False
-        
-        if permissions['can_view_all']:
-            can_upload = True
-        elif permissions['can_view_company'] and ticket.company_id == permissions['company_id']:
-            can_upload = True
-        elif ticket.user_id == user_id:
-            can_upload = True
-        
-        if not can_upload:
+        if not can_access_ticket(permissions, user_id, ticket):
             return jsonify({"error": "Sem permissão para adicionar arquivos a este chamado"}), 403
         
         if 'file' not in request.files:
@@ -290,30 +773,10 @@ def upload_file_to_ticket(ticket_id):
         if not allowed_file(file.filename):
             return jsonify({'error': 'Tipo de arquivo não permitido'}), 400
         
-        # Cria diretório se não existe
-        upload_path = Path(UPLOAD_FOLDER)
-        upload_path.mkdir(parents=True, exist_ok=True)
-        
-        # Gera nome único para o arquivo
-        file_extension = file.filename.rsplit('.', 1)[1].lower()
-        unique_filename = f"{uuid.uuid4()}.{file_extension}"
-        file_path = upload_path / unique_filename
-        
-        # Salva o arquivo
-        file.save(str(file_path))
-        
-        # Cria registro no banco
-        ticket_file = TicketFile(
-            ticket_id=ticket_id,
-            filename=unique_filename,
-            original_filename=secure_filename(file.filename),
-            file_path=str(file_path),
-            file_size=os.path.getsize(str(file_path)),
-            file_type=file.content_type or 'application/octet-stream',
-            uploaded_by=user_id
-        )
-        
-        db.session.add(ticket_file)
+        ticket_file = attach_file(ticket_id, file, user_id)
+        schedule_thumbnail(ticket_file)
+        # Novo anexo altera o ticket (invalida ETag e aparece na sincronização)
+        ticket.updated_at = datetime.utcnow()
         db.session.commit()
         
         return jsonify({
@@ -321,10 +784,49 @@ def upload_file_to_ticket(ticket_id):
             'file': ticket_file.to_dict()
         }), 201
         
+    except FileTooLarge as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 413
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def get_counter_scope(permissions, user_id, assigned=False):
+    """Retorna a chave (escopo, id) dos contadores visíveis para o usuário"""
+    if assigned and permissions['is_tech']:
+        return 'assignee', user_id
+    if permissions['can_view_all']:
+        return 'global', 0
+    if permissions['can_view_company'] and permissions['company_id']:
+        return 'company', permissions['company_id']
+    return 'user', user_id
+
+def count_tickets_by_status(scope, scope_id):
+    """Conta os tickets do escopo com um único GROUP BY status"""
+    query = db.session.query(Ticket.status, func.count(Ticket.id))
+    if scope == 'company':
+        query = query.filter(Ticket.company_id == scope_id)
+    elif scope == 'user':
+        query = query.filter(Ticket.user_id == scope_id)
+    elif scope == 'assignee':
+        query = query.filter(Ticket.assigned_to == scope_id)
+    return dict(query.group_by(Ticket.status).all())
+
+def ticket_scope_watermark(permissions, user_id):
+    """Retorna (escopo, id, total, última alteração) dos tickets visíveis ao usuário.
+    
+    Usado como ETag da listagem: o total vem dos contadores e a última
+    alteração de max(updated_at) pelos índices de updated_at.
+    """
+    scope, scope_id = get_counter_scope(permissions, user_id)
+    if current_app.config.get('TICKET_COUNTERS_ENABLED', True):
+        total = sum(TicketCounter.counts_for(scope, scope_id).values())
+    else:
+        total = sum(count_tickets_by_status(scope, scope_id).values())
+    
+    query = scope_ticket_query(db.session.query(func.max(Ticket.updated_at)), permissions, user_id)
+    return scope, scope_id, total, query.scalar()
+
 @tickets_bp.route('/tickets/stats', methods=['GET'])
 @cross_origin()
 def get_ticket_stats():
@@ -334,27 +836,26 @@ def get_ticket_stats():
     
     try:
         user_id = session['user_id']
-        permissions = get_user_permissions(user_id)
+        permissions = get_current_permissions()
         
-        # Aplica filtros baseados nas permissões
-        if permissions['can_view_all']:
-            base_query = Ticket.query
-        elif permissions['can_view_company'] and permissions['company_id']:
-            base_query = Ticket.query.filter_by(company_id=permissions['company_id'])
-        else:
-            base_query = Ticket.query.filter_by(user_id=user_id)
+        if not permissions:
+            return jsonify({'error': 'Usuário não encontrado'}), 404
         
-        total_tickets = base_query.count()
-        open_tickets = base_query.filter_by(status='aberto').count()
-        in_progress_tickets = base_query.filter_by(status='em_andamento').count()
-        closed_tickets = base_query.filter_by(status='fechado').count()
+        assigned = request.args.get('scope') == 'assigned'
+        scope, scope_id = get_counter_scope(permissions, user_id, assigned)
+        
+        # Contadores mantidos incrementalmente; o GROUP BY fica como alternativa
+        if current_app.config.get('TICKET_COUNTERS_ENABLED', True):
+            counts = TicketCounter.counts_for(scope, scope_id)
+        else:
+            counts = count_tickets_by_status(scope, scope_id)
         
         return jsonify({
             'stats': {
-                'total': total_tickets,
-                'aberto': open_tickets,
-                'em_andamento': in_progress_tickets,
-                'fechado': closed_tickets
+                'total': sum(counts.values()),
+                'aberto': counts.get('aberto', 0),
+                'em_andamento': counts.get('em_andamento', 0),
+                'fechado': counts.get('fechado', 0)
             }
         }), 200
         
@@ -372,19 +873,10 @@ def update_ticket(ticket_id):
     try:
         ticket = Ticket.query.get_or_404(ticket_id)
         user_id = session['user_id']
-        permissions = get_user_permissions(user_id)
+        permissions = get_current_permissions()
         
         # Verifica permissões de edição
-        can_edit = False
-        
-        if permissions['can_view_all']:
-            can_edit = True
-        elif permissions['can_view_company'] and ticket.company_id == permissions['company_id']:
-            can_edit = True
-        elif ticket.user_id == user_id:
-            can_edit = True
-        
-        if not can_edit:
+        if not can_access_ticket(permissions, user_id, ticket):
             return jsonify({'error': 'Sem permissão para editar este chamado'}), 403
         
         data = request.get_json()
@@ -420,4 +912,109 @@ def update_ticket(ticket_id):
         
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+def bulk_values(operation, value):
+    """Colunas alteradas por uma operação em lote; ValueError se inválida"""
+    if operation == 'close':
+        return {'status': 'fechado'}
+    if operation == 'status':
+        if value not in TICKET_STATUSES:
+            raise ValueError('Status inválido')
+        return {'status': value}
+    if operation == 'priority':
+        if value not in TICKET_PRIORITIES:
+            raise ValueError('Prioridade inválida')
+        return {'priority': value}
+    if operation == 'assign':
+        if value is not None:
+            # bool é subclasse de int: True viraria o usuário 1
+            if not isinstance(value, int) or isinstance(value, bool):
+                raise ValueError('Técnico não encontrado')
+            technician = db.session.get(User, value)
+            if technician is None or technician.profile not in ('administrador', 'tecnico'):
+                raise ValueError('Técnico não encontrado')
+        return {'assigned_to': value}
+    raise ValueError('Operação inválida: use assign, status, close ou priority')
+
+@tickets_bp.route('/tickets/bulk', methods=['POST'])
+@cross_origin()
+def bulk_update_tickets():
+    """Aplica uma operação a vários tickets em uma única transação.
+    
+    Corpo: {"ids": [...], "operation": "assign|status|close|priority", "value": ...}.
+    As permissões são verificadas para o conjunto em uma consulta com escopo e
+    as alterações são feitas com um UPDATE por operação. Como o UPDATE não passa
+    pelo flush do ORM, contadores e eventos são gravados aqui explicitamente.
+    """
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        user_id = session['user_id']
+        permissions = get_current_permissions()
+        
+        if not permissions:
+            return jsonify({'error': 'Usuário não encontrado'}), 404
+        
+        data = request.get_json() or {}
+        ids = data.get('ids')
+        operation = data.get('operation')
+        
+        if not isinstance(ids, list) or not ids or not all(
+            isinstance(i, int) and not isinstance(i, bool) for i in ids
+        ):
+            return jsonify({'error': 'Informe a lista de ids'}), 400
+        if len(ids) > BULK_MAX_IDS:
+            return jsonify({'error': f'Máximo de {BULK_MAX_IDS} tickets por operação'}), 400
+        
+        # Assim como em update_ticket, só prioridade fica aberta a todos
+        if operation != 'priority' and not permissions['is_tech']:
+            return jsonify({'error': 'Sem permissão para esta operação'}), 403
+        
+        try:
+            values = bulk_values(operation, data.get('value'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Estado atual dos tickets visíveis: permissão e deltas em uma consulta
+        query = select(
+            Ticket.id, Ticket.status, Ticket.priority,
+            Ticket.company_id, Ticket.user_id, Ticket.assigned_to
+        ).where(Ticket.id.in_(set(ids)))
+        rows = db.session.execute(scope_ticket_query(query, permissions, user_id)).all()
+        
+        changed = [
+            row for row in rows
+            if any(getattr(row, column) != value for column, value in values.items())
+        ]
+        
+        if changed:
+            now = datetime.utcnow()
+            columns = dict(values, updated_at=now)
+            if values.get('status') == 'fechado':
+                columns['closed_at'] = now
+            
+            db.session.execute(
+                update(Ticket).where(Ticket.id.in_([row.id for row in changed])).values(**columns),
+                execution_options={'synchronize_session': False}
+            )
+            connection = db.session.connection()
+            apply_counter_deltas(connection, update_deltas(changed, values))
+            record_bulk_events(connection, changed, values)
+            db.session.commit()
+        
+        # Ids invisíveis e inexistentes recebem a mesma resposta
+        results = {str(ticket_id): 'not_found' for ticket_id in ids}
+        results.update({str(row.id): 'unchanged' for row in rows})
+        results.update({str(row.id): 'updated' for row in changed})
+        
+        return jsonify({
+            'updated': len(changed),
+            'results': results
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,259 @@
+import uuid
+from datetime import datetime, timedelta
+
+from flask import Blueprint, request, jsonify, session
+from flask_cors import cross_origin
+from sqlalchemy import or_, update
+from src.models.user import db
+from src.models.ticket import Ticket
+from src.models.upload_session import UploadSession, UPLOAD_SESSION_TTL
+from src.identity import get_current_permissions
+from src.routes.tickets import require_auth, allowed_file, can_access_ticket, create_ticket_file
+from src.thumbnails import schedule_thumbnail
+from src.storage import (
+    FileTooLarge, MAX_UPLOAD_SIZE, MAX_CHUNK_SIZE,
+    create_staging, append_chunk, publish_staging, discard_staging
+)
+
+uploads_bp = Blueprint('uploads', __name__)
+
+# Reserva de uma sessão por uma parte em gravação; vence se o processo morrer no meio
+UPLOAD_CLAIM_TIMEOUT = timedelta(minutes=10)
+
+def expire_upload_sessions():
+    """Remove as sessões vencidas e seus arquivos de staging; retorna quantas"""
+    expired = UploadSession.query.filter(UploadSession.expires_at < datetime.utcnow()).all()
+    for upload in expired:
+        discard_staging(upload.id)
+        db.session.delete(upload)
+    db.session.commit()
+    return len(expired)
+
+def get_upload(ticket_id, upload_id):
+    """Carrega a sessão do usuário logado; retorna (sessão, resposta de erro)"""
+    upload = db.session.get(UploadSession, upload_id)
+    if (not upload or upload.ticket_id != ticket_id or upload.user_id != session['user_id']
+            or upload.expires_at < datetime.utcnow()):
+        return None, (jsonify({'error': 'Upload não encontrado ou expirado'}), 404)
+    return upload, None
+
+def claim_upload(upload_id, offset):
+    """Reserva a sessão para gravar a partir de offset; None se outra requisição chegou antes.
+
+    UPDATE condicional: de duas requisições com o mesmo offset só uma
+    consegue a reserva, e o staging nunca é gravado por duas ao mesmo tempo.
+    Retorna o instante da reserva, usado para liberá-la.
+    """
+    now = datetime.utcnow()
+    table = UploadSession.__table__
+    result = db.session.execute(update(table).where(
+        table.c.id == upload_id,
+        table.c.received_bytes == offset,
+        or_(table.c.writing_since.is_(None), table.c.writing_since < now - UPLOAD_CLAIM_TIMEOUT)
+    ).values(writing_since=now))
+    db.session.commit()
+    return now if result.rowcount else None
+
+def finish_chunk(upload_id, offset, written, claim):
+    """Avança o offset e libera a reserva; False se a reserva venceu e foi tomada"""
+    table = UploadSession.__table__
+    result = db.session.execute(update(table).where(
+        table.c.id == upload_id,
+        table.c.received_bytes == offset,
+        table.c.writing_since == claim
+    ).values(
+        received_bytes=offset + written,
+        writing_since=None,
+        expires_at=datetime.utcnow() + UPLOAD_SESSION_TTL
+    ))
+    db.session.commit()
+    return result.rowcount == 1
+
+def release_upload(upload_id, claim):
+    db.session.rollback()
+    table = UploadSession.__table__
+    db.session.execute(
+        update(table).where(table.c.id == upload_id, table.c.writing_since == claim).values(writing_since=None)
+    )
+    db.session.commit()
+
+@uploads_bp.route('/tickets/<int:ticket_id>/uploads', methods=['POST'])
+@cross_origin()
+def create_upload(ticket_id):
+    """Inicia um upload em partes.
+    
+    Corpo: {"filename", "size", "content_type"}. As partes são enviadas com
+    PUT no corpo da requisição e o cabeçalho Upload-Offset; POST .../complete
+    anexa o arquivo ao ticket.
+    """
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        ticket = db.session.get(Ticket, ticket_id)
+        if not ticket:
+            return jsonify({'error': 'Chamado não encontrado'}), 404
+        
+        user_id = session['user_id']
+        permissions = get_current_permissions()
+        if not can_access_ticket(permissions, user_id, ticket):
+            return jsonify({'error': 'Sem permissão para adicionar arquivos a este chamado'}), 403
+        
+        data = request.get_json() or {}
+        filename = data.get('filename')
+        size = data.get('size')
+        
+        if not filename or not allowed_file(filename):
+            return jsonify({'error': 'Tipo de arquivo não permitido'}), 400
+        if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+            return jsonify({'error': 'Tamanho do arquivo é obrigatório'}), 400
+        if size > MAX_UPLOAD_SIZE:
+            return jsonify({'error': f'Arquivo maior que o limite de {MAX_UPLOAD_SIZE // (1024 * 1024)} MB'}), 413
+        
+        # Aproveita a criação para limpar sessões abandonadas
+        expire_upload_sessions()
+        
+        upload = UploadSession(
+            id=uuid.uuid4().hex,
+            ticket_id=ticket_id,
+            user_id=user_id,
+            filename=filename,
+            file_type=data.get('content_type') or 'application/octet-stream',
+            total_size=size,
+            received_bytes=0
+        )
+        upload.touch()
+        create_staging(upload.id)
+        db.session.add(upload)
+        db.session.commit()
+        
+        response = upload.to_dict()
+        response['chunk_size'] = MAX_CHUNK_SIZE
+        return jsonify(response), 201
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@uploads_bp.route('/tickets/<int:ticket_id>/uploads/<upload_id>', methods=['GET'])
+@cross_origin()
+def get_upload_status(ticket_id, upload_id):
+    """Offset atual do upload, para o cliente retomar de onde parou"""
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    upload, error = get_upload(ticket_id, upload_id)
+    if error:
+        return error
+    return jsonify(upload.to_dict()), 200
+
+@uploads_bp.route('/tickets/<int:ticket_id>/uploads/<upload_id>', methods=['PUT'])
+@cross_origin()
+def upload_chunk(ticket_id, upload_id):
+    """Recebe uma parte; Upload-Offset deve ser igual ao offset atual"""
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        upload, error = get_upload(ticket_id, upload_id)
+        if error:
+            return error
+        
+        offset = request.headers.get('Upload-Offset', type=int)
+        if offset != upload.received_bytes:
+            # Parte fora de ordem ou repetida: o cliente consulta e retoma
+            return jsonify({'error': 'Offset inválido', 'offset': upload.received_bytes}), 409
+        
+        remaining = upload.total_size - offset
+        claim = claim_upload(upload.id, offset)
+        if claim is None:
+            return jsonify({'error': 'Outra parte está sendo gravada', 'offset': offset}), 409
+        try:
+            written = append_chunk(upload.id, offset, request.stream, min(remaining, MAX_CHUNK_SIZE))
+        except Exception:
+            release_upload(upload.id, claim)
+            raise
+        
+        if not finish_chunk(upload.id, offset, written, claim):
+            return jsonify({'error': 'Offset inválido', 'offset': upload.received_bytes}), 409
+        return jsonify(upload.to_dict()), 200
+    
+    except FileTooLarge as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 413
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@uploads_bp.route('/tickets/<int:ticket_id>/uploads/<upload_id>/complete', methods=['POST'])
+@cross_origin()
+def complete_upload(ticket_id, upload_id):
+    """Conclui o upload e anexa o arquivo ao ticket"""
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        upload, error = get_upload(ticket_id, upload_id)
+        if error:
+            return error
+        
+        # As permissões podem ter mudado desde a criação da sessão
+        ticket = db.session.get(Ticket, ticket_id)
+        if not ticket or not can_access_ticket(get_current_permissions(), session['user_id'], ticket):
+            return jsonify({'error': 'Sem permissão para adicionar arquivos a este chamado'}), 403
+        
+        if upload.received_bytes != upload.total_size:
+            return jsonify({'error': 'Upload incompleto', 'offset': upload.received_bytes}), 409
+        
+        # A mesma reserva das partes: duas conclusões não anexam o arquivo duas vezes
+        claim = claim_upload(upload.id, upload.total_size)
+        if claim is None:
+            return jsonify({'error': 'Upload em andamento', 'offset': upload.received_bytes}), 409
+        try:
+            stored = publish_staging(upload.id)
+            ticket_file = create_ticket_file(
+                ticket_id, upload.user_id, upload.filename, upload.file_type, stored
+            )
+            schedule_thumbnail(ticket_file)
+            # Novo anexo altera o ticket (invalida ETag e aparece na sincronização)
+            ticket.updated_at = datetime.utcnow()
+            db.session.delete(upload)
+            db.session.commit()
+        except Exception:
+            release_upload(upload.id, claim)
+            raise
+        
+        return jsonify({
+            'message': 'Arquivo enviado com sucesso',
+            'file': ticket_file.to_dict()
+        }), 201
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@uploads_bp.route('/tickets/<int:ticket_id>/uploads/<upload_id>', methods=['DELETE'])
+@cross_origin()
+def cancel_upload(ticket_id, upload_id):
+    """Cancela o upload e descarta os bytes recebidos"""
+    auth_error = require_auth()
+    if auth_error:
+        return auth_error
+    
+    try:
+        upload, error = get_upload(ticket_id, upload_id)
+        if error:
+            return error
+        
+        discard_staging(upload.id)
+        db.session.delete(upload)
+        db.session.commit()
+        return jsonify({'message': 'Upload cancelado'}), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
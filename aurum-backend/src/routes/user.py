@@ -1,12 +1,18 @@
 from flask import Blueprint, jsonify, request
 from src.models.user import User, db
+from src.identity import invalidate_permissions
+from src.http_cache import compute_etag, not_modified, with_validators
 
 user_bp = Blueprint("user", __name__)
 
 @user_bp.route("/users", methods=["GET"])
 def get_users():
-    users = User.query.all()
-    return jsonify([user.to_dict() for user in users])
+    etag = compute_etag('users', *User.list_watermark())
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    users = User.query.options(*User.serialization_options()).all()
+    return with_validators(jsonify([user.to_dict() for user in users]), etag)
 
 @user_bp.route("/users", methods=["POST"])
 def create_user():
@@ -31,7 +37,9 @@ def update_user(user_id):
     user.profile = data.get("profile", user.profile)
     if "password" in data:
         user.set_password(data["password"])
+    user.bump_permissions_version()
     db.session.commit()
+    invalidate_permissions(user.id)
     return jsonify(user.to_dict())
 
 @user_bp.route("/users/<int:user_id>", methods=["DELETE"])
@@ -39,6 +47,7 @@ def delete_user(user_id):
     user = User.query.get_or_404(user_id)
     db.session.delete(user)
     db.session.commit()
+    invalidate_permissions(user_id)
     return jsonify({}), 200
 
 
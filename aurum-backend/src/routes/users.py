@@ -1,21 +1,27 @@
 from flask import Blueprint, request, jsonify, session
 from src.models.user import db, User
+from src.identity import get_current_permissions, invalidate_permissions
+from src.http_cache import compute_etag, not_modified, with_validators
+from src.passwords import PasswordHasherBusy, busy_response
 
 users_bp = Blueprint('users', __name__)
 
 def check_admin_permission():
     """Verifica se o usuário logado é administrador"""
-    if 'user_id' not in session:
-        return False
-    
-    user = User.query.get(session['user_id'])
-    return user and user.profile == 'administrador'
+    permissions = get_current_permissions()
+    return bool(permissions and permissions['is_admin'])
 
 @users_bp.route('/users', methods=['GET'])
 def get_users():
     try:
-        users = User.query.all()
-        return jsonify([user.to_dict() for user in users]), 200
+        etag = compute_etag('users', *User.list_watermark())
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        users = User.query.options(*User.serialization_options()).all()
+        response = jsonify([user.to_dict() for user in users])
+        return with_validators(response, etag), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -64,6 +70,9 @@ def create_user():
         
         return jsonify(new_user.to_dict()), 201
     
+    except PasswordHasherBusy:
+        db.session.rollback()
+        return busy_response()
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -111,9 +120,15 @@ def update_user(user_id):
         if 'password' in data and data['password']:
             user.set_password(data['password'])
         
+        # Qualquer alteração invalida as permissões em cache do usuário
+        user.bump_permissions_version()
         db.session.commit()
+        invalidate_permissions(user.id)
         return jsonify(user.to_dict()), 200
     
+    except PasswordHasherBusy:
+        db.session.rollback()
+        return busy_response()
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -135,6 +150,7 @@ def delete_user(user_id):
         
         db.session.delete(user)
         db.session.commit()
+        invalidate_permissions(user_id)
         
         return jsonify({'message': 'Usuário excluído com sucesso'}), 200
     
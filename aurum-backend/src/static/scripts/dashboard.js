@@ -111,13 +111,23 @@ function updateTicketStats(stats) {
     if (closedElement) closedElement.textContent = stats.fechado || stats.fechados || 0;
 }
 
-// Load tickets
-async function loadTickets() {
+// Tickets already loaded and cursor for the next page
+let loadedTickets = [];
+let ticketsNextCursor = null;
+
+// Load tickets (first page, or the next one when append is true)
+async function loadTickets(append = false) {
     try {
-        const response = await apiRequest("/api/tickets");
+        const url = append && ticketsNextCursor
+            ? `/api/tickets?fields=summary&cursor=${encodeURIComponent(ticketsNextCursor)}`
+            : "/api/tickets?fields=summary";
+        const response = await apiRequest(url);
         if (response.ok) {
             const data = await response.json();
-            displayTickets(data.tickets || data);
+            const tickets = data.tickets || data;
+            loadedTickets = append ? loadedTickets.concat(tickets) : tickets;
+            ticketsNextCursor = data.next_cursor || null;
+            displayTickets(loadedTickets);
         }
     } catch (error) {
         console.error("Error loading tickets:", error);
@@ -153,8 +163,8 @@ function displayTickets(tickets) {
                 <p><strong>Serviço:</strong> ${ticket.service_type || "N/A"}</p>
                 <p><strong>Prioridade:</strong> ${getPriorityLabel(ticket.priority)}</p>
                 <p><strong>Criado em:</strong> ${formatDate(ticket.created_at)}</p>
-                ${ticket.files && ticket.files.length > 0 ? 
-                    `<p><strong>Arquivos:</strong> ${ticket.files.length} anexo(s)</p>` : 
+                ${ticket.file_count > 0 ? 
+                    `<p><strong>Arquivos:</strong> ${ticket.file_count} anexo(s)</p>` : 
                     ''
                 }
             </div>
@@ -163,7 +173,11 @@ function displayTickets(tickets) {
                 <button onclick="editTicket(${ticket.id})" class="btn-primary">Editar</button>
             </div>
         </div>
-    `).join("");
+    `).join("") + (ticketsNextCursor ? `
+        <div class="load-more">
+            <button onclick="loadTickets(true)" class="btn-secondary">Carregar mais</button>
+        </div>
+    ` : "");
 }
 
 // Load users
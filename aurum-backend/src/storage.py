@@ -0,0 +1,353 @@
+import errno
+import hashlib
+import mimetypes
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from flask import Request, current_app, request
+from werkzeug.utils import send_file
+from sqlalchemy.dialects.sqlite import insert
+
+from src.models.user import db
+from src.models.file_blob import FileBlob
+from src.http_cache import not_modified
+
+# Raiz padrão dos anexos (a aplicação define UPLOAD_ROOT com o caminho absoluto).
+# Caminhos antigos gravados como 'uploads/tickets/...' são relativos a esta pasta.
+UPLOAD_FOLDER = 'uploads/tickets'
+MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
+# Uploads em partes (retomáveis): limite do arquivo e de cada parte
+MAX_UPLOAD_SIZE = 1024 * 1024 * 1024  # 1GB
+MAX_CHUNK_SIZE = 8 * 1024 * 1024  # 8MB
+CHUNK_SIZE = 64 * 1024
+# Blobs nunca mudam de conteúdo: o navegador pode guardá-los por um ano
+BLOB_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+# Níveis de subpastas dos blobs: blobs/ab/cd/abcd... (65536 pastas)
+SHARD_DEPTH = 2
+MIGRATION_BATCH_SIZE = 500
+
+class FileTooLarge(Exception):
+    """O upload passou do tamanho máximo permitido.
+
+    Não herda de ValueError: o parser de formulários do Werkzeug descarta
+    ValueError silenciosamente, e este erro precisa chegar à rota.
+    """
+
+class LocalStorage:
+    """Anexos em disco local, sob uma raiz absoluta.
+
+    O banco guarda chaves relativas à raiz (ex.: blobs/ab/cd/<sha256>), então
+    os caminhos não dependem da pasta de trabalho e a raiz pode mudar de
+    lugar. Os blobs são distribuídos em subpastas pelo hash, para que
+    nenhuma pasta acumule centenas de milhares de entradas. Toda gravação
+    passa por um temporário na própria raiz e é publicada com link/rename
+    atômico: leitores nunca veem arquivo pela metade.
+    """
+
+    def __init__(self, root, shard_depth=SHARD_DEPTH):
+        self.root = Path(root).resolve()
+        self.shard_depth = shard_depth
+
+    def blob_key(self, content_hash):
+        shards = [content_hash[i * 2:i * 2 + 2] for i in range(self.shard_depth)]
+        return '/'.join(['blobs', *shards, content_hash])
+
+    def path(self, key):
+        """Caminho absoluto de uma chave (aceita também caminhos antigos)"""
+        key = key.replace('\\', '/')
+        if Path(key).is_absolute():
+            return Path(key)
+        if key.startswith(UPLOAD_FOLDER + '/'):
+            key = key[len(UPLOAD_FOLDER) + 1:]
+        return self.root / key
+
+    def temp_file(self):
+        """Temporário na mesma partição da raiz (apagado ao fechar)"""
+        temp_dir = self.root / 'tmp'
+        temp_dir.mkdir(parents=True, exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=temp_dir, delete=True)
+
+    def publish(self, source, key, keep_source=False):
+        """Publica o arquivo source na chave; False se o conteúdo já existia.
+
+        Com keep_source o arquivo é ligado por hard link (source continua
+        existindo); senão é movido. Entre partições diferentes, copia para
+        um temporário ao lado do destino e renomeia.
+        """
+        target = self.path(key)
+        if target.exists():
+            if not keep_source:
+                os.unlink(source)
+            return False
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if keep_source:
+                os.link(source, target)
+            else:
+                os.replace(source, target)
+        except FileExistsError:
+            # Outro upload publicou o mesmo conteúdo ao mesmo tempo
+            return False
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            self._copy_into(source, target)
+            if not keep_source:
+                os.unlink(source)
+        return True
+
+    def _copy_into(self, source, target):
+        fd, temp_path = tempfile.mkstemp(dir=target.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as temp, open(source, 'rb') as original:
+                shutil.copyfileobj(original, temp, CHUNK_SIZE)
+                temp.flush()
+                os.fsync(temp.fileno())
+            os.replace(temp_path, target)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def delete(self, key):
+        self.path(key).unlink(missing_ok=True)
+
+    def move(self, key, new_key):
+        """Renomeia dentro da raiz (atômico); False se key não existe"""
+        target = self.path(new_key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(self.path(key), target)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def walk(self, after='', skip=()):
+        """Chaves dos arquivos em ordem, com os.stat, começando após a chave after.
+
+        As pastas são percorridas em ordem alfabética; subpastas inteiras
+        anteriores a after são puladas sem serem listadas, então retomar uma
+        varredura não relê o que já foi verificado.
+        """
+        after_parts = tuple(after.split('/')) if after else ()
+
+        def visit(directory, parts):
+            try:
+                with os.scandir(directory) as iterator:
+                    entries = sorted(iterator, key=lambda entry: entry.name)
+            except FileNotFoundError:
+                return
+            for entry in entries:
+                entry_parts = parts + (entry.name,)
+                key = '/'.join(entry_parts)
+                if entry.is_dir(follow_symlinks=False):
+                    if key in skip or entry_parts < after_parts[:len(entry_parts)]:
+                        continue
+                    yield from visit(entry.path, entry_parts)
+                elif entry_parts > after_parts:
+                    try:
+                        yield key, entry.stat(follow_symlinks=False)
+                    except FileNotFoundError:
+                        continue
+
+        yield from visit(self.root, ())
+
+# Backends disponíveis para STORAGE_BACKEND
+STORAGE_BACKENDS = {
+    'local': LocalStorage,
+}
+
+def init_storage(app):
+    """Cria o backend configurado (STORAGE_BACKEND, UPLOAD_ROOT)"""
+    backend = STORAGE_BACKENDS[app.config.get('STORAGE_BACKEND', 'local')]
+    app.extensions['storage'] = backend(app.config.get('UPLOAD_ROOT', UPLOAD_FOLDER))
+
+def get_storage():
+    return current_app.extensions['storage']
+
+def upload_root():
+    return get_storage().root
+
+def blob_path(content_hash):
+    storage = get_storage()
+    return storage.path(storage.blob_key(content_hash))
+
+class HashingFile:
+    """Arquivo temporário que calcula SHA-256 e tamanho durante a gravação.
+
+    A escrita é interrompida com FileTooLarge assim que o tamanho passa de
+    max_size. O temporário é apagado ao fechar; commit() o publica antes
+    disso com um hard link, sem copiar o conteúdo.
+    """
+
+    def __init__(self, max_size=MAX_FILE_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._file = get_storage().temp_file()
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_size:
+            self._file.close()
+            raise FileTooLarge(f'Arquivo maior que o limite de {self.max_size // (1024 * 1024)} MB')
+        self._digest.update(data)
+        return self._file.write(data)
+
+    @property
+    def content_hash(self):
+        return self._digest.hexdigest()
+
+    def commit(self, key):
+        """Publica o conteúdo na chave; se já existir (duplicata), só descarta"""
+        self._file.flush()
+        get_storage().publish(self._file.name, key, keep_source=True)
+        self._file.close()
+
+    def __getattr__(self, name):
+        # read, seek, tell, close... vão direto para o temporário
+        return getattr(self._file, name)
+
+class UploadRequest(Request):
+    """Request que grava os anexos de tickets já calculando hash e tamanho.
+
+    O Werkzeug chama _get_file_stream para cada arquivo do multipart e escreve
+    nele à medida que o corpo chega; assim o limite é aplicado durante o
+    recebimento e o conteúdo é lido uma única vez.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.blueprint == 'tickets':
+            return HashingFile(MAX_FILE_SIZE)
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+def save_upload(stream, max_size=MAX_FILE_SIZE):
+    """Grava um upload no armazenamento por conteúdo.
+
+    Se o conteúdo já existe, nada é gravado: duplicatas não ocupam disco. O
+    ref_count é incrementado pelo trigger ao inserir o TicketFile. Retorna
+    (hash, tamanho, chave do blob).
+    """
+    if not isinstance(stream, HashingFile):
+        target = HashingFile(max_size)
+        shutil.copyfileobj(stream, target, CHUNK_SIZE)
+        stream = target
+
+    content_hash, size = stream.content_hash, stream.size
+    key = get_storage().blob_key(content_hash)
+    stream.commit(key)
+    return register_blob(content_hash, size, key)
+
+def register_blob(content_hash, size, key):
+    """Registra o blob (se ainda não existir); retorna (hash, tamanho, chave)"""
+    stmt = insert(FileBlob.__table__).values(
+        content_hash=content_hash, size=size, path=key, ref_count=0
+    ).on_conflict_do_nothing(index_elements=['content_hash'])
+    db.session.execute(stmt)
+    return content_hash, size, key
+
+def hash_file(path):
+    """SHA-256 e tamanho de um arquivo, em uma leitura sequencial"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+def staging_path(upload_id):
+    return get_storage().path(f'staging/{upload_id}')
+
+def create_staging(upload_id):
+    path = staging_path(upload_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+    return path
+
+def append_chunk(upload_id, offset, stream, max_bytes):
+    """Grava o corpo da requisição no staging a partir de offset, em blocos.
+    
+    Lê direto do stream, sem bufferizar a parte em memória. Levanta
+    FileTooLarge se chegarem mais de max_bytes. Retorna os bytes gravados.
+    """
+    written = 0
+    with open(staging_path(upload_id), 'r+b') as target:
+        target.seek(offset)
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > max_bytes:
+                raise FileTooLarge('Parte maior que o tamanho restante do arquivo')
+            target.write(chunk)
+        # Descarta o que sobrou de uma tentativa anterior interrompida
+        target.truncate(offset + written)
+    return written
+
+def publish_staging(upload_id):
+    """Move o arquivo de staging concluído para o armazenamento por conteúdo.
+    
+    O hash é calculado em uma leitura sequencial; o arquivo é movido com
+    rename (sem cópia) ou descartado se o conteúdo já existir.
+    """
+    path = staging_path(upload_id)
+    content_hash, size = hash_file(path)
+    storage = get_storage()
+    key = storage.blob_key(content_hash)
+    storage.publish(path, key)
+    return register_blob(content_hash, size, key)
+
+def discard_staging(upload_id):
+    staging_path(upload_id).unlink(missing_ok=True)
+
+def send_stored_file(path, download_name, content_hash=None, inline=False):
+    """Envia um anexo com ETag forte, Range e, se configurado, via proxy.
+    
+    O ETag é o hash do conteúdo (ou tamanho+mtime para anexos antigos).
+    Com FILE_DOWNLOAD_OFFLOAD = 'x-accel' o nginx faz a transferência (a
+    partir de X_ACCEL_PREFIX, mapeado para a pasta de uploads); com
+    'x-sendfile' o Apache/lighttpd lê o arquivo pelo caminho absoluto. Nos
+    dois casos o worker Python é liberado sem ler o arquivo.
+    """
+    stat = os.stat(path)  # FileNotFoundError se o arquivo sumiu do disco
+    etag = content_hash or f'{stat.st_size}-{int(stat.st_mtime)}'
+    offload = current_app.config.get('FILE_DOWNLOAD_OFFLOAD')
+    
+    relative = None
+    if offload == 'x-accel':
+        try:
+            relative = Path(path).resolve().relative_to(upload_root()).as_posix()
+        except ValueError:
+            # Anexo antigo fora de UPLOAD_ROOT: o nginx não alcança, o Flask envia
+            pass
+    
+    if relative is not None:
+        cached = not_modified(etag)
+        if cached:
+            cached.headers['Cache-Control'] = BLOB_CACHE_CONTROL
+            return cached
+        mimetype = mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = current_app.config.get('X_ACCEL_PREFIX', '/protected-uploads/') + relative
+        response.headers.set('Content-Disposition', 'inline' if inline else 'attachment', filename=download_name)
+        response.set_etag(etag)
+    else:
+        # send_file do Werkzeug trata Range/If-Range e 304; o X-Sendfile vale só aqui
+        response = send_file(
+            path,
+            request.environ,
+            as_attachment=not inline,
+            download_name=download_name,
+            etag=etag,
+            conditional=True,
+            max_age=None,
+            use_x_sendfile=offload == 'x-sendfile',
+            response_class=current_app.response_class
+        )
+    response.headers['Cache-Control'] = BLOB_CACHE_CONTROL
+    # Anuncia o suporte a Range para clientes que retomam downloads
+    response.accept_ranges = 'bytes'
+    return response
@@ -0,0 +1,299 @@
+from datetime import datetime, timedelta
+from itertools import islice
+
+from sqlalchemy import delete, event, select, union
+
+from src.models.user import db
+from src.models.file_blob import FileBlob
+from src.models.ticket_file import TicketFile
+from src.models.upload_session import UploadSession
+from src.models.quarantined_file import QuarantinedFile, StorageScanCursor
+from src.storage import get_storage
+
+# Arquivos mais novos que isso podem ser de uploads ainda em andamento
+ORPHAN_GRACE = timedelta(hours=1)
+# Órfãos ficam na quarentena por este período antes de serem apagados
+QUARANTINE_PERIOD = timedelta(days=7)
+GC_BATCH_SIZE = 1000
+QUARANTINE_PREFIX = 'quarantine'
+
+class ReconcileReport:
+    """Resultado de uma execução do reconciliador"""
+
+    def __init__(self):
+        self.scanned = 0
+        self.quarantined = 0
+        self.quarantined_bytes = 0
+        self.deleted = 0
+        self.reclaimed_bytes = 0
+        self.restored = 0
+        self.finished = False
+        self.missing = []  # (tabela, identificador, chave) com arquivo ausente
+
+def _category(key):
+    """Pasta de topo da chave: blobs, staging, tmp, derived ou legacy (arquivos antigos)"""
+    top = key.split('/', 1)[0]
+    return top if '/' in key and top in ('blobs', 'staging', 'tmp', 'derived') else 'legacy'
+
+def _name(key):
+    return key.rsplit('/', 1)[-1]
+
+def _derived_cache_key(key):
+    # derived/ab/<hash ou file-id>-256.jpg
+    return _name(key).rsplit('-', 1)[0]
+
+def _legacy_references(storage):
+    """Chaves dos arquivos fora do layout por hash (poucos; carregadas uma vez).
+
+    Inclui os anexos anteriores à deduplicação e os blobs ainda gravados com
+    o caminho antigo (absoluto, sem subpastas), antes de flask
+    migrate-storage: sem eles, o reconciliador mandaria para a quarentena
+    arquivos em uso.
+    """
+    rows = db.session.execute(union(
+        select(TicketFile.file_path.label('path')).where(~TicketFile.file_path.startswith('blobs/')),
+        select(FileBlob.path.label('path')).where(~FileBlob.path.startswith('blobs/'), FileBlob.ref_count > 0)
+    ))
+    root = storage.root
+    references = set()
+    for row in rows:
+        path = storage.path(row.path)
+        if path.is_relative_to(root):
+            references.add(path.relative_to(root).as_posix())
+    return references
+
+def referenced_keys(keys, legacy_references):
+    """Subconjunto de keys que o banco ainda usa.
+
+    Uma consulta IN por categoria para o lote inteiro, em vez de uma por
+    arquivo. Blobs são comparados pelo hash (o nome do arquivo): contam
+    como usados se têm ref_count > 0, mesmo que o registro ainda aponte para
+    o caminho antigo.
+    """
+    by_category = {}
+    for key in keys:
+        by_category.setdefault(_category(key), []).append(key)
+    referenced = set()
+
+    blob_keys = by_category.get('blobs', [])
+    if blob_keys:
+        live = set(db.session.scalars(
+            select(FileBlob.content_hash).where(
+                FileBlob.content_hash.in_([_name(key) for key in blob_keys]),
+                FileBlob.ref_count > 0
+            )
+        ))
+        referenced.update(key for key in blob_keys if _name(key) in live)
+
+    staging_keys = by_category.get('staging', [])
+    if staging_keys:
+        ids = {_name(key): key for key in staging_keys}
+        rows = db.session.execute(select(UploadSession.id).where(UploadSession.id.in_(list(ids))))
+        referenced.update(ids[row.id] for row in rows)
+
+    derived_keys = by_category.get('derived', [])
+    if derived_keys:
+        cache_keys = {_derived_cache_key(key) for key in derived_keys}
+        hashes = [cache_key for cache_key in cache_keys if not cache_key.startswith('file-')]
+        file_ids = [int(cache_key[5:]) for cache_key in cache_keys if cache_key[5:].isdigit()]
+        live = set()
+        if hashes:
+            live.update(row.content_hash for row in db.session.execute(
+                select(FileBlob.content_hash).where(FileBlob.content_hash.in_(hashes))
+            ))
+        if file_ids:
+            live.update(f'file-{row.id}' for row in db.session.execute(
+                select(TicketFile.id).where(TicketFile.id.in_(file_ids))
+            ))
+        referenced.update(key for key in derived_keys if _derived_cache_key(key) in live)
+
+    referenced.update(key for key in by_category.get('legacy', []) if key in legacy_references)
+    return referenced
+
+def _quarantine_key(key):
+    return f'{QUARANTINE_PREFIX}/{key}'
+
+def _scan_batch(storage, batch, legacy_references, now, report):
+    report.scanned += len(batch)
+    referenced = referenced_keys([key for key, _ in batch], legacy_references)
+    orphans = [
+        (key, stat) for key, stat in batch
+        if key not in referenced and datetime.utcfromtimestamp(stat.st_mtime) < now - ORPHAN_GRACE
+    ]
+    if not orphans:
+        return
+
+    to_quarantine = []
+    for key, stat in orphans:
+        # Temporários e miniaturas não têm valor: são apagados direto
+        if _category(key) in ('tmp', 'derived'):
+            storage.delete(key)
+            report.deleted += 1
+            report.reclaimed_bytes += stat.st_size
+        else:
+            to_quarantine.append((key, stat))
+
+    # Blobs sem referências deixam de existir no banco junto com a quarentena
+    hashes = [_name(key) for key, _ in to_quarantine if _category(key) == 'blobs']
+    if hashes:
+        db.session.execute(
+            delete(FileBlob.__table__).where(FileBlob.content_hash.in_(hashes), FileBlob.ref_count <= 0)
+        )
+    moved = []
+    for key, stat in to_quarantine:
+        if storage.move(key, _quarantine_key(key)):
+            db.session.merge(QuarantinedFile(key=key, size=stat.st_size, reason=_category(key), quarantined_at=now))
+            moved.append(key)
+            report.quarantined += 1
+            report.quarantined_bytes += stat.st_size
+    db.session.commit()
+
+    # Um upload pode ter reaproveitado o blob entre a verificação e a mudança;
+    # se ele confirmar só depois desta releitura, recover_blobs o devolve
+    for key in referenced_keys(moved, legacy_references):
+        _restore(storage, key, report)
+    db.session.commit()
+
+def _restore(storage, key, report):
+    if not storage.path(key).exists():
+        storage.move(_quarantine_key(key), key)
+    else:
+        storage.delete(_quarantine_key(key))
+    db.session.execute(delete(QuarantinedFile.__table__).where(QuarantinedFile.key == key))
+    report.restored += 1
+
+def recover_blobs(keys):
+    """Devolve da quarentena os blobs recém-referenciados que sumiram.
+
+    Um upload duplicado não grava o arquivo: só confere que ele existe e
+    insere o TicketFile. Se o reconciliador mover o blob para a quarentena
+    entre essas duas etapas e reler o banco antes do commit do upload, o
+    arquivo ficaria fora do lugar até a purga. Por isso, após o commit,
+    cada chave nova é conferida (um stat) e restaurada se necessário.
+    """
+    storage = get_storage()
+    for key in keys:
+        if not storage.path(key).exists():
+            storage.move(_quarantine_key(key), key)
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_new_blobs(session, flush_context):
+    keys = [
+        obj.file_path for obj in session.new
+        if isinstance(obj, TicketFile) and obj.content_hash is not None
+    ]
+    if keys:
+        session.info.setdefault('new_blob_keys', set()).update(keys)
+
+@event.listens_for(db.session, 'after_commit')
+def _recover_new_blobs(session):
+    keys = session.info.pop('new_blob_keys', None)
+    if keys:
+        recover_blobs(keys)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_new_blobs(session):
+    session.info.pop('new_blob_keys', None)
+
+def purge_quarantine(storage, legacy_references, now, report):
+    """Apaga os órfãos com quarentena vencida (ou os devolve, se voltaram a ser usados)"""
+    cutoff = now - QUARANTINE_PERIOD
+    last_key = ''
+    while True:
+        batch = db.session.execute(
+            select(QuarantinedFile.key, QuarantinedFile.size)
+            .where(QuarantinedFile.quarantined_at < cutoff, QuarantinedFile.key > last_key)
+            .order_by(QuarantinedFile.key)
+            .limit(GC_BATCH_SIZE)
+        ).all()
+        if not batch:
+            return
+        last_key = batch[-1].key
+
+        referenced = referenced_keys([row.key for row in batch], legacy_references)
+        expired = []
+        for row in batch:
+            if row.key in referenced:
+                _restore(storage, row.key, report)
+                continue
+            storage.delete(_quarantine_key(row.key))
+            expired.append(row.key)
+            report.deleted += 1
+            report.reclaimed_bytes += row.size
+        if expired:
+            db.session.execute(delete(QuarantinedFile.__table__).where(QuarantinedFile.key.in_(expired)))
+        db.session.commit()
+
+def find_missing_files(storage, report):
+    """Registros cujo arquivo não existe no armazenamento (um stat por arquivo, sem consultas)"""
+    last_hash = ''
+    while True:
+        batch = db.session.execute(
+            select(FileBlob.content_hash, FileBlob.path)
+            .where(FileBlob.content_hash > last_hash, FileBlob.ref_count > 0)
+            .order_by(FileBlob.content_hash)
+            .limit(GC_BATCH_SIZE)
+        ).all()
+        if not batch:
+            break
+        last_hash = batch[-1].content_hash
+        report.missing.extend(
+            ('file_blobs', row.content_hash, row.path) for row in batch if not storage.path(row.path).exists()
+        )
+
+    last_id = 0
+    while True:
+        batch = db.session.execute(
+            select(TicketFile.id, TicketFile.file_path)
+            .where(TicketFile.id > last_id, TicketFile.content_hash.is_(None))
+            .order_by(TicketFile.id)
+            .limit(GC_BATCH_SIZE)
+        ).all()
+        if not batch:
+            break
+        last_id = batch[-1].id
+        report.missing.extend(
+            ('ticket_files', row.id, row.file_path) for row in batch if not storage.path(row.file_path).exists()
+        )
+
+def reconcile_storage(limit=None, now=None):
+    """Confere o armazenamento contra o banco e recolhe os arquivos órfãos.
+
+    Percorre o armazenamento em lotes de GC_BATCH_SIZE, verificando cada lote
+    com consultas IN. Órfãos mais velhos que ORPHAN_GRACE vão para a
+    quarentena (temporários e miniaturas são apagados direto) e são
+    apagados após QUARANTINE_PERIOD. Com limit, verifica no máximo limit
+    arquivos e grava onde parou; a próxima execução continua dali. Ao
+    completar a varredura, também lista os registros sem arquivo.
+    """
+    now = now or datetime.utcnow()
+    storage = get_storage()
+    report = ReconcileReport()
+    legacy_references = _legacy_references(storage)
+
+    cursor = db.session.get(StorageScanCursor, 1)
+    if cursor is None:
+        cursor = StorageScanCursor(id=1, last_key='')
+        db.session.add(cursor)
+        db.session.commit()
+
+    keys = storage.walk(cursor.last_key, skip={QUARANTINE_PREFIX})
+    if limit is not None:
+        keys = islice(keys, limit)
+    while True:
+        batch = list(islice(keys, GC_BATCH_SIZE))
+        if not batch:
+            break
+        _scan_batch(storage, batch, legacy_references, now, report)
+        cursor.last_key = batch[-1][0]
+        db.session.commit()
+
+    report.finished = limit is None or report.scanned < limit
+    if report.finished:
+        cursor.last_key = ''
+        cursor.started_at = now
+        db.session.commit()
+        find_missing_files(storage, report)
+
+    purge_quarantine(storage, legacy_references, now, report)
+    return report
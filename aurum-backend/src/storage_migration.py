@@ -0,0 +1,111 @@
+from sqlalchemy import select, update
+
+from src.models.user import db
+from src.models.file_blob import FileBlob
+from src.models.ticket_file import TicketFile
+from src.storage import MIGRATION_BATCH_SIZE, get_storage, hash_file, register_blob
+
+class MigrationReport:
+    """Resultado da migração para o layout atual do armazenamento"""
+
+    def __init__(self):
+        self.blobs_moved = 0
+        self.files_converted = 0
+        self.up_to_date = 0
+        self.missing = []
+
+def _remove(paths):
+    for path in paths:
+        path.unlink(missing_ok=True)
+
+def _migrate_blobs(storage, report, batch_size):
+    """Move os blobs para as subpastas por hash e atualiza blob e anexos"""
+    blobs = FileBlob.__table__
+    files = TicketFile.__table__
+    last_hash = ''
+    while True:
+        batch = db.session.execute(
+            select(blobs.c.content_hash, blobs.c.path)
+            .where(blobs.c.content_hash > last_hash)
+            .order_by(blobs.c.content_hash)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            return
+        last_hash = batch[-1].content_hash
+
+        obsolete = []
+        for blob in batch:
+            key = storage.blob_key(blob.content_hash)
+            if blob.path == key:
+                report.up_to_date += 1
+                continue
+            source = storage.path(blob.path)
+            if source.exists():
+                # Hard link: o caminho antigo continua válido até o commit
+                storage.publish(source, key, keep_source=True)
+                obsolete.append(source)
+            elif not storage.path(key).exists():
+                report.missing.append(blob.path)
+                continue
+            db.session.execute(update(blobs).where(blobs.c.content_hash == blob.content_hash).values(path=key))
+            db.session.execute(
+                update(files).where(files.c.content_hash == blob.content_hash).values(file_path=key)
+            )
+            report.blobs_moved += 1
+        db.session.commit()
+        # Os originais só são removidos depois que o banco aponta para o novo caminho
+        _remove(obsolete)
+
+def _convert_legacy_files(storage, report, batch_size):
+    """Converte anexos anteriores à deduplicação em blobs no layout atual"""
+    blobs = FileBlob.__table__
+    files = TicketFile.__table__
+    last_id = 0
+    while True:
+        batch = db.session.execute(
+            select(files.c.id, files.c.file_path)
+            .where(files.c.id > last_id, files.c.content_hash.is_(None))
+            .order_by(files.c.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            return
+        last_id = batch[-1].id
+
+        obsolete = []
+        for ticket_file in batch:
+            source = storage.path(ticket_file.file_path)
+            if not source.exists():
+                report.missing.append(ticket_file.file_path)
+                continue
+            content_hash, size = hash_file(source)
+            key = storage.blob_key(content_hash)
+            storage.publish(source, key, keep_source=True)
+            register_blob(content_hash, size, key)
+            db.session.execute(update(files).where(files.c.id == ticket_file.id).values(
+                content_hash=content_hash, filename=content_hash, file_path=key, file_size=size
+            ))
+            # O trigger de ref_count só age no INSERT de ticket_files
+            db.session.execute(
+                update(blobs).where(blobs.c.content_hash == content_hash)
+                .values(ref_count=blobs.c.ref_count + 1)
+            )
+            obsolete.append(source)
+            report.files_converted += 1
+        db.session.commit()
+        _remove(obsolete)
+
+def migrate_storage_layout(batch_size=MIGRATION_BATCH_SIZE):
+    """Migra os anexos existentes para o layout do backend configurado.
+
+    Pode rodar com a aplicação no ar: cada arquivo é primeiro ligado no novo
+    caminho, o banco é atualizado em lotes e só então o caminho antigo é
+    removido. Pode ser interrompida e executada de novo; o que já está no
+    layout atual é ignorado.
+    """
+    storage = get_storage()
+    report = MigrationReport()
+    _migrate_blobs(storage, report, batch_size)
+    _convert_legacy_files(storage, report, batch_size)
+    return report
@@ -0,0 +1,164 @@
+import sqlite3
+import threading
+import time
+
+from flask import current_app, jsonify
+
+# Padrões: (tentativas, janela em segundos) por IP e por usuário
+DEFAULT_IP_LIMIT = (20, 60)
+DEFAULT_USERNAME_LIMIT = (5, 60)
+COMPACT_INTERVAL = 60  # segundos
+
+class Bucket:
+    """Parâmetros de um token bucket: capacidade e reposição por segundo"""
+
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.rate = capacity / period
+
+    def full_at(self, tokens, now):
+        """Momento em que o bucket volta a ficar cheio (pode ser removido)"""
+        return now + (self.capacity - tokens) / self.rate
+
+    def retry_after(self, tokens):
+        return max(1, int((1 - tokens) / self.rate) + 1)
+
+class MemoryBuckets:
+    """Buckets em memória do processo: O(1) por tentativa"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}  # chave -> (tokens, atualizado em, cheio em)
+        self._compacted_at = time.time()
+
+    def take(self, key, bucket, now):
+        """Consome um token; retorna (permitido, tokens restantes)"""
+        with self._lock:
+            tokens, updated_at, _ = self._buckets.get(key, (bucket.capacity, now, now))
+            tokens = min(bucket.capacity, tokens + (now - updated_at) * bucket.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, bucket.full_at(tokens, now))
+            self._compact(now)
+            return allowed, tokens
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def _compact(self, now):
+        # Buckets que já se encheram de novo equivalem a não ter registro
+        if now - self._compacted_at < COMPACT_INTERVAL:
+            return
+        self._buckets = {key: value for key, value in self._buckets.items() if value[2] > now}
+        self._compacted_at = now
+
+class SQLiteBuckets:
+    """Buckets em um arquivo SQLite, compartilhados entre processos e reinícios.
+
+    Cada tentativa é um único UPSERT ... RETURNING, atômico no SQLite: o
+    token só é consumido quando há saldo, sem ler e gravar em passos separados.
+    """
+
+    SCHEMA = """CREATE TABLE IF NOT EXISTS login_buckets (
+        key TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        full_at REAL NOT NULL
+    )"""
+
+    TAKE_SQL = """
+        INSERT INTO login_buckets (key, tokens, updated_at, full_at)
+        VALUES (:key, :capacity - 1, :now, :now + 1 / :rate)
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = min(:capacity, tokens + (:now - updated_at) * :rate) - 1,
+            updated_at = :now,
+            full_at = :now + (:capacity - min(:capacity, tokens + (:now - updated_at) * :rate) + 1) / :rate
+        WHERE min(:capacity, tokens + (:now - updated_at) * :rate) >= 1
+        RETURNING tokens
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._compacted_at = time.time()
+        self._connection().execute(self.SCHEMA)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, bucket, now):
+        connection = self._connection()
+        params = {'key': key, 'capacity': bucket.capacity, 'rate': bucket.rate, 'now': now}
+        row = connection.execute(self.TAKE_SQL, params).fetchone()
+        self._compact(connection, now)
+        if row is not None:
+            return True, row[0]
+        # Sem saldo: o UPDATE não aconteceu; lê o saldo atual para o Retry-After
+        tokens, updated_at = connection.execute(
+            'SELECT tokens, updated_at FROM login_buckets WHERE key = ?', (key,)
+        ).fetchone()
+        return False, min(bucket.capacity, tokens + (now - updated_at) * bucket.rate)
+
+    def reset(self, key):
+        self._connection().execute('DELETE FROM login_buckets WHERE key = ?', (key,))
+
+    def _compact(self, connection, now):
+        if now - self._compacted_at < COMPACT_INTERVAL:
+            return
+        self._compacted_at = now
+        connection.execute('DELETE FROM login_buckets WHERE full_at <= ?', (now,))
+
+class LoginThrottle:
+    """Limita tentativas de login por IP e por nome de usuário (token bucket).
+
+    A verificação acontece antes da consulta ao usuário e de qualquer hash,
+    então um ataque de força bruta é recusado sem custo de CPU do bcrypt.
+    """
+
+    def __init__(self):
+        self._store = None
+        self._lock = threading.Lock()
+
+    def _buckets(self):
+        with self._lock:
+            if self._store is None:
+                path = current_app.config.get('LOGIN_THROTTLE_DB')
+                self._store = SQLiteBuckets(path) if path else MemoryBuckets()
+            return self._store
+
+    def _limits(self):
+        config = current_app.config
+        return (
+            Bucket(*config.get('LOGIN_THROTTLE_IP', DEFAULT_IP_LIMIT)),
+            Bucket(*config.get('LOGIN_THROTTLE_USERNAME', DEFAULT_USERNAME_LIMIT))
+        )
+
+    def check(self, username, ip):
+        """Consome uma tentativa; retorna None ou os segundos até a próxima permitida"""
+        store = self._buckets()
+        ip_bucket, username_bucket = self._limits()
+        now = time.time()
+        for key, bucket in ((f'ip:{ip}', ip_bucket), (f'user:{username.lower()}', username_bucket)):
+            allowed, tokens = store.take(key, bucket, now)
+            if not allowed:
+                return bucket.retry_after(tokens)
+        return None
+
+    def succeeded(self, username):
+        """Login correto: libera o bucket do usuário (o do IP continua contando)"""
+        self._buckets().reset(f'user:{username.lower()}')
+
+login_throttle = LoginThrottle()
+
+def throttled_response(retry_after):
+    response = jsonify({'error': 'Muitas tentativas de login, tente novamente em instantes'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
@@ -0,0 +1,108 @@
+import mimetypes
+import os
+import tempfile
+
+# Pillow e PyMuPDF são opcionais: sem eles não há miniaturas (ou prévias de PDF)
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+from src.models.user import db
+from src.models.ticket_file import TicketFile
+from src.storage import get_storage
+from src.jobs import enqueue, job_handler
+
+THUMBNAIL_SIZE = 256  # lado máximo, em pixels
+THUMBNAIL_QUALITY = 80
+# Imagens gigantes (ou "bombas" de descompressão) não viram miniatura
+MAX_IMAGE_PIXELS = 50_000_000
+
+IMAGE_TYPES = {'image/png', 'image/jpeg', 'image/gif'}
+PDF_TYPE = 'application/pdf'
+
+def preview_kind(filename):
+    """'image', 'pdf' ou None, pelo tipo deduzido do nome do arquivo"""
+    mimetype = mimetypes.guess_type(filename)[0]
+    if mimetype in IMAGE_TYPES and Image:
+        return 'image'
+    if mimetype == PDF_TYPE and Image and fitz:
+        return 'pdf'
+    return None
+
+def thumbnail_path(cache_key):
+    """Miniatura no cache de artefatos derivados (por hash do conteúdo)"""
+    return get_storage().path(f'derived/{cache_key[:2]}/{cache_key}-{THUMBNAIL_SIZE}.jpg')
+
+def _render_image(source_path):
+    image = Image.open(source_path)
+    if image.width * image.height > MAX_IMAGE_PIXELS:
+        raise ValueError('Imagem grande demais para gerar miniatura')
+    # Em JPEG, draft decodifica já reduzido (bem mais rápido que abrir inteiro)
+    image.draft('RGB', (THUMBNAIL_SIZE * 2, THUMBNAIL_SIZE * 2))
+    return image
+
+def _render_pdf(source_path):
+    with fitz.open(source_path) as document:
+        page = document[0]
+        zoom = THUMBNAIL_SIZE * 2 / max(page.rect.width, page.rect.height)
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        return Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+
+def generate_thumbnail(source_path, filename, cache_key):
+    """Gera (se ainda não existe) a miniatura; retorna o caminho ou None"""
+    target = thumbnail_path(cache_key)
+    if target.exists():
+        return target
+
+    kind = preview_kind(filename)
+    if kind is None:
+        return None
+
+    image = _render_image(source_path) if kind == 'image' else _render_pdf(source_path)
+    image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    if image.mode != 'RGB':
+        # Transparência vira fundo branco
+        background = Image.new('RGB', image.size, 'white')
+        image = image.convert('RGBA')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+
+    # Grava em temporário e renomeia: leitores nunca veem arquivo pela metade
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=target.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as temp:
+            image.save(temp, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+        os.replace(temp_path, target)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return target
+
+def thumbnail_cache_key(ticket_file):
+    # Anexos deduplicados compartilham a miniatura; os antigos usam o id
+    return ticket_file.content_hash or f'file-{ticket_file.id}'
+
+def schedule_thumbnail(ticket_file):
+    """Enfileira a miniatura de um anexo recém-enviado (antes do commit).
+    
+    O job é gravado na mesma transação do anexo. Se nenhum worker estiver
+    rodando, a miniatura é gerada no primeiro acesso.
+    """
+    if preview_kind(ticket_file.original_filename) is None:
+        return None
+    db.session.flush()  # garante o id do anexo
+    return enqueue('thumbnail', {'file_id': ticket_file.id}, priority=-1, max_attempts=3)
+
+@job_handler('thumbnail')
+def thumbnail_job(payload):
+    ticket_file = db.session.get(TicketFile, payload['file_id'])
+    if ticket_file:
+        source = get_storage().path(ticket_file.file_path)
+        generate_thumbnail(source, ticket_file.original_filename, thumbnail_cache_key(ticket_file))
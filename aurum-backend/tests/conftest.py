@@ -0,0 +1,35 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Banco próprio de cada execução, criado e populado pela aplicação ao ser
+# importada; o src/database/app.db versionado nunca é aberto
+_database_dir = tempfile.mkdtemp(prefix='aurum-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_database_dir, 'app.db')}"
+
+sys.path.insert(0, ROOT)
+
+from src.main import app as flask_app
+from src.models.user import db
+
+def pytest_sessionfinish(session, exitstatus):
+    with flask_app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    shutil.rmtree(_database_dir, ignore_errors=True)
+
+@pytest.fixture(scope='session')
+def app():
+    return flask_app
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    response = client.post('/api/auth/login', json={'username': 'admin.sistema', 'password': 'admin123'})
+    assert response.status_code == 200
+    return client
@@ -0,0 +1,43 @@
+import re
+
+import pytest
+from sqlalchemy import inspect, text
+
+from src.migrations import HOT_QUERIES, explain_hot_queries, upgrade_schema
+from src.models.user import db
+
+# Tabelas que crescem com o uso: nenhuma consulta frequente pode varrê-las
+# inteiras. "SCAN ... USING [COVERING] INDEX" (percorrer um índice já na
+# ordem pedida, com LIMIT) é aceito; "SCAN tickets" sozinho não.
+LARGE_TABLES = ('tickets', 'user')
+FULL_SCAN = re.compile(r'^SCAN (\w+)(?! USING (COVERING )?INDEX)')
+
+@pytest.fixture(scope='module')
+def upgraded(app):
+    """Banco como o de uma instalação antiga: sem os índices, depois atualizado"""
+    with app.app_context():
+        inspector = inspect(db.engine)
+        with db.engine.begin() as connection:
+            for table in LARGE_TABLES:
+                for index in inspector.get_indexes(table):
+                    if index['name'].startswith('ix_'):
+                        connection.execute(text(f'DROP INDEX "{index["name"]}"'))
+        upgrade_schema()
+        yield
+
+def test_every_hot_query_is_explained(app, upgraded):
+    with app.app_context():
+        results = explain_hot_queries()
+    assert [description for description, _, _ in results] == [description for description, _, _ in HOT_QUERIES]
+
+@pytest.mark.parametrize('description', [description for description, _, _ in HOT_QUERIES])
+def test_hot_query_does_not_scan_large_tables(app, upgraded, description):
+    with app.app_context():
+        plans = {item: (plan, uses_index) for item, plan, uses_index in explain_hot_queries()}
+    plan, uses_index = plans[description]
+    scans = [
+        detail for detail in plan
+        if (match := FULL_SCAN.match(detail)) and match.group(1) in LARGE_TABLES
+    ]
+    assert not scans, f'{description}: {plan}'
+    assert uses_index, f'{description}: {plan}'
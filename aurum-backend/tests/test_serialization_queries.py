@@ -0,0 +1,84 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from src.models.user import db, User
+from src.models.ticket import Ticket
+from src.models.ticket_file import TicketFile
+from src.models.ticket_response import TicketResponse
+
+TICKETS = 30
+
+@pytest.fixture(scope='module')
+def ticket_ids(app):
+    """Tickets com solicitante, técnico, empresa, anexo e respostas"""
+    with app.app_context():
+        requester = User.query.filter_by(username='maria.santos').one()
+        technician = User.query.filter_by(username='joao.silva').one()
+        ids = []
+        for index in range(TICKETS):
+            ticket = Ticket(
+                title=f'Teste de consultas {index}', description='d', service_type='Consultoria em T.I.',
+                user_id=requester.id, assigned_to=technician.id, company_id=1
+            )
+            db.session.add(ticket)
+            db.session.flush()
+            db.session.add(TicketFile(
+                ticket_id=ticket.id, filename=f'teste-{index}.txt', original_filename='teste.txt',
+                file_path=f'teste-{index}.txt', file_size=1, file_type='text/plain', uploaded_by=technician.id
+            ))
+            for author in (requester, technician):
+                db.session.add(TicketResponse(ticket_id=ticket.id, user_id=author.id, message='ok'))
+            ids.append(ticket.id)
+        db.session.commit()
+        return ids
+
+@contextmanager
+def count_queries(app):
+    """Conta os comandos SQL executados no bloco"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+def queries_for(app, client, url):
+    # A primeira requisição da sessão ainda carrega as permissões do usuário
+    client.get(url)
+    with count_queries(app) as statements:
+        response = client.get(url)
+    assert response.status_code == 200
+    return response, len(statements)
+
+def test_ticket_list_query_count_does_not_depend_on_page_size(app, client, ticket_ids):
+    small, small_count = queries_for(app, client, '/api/tickets?limit=2')
+    large, large_count = queries_for(app, client, '/api/tickets?limit=25')
+
+    assert len(small.get_json()['tickets']) == 2
+    assert len(large.get_json()['tickets']) == 25
+    # Os tickets trazem usuário, técnico, empresa e anexos (com quem enviou)
+    ticket = large.get_json()['tickets'][0]
+    assert ticket['files'] and ticket['assigned_user_name']
+    assert small_count == large_count
+
+def test_ticket_responses_query_count_does_not_depend_on_page_size(app, client, ticket_ids):
+    ticket_id = ticket_ids[0]
+    with app.app_context():
+        for _ in range(20):
+            db.session.add(TicketResponse(ticket_id=ticket_id, user_id=1, message='mais uma'))
+        db.session.commit()
+
+    small, small_count = queries_for(app, client, f'/api/tickets/{ticket_id}/responses?limit=2')
+    large, large_count = queries_for(app, client, f'/api/tickets/{ticket_id}/responses?limit=20')
+
+    assert len(small.get_json()['responses']) == 2
+    assert len(large.get_json()['responses']) == 20
+    assert small_count == large_count